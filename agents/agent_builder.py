@@ -2,10 +2,17 @@
 import os
 import vertexai
 from google.adk.agents import Agent
-from langchain_google_vertexai import VertexAIEmbeddings
-from langchain_community.vectorstores import FAISS
-from typing import Dict, Callable
+from google.adk.tools import ToolContext
+from typing import Dict, Callable, List, Optional
 from agents.usda_api_client import usda_client
+from agents.embedding_cache import embedding_model, normalize_text
+from agents.retrieval_cache import result_cache
+from agents.index_registry import index_registry
+from agents.retrieval import search_index, search_index_batch, unsupported_filters
+from agents.context_packer import context_packer
+from agents.tool_executor import run_blocking
+from agents.metrics import after_agent_timing, before_agent_timing, register_cache, timed_tool
+from agents.tracing import annotate, traced_tool
 
 
 # --- Configuración Centralizada de Vertex AI ---
@@ -14,77 +21,231 @@ project_id = os.getenv("GOOGLE_CLOUD_PROJECT", "maitre-digital")
 location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
 vertexai.init(project=project_id, location=location)
 
-embedding_model = VertexAIEmbeddings(model_name="text-embedding-004")
+# Modelo de embeddings compartido del proceso (agents/embedding_cache.py); el backend
+# (EMBEDDING_BACKEND: vertex, hashed u onnx) debe ser el mismo de la ingesta
+register_cache("embeddings", embedding_model.stats)
+register_cache("retrieval_results", result_cache.stats)
+
+# En modo perezoso los agentes se registran al instante y los índices se cargan
+# en el calentamiento en segundo plano (main.py) o en la primera consulta
+LAZY_INDEX_LOADING = os.getenv("LAZY_INDEX_LOADING", "true").lower() == "true"
 
 def create_specialist_agent(name: str, description: str, instruction: str, index_path: str, k_results: int = 2) -> Agent:
     """
     Crea y configura un agente especialista con su base de conocimientos y API USDA.
     """
-    vector_store = None
-    if os.path.exists(index_path):
-        try:
-            vector_store = FAISS.load_local(
-                index_path, 
-                embedding_model, 
-                allow_dangerous_deserialization=True
-            )
-            print(f"Índice cargado exitosamente para el agente '{name}' desde '{index_path}'")
-        except Exception as e:
-            print(f"Error al cargar el índice para el agente '{name}': {e}")
-    else:
+    def get_loaded_index():
+        """
+        Devuelve el índice del agente desde el registro del proceso (una carga por índice,
+        mapeada en memoria). Si aún no está caliente, espera solo a este índice.
+        """
+        return index_registry.get(index_path, embedding_model)
+
+    if not os.path.exists(index_path):
         print(f"Advertencia: No se encontró el directorio del índice en '{index_path}' para el agente '{name}'.")
+    elif LAZY_INDEX_LOADING:
+        index_registry.register(index_path)
+        print(f"Índice registrado para carga perezosa del agente '{name}' desde '{index_path}'")
+    elif get_loaded_index() is not None:
+        print(f"Índice cargado exitosamente para el agente '{name}' desde '{index_path}'")
+    else:
+        print(f"Error al cargar el índice para el agente '{name}' desde '{index_path}'")
 
-    def query_knowledge_base(query: str) -> Dict[str, str]:
+    async def query_knowledge_base(
+        query: str,
+        category: Optional[str] = None,
+        bodega: Optional[str] = None,
+        section: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        tool_context: Optional[ToolContext] = None
+    ) -> Dict[str, str]:
         """
         Consulta la base de conocimientos vectorial (FAISS) con manejo de errores mejorado.
+        Filtros opcionales para acotar la búsqueda antes de ejecutarla: category (p. ej. 'Maduros'),
+        bodega, section (sección de la carta), min_price y max_price en euros.
         """
-        if not vector_store:
+        filters = {
+            "category": category,
+            "bodega": bodega,
+            "section": section,
+            "min_price": min_price,
+            "max_price": max_price
+        }
+        # La primera consulta puede tener que cargar el índice: fuera del bucle de eventos
+        loaded_index = await run_blocking(get_loaded_index)
+        if loaded_index is None:
             return {
                 "status": "error", 
                 "context": f"La base de conocimientos para '{name}' no está disponible temporalmente.",
                 "suggestion": "Como especialista, puedo intentar ayudarte con información general sobre el tema. ¿Podrías reformular tu consulta de manera más específica?"
             }
         
+        # Un filtro que el índice no puede aplicar devolvería resultados sin filtrar como si cumplieran
+        unsupported = unsupported_filters(loaded_index, filters)
+        if unsupported:
+            price = [key for key in unsupported if key in ("min_price", "max_price")]
+            others = [key for key in unsupported if key not in price]
+            reasons = (["filtro de precio no disponible"] if price else []) + [f"filtro '{key}' no disponible" for key in others]
+            return {
+                "status": "partial",
+                "context": f"No puedo aplicar lo pedido en la base de conocimientos de '{name}': {'; '.join(reasons)}.",
+                "suggestion": "Repite la consulta sin ese filtro e indica al cliente que no puedo acotar la búsqueda de esa forma."
+            }
+
+        # Los resultados se cachean por agente, k, consulta normalizada, filtros y versión del
+        # índice cargado (no la del disco: tras reconstruirlo, el de memoria sigue respondiendo)
+        cache_key = result_cache.make_key(name, k_results, query, loaded_index.version, filters)
+        cached = result_cache.get(cache_key)
+        annotate(**{"retrieval.k": k_results, "cache.hit": cached is not None})
+        if cached is not None:
+            return cached
+
         try:
-            results = vector_store.similarity_search(query, k=k_results)
-            formatted_context = []
-            for i, doc in enumerate(results, 1):
-                content = doc.page_content.strip()
-                formatted_context.append(f"--- RESULTADO {i} ---\n{content}")
+            # Recuperación híbrida BM25 + vectorial (los nombres exactos no necesitan embedding)
+            results = (await run_blocking(search_index, loaded_index, query, k_results, filters)).documents
+            # Sin duplicados plato/sección ni solapamientos entre fragmentos, dentro del presupuesto de tokens
+            packed = context_packer.pack(results)
+            annotate(**{"retrieval.result_count": len(results), "context.chunks": len(packed.chunks), "context.tokens": packed.tokens_after})
+            formatted_context = [
+                f"--- RESULTADO {i} ---\n{chunk.text}" for i, chunk in enumerate(packed.chunks, 1)
+            ]
             
             if not formatted_context:
-                return {
+                response = {
                     "status": "partial", 
                     "context": f"No encontré información específica sobre '{query}' en mi base de conocimientos actual.",
                     "suggestion": f"Como especialista en {name.replace('_specialist', '')}, puedo sugerir consultas relacionadas o ayudarte con aspectos generales del tema."
                 }
+            else:
+                response = {
+                    "status": "success", 
+                    "context": "\n\n".join(formatted_context),
+                    "source": "knowledge_base",
+                    "query_used": query
+                }
 
+            result_cache.put(cache_key, response)
+            return response
+
+        except Exception as e:
             return {
-                "status": "success", 
-                "context": "\n\n".join(formatted_context),
+                "status": "error", 
+                "context": f"Ocurrió un problema técnico al consultar mi base de conocimientos: {str(e)}",
+                "suggestion": "Por favor, intenta reformular tu consulta o pregúntame algo más general sobre el tema."
+            }
+
+    async def query_knowledge_base_batch(queries: List[str], tool_context: Optional[ToolContext] = None) -> Dict[str, str]:
+        """
+        Consulta la base de conocimientos con varias preguntas a la vez (paráfrasis o
+        subpreguntas) en una sola llamada. Devuelve el contexto agrupado por consulta,
+        sin repetir los resultados que ya aparecieron para una consulta anterior.
+        """
+        # La primera consulta puede tener que cargar el índice: fuera del bucle de eventos
+        loaded_index = await run_blocking(get_loaded_index)
+        if loaded_index is None:
+            return {
+                "status": "error",
+                "context": f"La base de conocimientos para '{name}' no está disponible temporalmente.",
+                "suggestion": "Como especialista, puedo intentar ayudarte con información general sobre el tema. ¿Podrías reformular tu consulta de manera más específica?"
+            }
+
+        # Consultas únicas (tras normalizar), conservando el orden original
+        unique_queries = []
+        normalized_seen = set()
+        for q in queries:
+            normalized = normalize_text(q)
+            if normalized and normalized not in normalized_seen:
+                normalized_seen.add(normalized)
+                unique_queries.append(q)
+        if not unique_queries:
+            return {
+                "status": "partial",
+                "context": "No se recibió ninguna consulta.",
+                "suggestion": "Indica al menos una pregunta concreta."
+            }
+
+        try:
+            results = await run_blocking(search_index_batch, loaded_index, unique_queries, k_results)
+            # Un único empaquetado para todas las consultas (lo repetido entre ellas se referencia),
+            # con el presupuesto de una consulta individual por cada consulta del lote
+            documents = [doc for result in results for doc in result.documents]
+            packed = context_packer.pack(documents, token_budget=context_packer.token_budget * len(unique_queries))
+            annotate(**{
+                "retrieval.k": k_results,
+                "retrieval.queries": len(unique_queries),
+                "retrieval.result_count": len(documents),
+                "context.chunks": len(packed.chunks),
+                "context.tokens": packed.tokens_after
+            })
+            chunks = {chunk.position: chunk for chunk in packed.chunks}
+            dropped = set(packed.dropped)
+
+            # Primera pasada: etiqueta de cada documento, para poder referenciar también
+            # fragmentos que aparecen en una consulta posterior
+            labels: Dict[int, str] = {}
+            position = 0
+            for q_index, result in enumerate(results, 1):
+                r_index = 0
+                for _ in result.documents:
+                    if position in chunks or position in packed.covered or position in dropped:
+                        r_index += 1
+                        labels[position] = f"{q_index}.{r_index}"
+                    position += 1
+
+            sections = []
+            position = 0
+            for q_index, (query, result) in enumerate(zip(unique_queries, results), 1):
+                lines = [f"=== CONSULTA {q_index}: {query} ==="]
+                for _ in result.documents:
+                    if position in chunks:
+                        lines.append(f"--- RESULTADO {labels[position]} ---\n{chunks[position].text}")
+                    elif position in packed.covered:
+                        lines.append(f"--- RESULTADO {labels[position]} --- (incluido en RESULTADO {labels[packed.covered[position]]})")
+                    elif position in dropped:
+                        reason = "omitido por presupuesto de contexto" if documents[position].page_content.strip() else "sin contenido"
+                        lines.append(f"--- RESULTADO {labels[position]} --- ({reason})")
+                    position += 1
+                if len(lines) == 1:
+                    lines.append("Sin resultados específicos para esta consulta.")
+                sections.append("\n".join(lines))
+
+            return {
+                "status": "success" if chunks else "partial",
+                "context": "\n\n".join(sections),
                 "source": "knowledge_base",
-                "query_used": query
+                "queries_used": unique_queries
             }
 
         except Exception as e:
             return {
-                "status": "error", 
+                "status": "error",
                 "context": f"Ocurrió un problema técnico al consultar mi base de conocimientos: {str(e)}",
                 "suggestion": "Por favor, intenta reformular tu consulta o pregúntame algo más general sobre el tema."
             }
 
-    def query_usda_nutrition_api(food_query: str) -> Dict[str, str]:
+    async def query_usda_nutrition_api(food_query: str, tool_context: Optional[ToolContext] = None) -> Dict[str, str]:
         """
         Consulta la API USDA FoodData Central para información nutricional específica.
         Úsala cuando necesites datos nutricionales precisos de alimentos específicos.
         """
         try:
             # Buscar en la API USDA
-            search_results = usda_client.search_foods(
+            search_results = await usda_client.search_foods_async(
                 query=food_query,
                 data_types=["Foundation", "SR Legacy"],  # Datos más confiables
                 page_size=3
             )
+            annotate(**{"usda.result_count": len(search_results.get("foods", []))})
+            
+            if search_results.get("rate_limited"):
+                # Sin tokens ni respuesta previa: mejor responder ya con la base de conocimientos
+                return {
+                    "status": "partial",
+                    "api_data": f"La base de datos USDA no admite más consultas en este momento: {search_results['error']}.",
+                    "suggestion": f"Consulta {kb_tool_name} para dar información nutricional general sobre '{food_query}'.",
+                    "source": "USDA FoodData Central API"
+                }
             
             # Formatear resultados
             formatted_data = usda_client.format_nutrition_data(search_results)
@@ -114,17 +275,29 @@ def create_specialist_agent(name: str, description: str, instruction: str, index
 
     # Crear nombres únicos para las herramientas
     kb_tool_name = f"query_{name}_kb"
+    kb_batch_tool_name = f"query_{name}_kb_batch"
     api_tool_name = f"query_usda_nutrition_api"
     
     # Asignar nombres únicos a las funciones
     query_knowledge_base.__name__ = kb_tool_name
+    query_knowledge_base_batch.__name__ = kb_batch_tool_name
     query_usda_nutrition_api.__name__ = api_tool_name
     
+    # Llamadas y duración por agente y herramienta en /metrics, y un span por llamada
+    tools = [
+        timed_tool(name, traced_tool(tool, **{"agent.name": name}))
+        for tool in (query_knowledge_base, query_knowledge_base_batch, query_usda_nutrition_api)
+    ]
+    
     # Actualizar instrucción para incluir ambas herramientas
     final_instruction = instruction.format(
         kb_tool_name=kb_tool_name,
         api_tool_name=api_tool_name
     )
+    final_instruction += (
+        f"\n\nSi necesitas varias búsquedas en el mismo turno (paráfrasis o subpreguntas), "
+        f"usa {kb_batch_tool_name} con la lista completa de consultas en una sola llamada."
+    )
 
     # Añadir instrucción mejorada para el logging de trazas
     trace_instruction = f"""
@@ -141,7 +314,7 @@ Después de tu respuesta final, añade información de trazabilidad invisible pa
 }}' style='display:none;'></span>
 
 - agent: Tu nombre, '{name}'
-- tools_used: Lista las herramientas usadas: '{kb_tool_name}', '{api_tool_name}', o 'none'
+- tools_used: Lista las herramientas usadas: '{kb_tool_name}', '{kb_batch_tool_name}', '{api_tool_name}', o 'none'
 - confidence: Evalúa tu nivel de confianza en la respuesta
 - sources: Especifica las fuentes: 'knowledge_base', 'usda_api', 'general_knowledge', o 'multiple'
 - response_type: 'completa' si proporcionaste toda la información, 'parcial' si falta algo, 'derivada' si usaste conocimiento general
@@ -156,5 +329,7 @@ Esto nos ayuda a mejorar continuamente la experiencia gastronómica."""
         model="gemini-2.5-flash",
         instruction=final_instruction,
         description=description,
-        tools=[query_knowledge_base, query_usda_nutrition_api]  # Ambas herramientas
+        tools=tools,
+        before_agent_callback=before_agent_timing,
+        after_agent_callback=after_agent_timing
     )
\ No newline at end of file
@@ -0,0 +1,207 @@
+# agents/answer_cache.py
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+
+from agents.embedding_cache import embedding_model, normalize_text
+from agents.index_registry import index_registry
+from agents.metrics import register_cache
+from agents.tool_executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Similitud coseno mínima para servir la respuesta de una pregunta anterior
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.93"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "512"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+
+class _Entry:
+    __slots__ = ("scope", "question", "vector", "answer", "expires_at")
+
+    def __init__(self, scope: Tuple, question: str, vector: np.ndarray, answer: str, expires_at: float):
+        self.scope = scope
+        self.question = question
+        self.vector = vector
+        self.answer = answer
+        self.expires_at = expires_at
+
+
+class SemanticAnswerCache:
+    """
+    Caché LRU de respuestas completas indexada por el embedding de la pregunta: una
+    paráfrasis por encima del umbral de similitud recibe la respuesta ya generada.
+    Las entradas se agrupan por ámbito (agente y versiones de los índices), de modo que
+    reconstruir una base de conocimientos deja de servir las respuestas antiguas.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        threshold: float = ANSWER_CACHE_THRESHOLD,
+        max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS
+    ):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.array(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def lookup(self, scope: Tuple, question: str) -> Optional[Tuple[str, float]]:
+        """Devuelve (respuesta, similitud) de la pregunta más parecida del ámbito, o None."""
+        normalized = normalize_text(question)
+        now = time.monotonic()
+        with self._lock:
+            exact = self._entries.get((scope, normalized))
+            if exact is not None and exact.expires_at >= now:
+                self._entries.move_to_end((scope, normalized))
+                self.hits += 1
+                return exact.answer, 1.0
+            candidates = [
+                (key, entry) for key, entry in self._entries.items()
+                if entry.scope == scope and entry.expires_at >= now
+            ]
+        if not candidates:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        vector = self._embed(question)
+        similarities = np.stack([entry.vector for _, entry in candidates]) @ vector
+        best = int(np.argmax(similarities))
+        with self._lock:
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            key, entry = candidates[best]
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return entry.answer, float(similarities[best])
+
+    def store(self, scope: Tuple, question: str, answer: str):
+        normalized = normalize_text(question)
+        entry = _Entry(scope, normalized, self._embed(question), answer, time.monotonic() + self.ttl_seconds)
+        with self._lock:
+            self._entries[(scope, normalized)] = entry
+            self._entries.move_to_end((scope, normalized))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "threshold": self.threshold
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _text(content: Optional[types.Content]) -> str:
+    if content is None or not content.parts:
+        return ""
+    return "".join(part.text for part in content.parts if part.text and not part.thought).strip()
+
+
+# Invocación que abrió la sesión, guardada en el estado de la sesión por before_agent
+_FIRST_INVOCATION_KEY = "answer_cache_first_invocation"
+
+
+def _first_turn_question(callback_context: CallbackContext) -> Optional[str]:
+    """
+    Pregunta del invitado si es la primera de la sesión. Las preguntas con historial
+    ("¿y con la carne?") dependen de la conversación y no se cachean.
+    """
+    first = callback_context.state.get(_FIRST_INVOCATION_KEY)
+    if first is None:
+        # Primera invocación de la sesión: queda registrada para las siguientes y para after_agent
+        callback_context.state[_FIRST_INVOCATION_KEY] = first = callback_context.invocation_id
+    if first != callback_context.invocation_id:
+        return None
+    return _text(callback_context.user_content) or None
+
+
+def _final_answer(callback_context: CallbackContext) -> str:
+    """Último texto de respuesta final de esta invocación (del coordinador o del especialista)."""
+    for event in reversed(callback_context.session.events):
+        if event.invocation_id != callback_context.invocation_id or event.author == "user":
+            continue
+        if event.partial or event.error_message:
+            return ""
+        if event.get_function_calls() or event.get_function_responses():
+            continue
+        text = _text(event.content)
+        if text:
+            return text
+    return ""
+
+
+def create_answer_cache_callbacks(cache: SemanticAnswerCache, agent_name: str) -> Tuple:
+    """
+    Callbacks before/after de ADK que ponen la caché delante de un agente. El ámbito
+    incluye la versión de todos los índices registrados en el proceso.
+    """
+
+    def scope() -> Tuple:
+        return (agent_name,) + tuple(sorted(index_registry.versions().items()))
+
+    async def before_agent(callback_context: CallbackContext) -> Optional[types.Content]:
+        question = _first_turn_question(callback_context)
+        if question is None:
+            return None
+        start = time.perf_counter()
+        try:
+            hit = await run_blocking(cache.lookup, scope(), question)
+        except Exception as e:
+            logger.warning("No se pudo consultar la caché de respuestas: %s", e)
+            return None
+        if hit is None:
+            return None
+        answer, similarity = hit
+        logger.info(
+            "Respuesta servida desde la caché (similitud %.3f, %.1fms): %s",
+            similarity, (time.perf_counter() - start) * 1000, question
+        )
+        return types.Content(role="model", parts=[types.Part(text=answer)])
+
+    async def after_agent(callback_context: CallbackContext) -> Optional[types.Content]:
+        question = _first_turn_question(callback_context)
+        answer = _final_answer(callback_context) if question else ""
+        if answer:
+            try:
+                await run_blocking(cache.store, scope(), question, answer)
+            except Exception as e:
+                logger.warning("No se pudo guardar la respuesta en la caché: %s", e)
+        return None
+
+    return before_agent, after_agent
+
+
+# Caché única por proceso, sobre el modelo de embeddings compartido: la pregunta del primer
+# turno se embebe una sola vez aunque la usen también el enrutador o la recuperación
+answer_cache = SemanticAnswerCache(embedding_model)
+register_cache("answers", answer_cache.stats)
@@ -0,0 +1,103 @@
+# agents/bm25.py
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
+
+# Índice invertido que data_ingestion/ingest.py guarda junto a cada índice FAISS
+BM25_FILE = "bm25.json"
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "de la el los las un una unos unas y o en con por para del al que se su sus es lo "
+    "como mas pero sin sobre entre the of and".split()
+)
+
+
+def fold_accents(text: str) -> str:
+    """Pasa a minúsculas y elimina tildes y diacríticos ('Reserva Añada' -> 'reserva anada')."""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokeniza un texto para BM25: sin tildes, minúsculas y sin palabras vacías."""
+    return [t for t in _TOKEN_PATTERN.findall(fold_accents(text)) if t not in _STOPWORDS]
+
+
+class BM25Index:
+    """Índice invertido BM25 (Okapi) sobre los documentos de un índice, por posición."""
+
+    def __init__(
+        self,
+        postings: Dict[str, List[List[int]]],
+        doc_lengths: List[int],
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.avg_length = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+
+    @classmethod
+    def build(cls, texts: Sequence[str]) -> "BM25Index":
+        postings: Dict[str, List[List[int]]] = defaultdict(list)
+        doc_lengths = []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                postings[term].append([doc_id, tf])
+        return cls(dict(postings), doc_lengths)
+
+    def save(self, index_path: str):
+        with open(os.path.join(index_path, BM25_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "doc_lengths": self.doc_lengths,
+                "postings": self.postings
+            }, f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, index_path: str) -> "BM25Index":
+        with open(os.path.join(index_path, BM25_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["postings"], data["doc_lengths"], k1=data["k1"], b=data["b"])
+
+    def _idf(self, term: str) -> float:
+        n = len(self.doc_lengths)
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def search(self, query: str, k: int, candidates: Optional[Collection[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Devuelve hasta k pares (posición del documento, puntuación) ordenados por puntuación,
+        opcionalmente restringidos a un conjunto de posiciones candidatas.
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf(term)
+            for doc_id, tf in self.postings.get(term, ()):
+                if candidates is not None and doc_id not in candidates:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[int]:
+    """
+    Combina varias listas ordenadas de posiciones con Reciprocal Rank Fusion:
+    score(d) = sum(1 / (k + rango)). Los empates se resuelven por posición.
+    """
+    scores: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return [doc_id for doc_id, _ in sorted(scores.items(), key=lambda item: (-item[1], item[0]))]
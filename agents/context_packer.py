@@ -0,0 +1,213 @@
+# agents/context_packer.py
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from langchain_core.documents import Document
+
+from agents.embedding_cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Presupuesto de tokens del contexto que devuelve cada llamada a la base de conocimientos
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Estimación sin tokenizador: ~4 caracteres por token en español con el tokenizador de Gemini
+CHARS_PER_TOKEN = 4
+# Un documento cuyas líneas aparecen en esta proporción en otro se considera contenido en él
+# (el plato de la carta frente a su sección: solo cambia la línea de cabecera)
+LINE_COVERAGE_THRESHOLD = 0.8
+# Solapamiento mínimo entre el final de un fragmento y el principio de otro (chunk_overlap=250)
+MIN_OVERLAP_CHARS = 40
+MAX_OVERLAP_CHARS = 400
+# Por debajo de este presupuesto restante no merece la pena truncar un fragmento
+MIN_TRUNCATED_TOKENS = 60
+TRUNCATION_MARK = "[…]"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+@dataclass
+class PackedChunk:
+    """Fragmento que entra en el contexto, con la posición del documento recuperado original."""
+    position: int
+    text: str
+    tokens: int
+    truncated: bool = False
+
+
+@dataclass
+class PackedContext:
+    """Resultado del empaquetado: fragmentos en orden y qué documentos se han descartado."""
+    chunks: List[PackedChunk]
+    # Documento descartado -> documento que lo contiene
+    covered: Dict[int, int] = field(default_factory=dict)
+    # Documentos que no cabían en el presupuesto (o vacíos)
+    dropped: List[int] = field(default_factory=list)
+    trimmed: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+class _Candidate:
+    def __init__(self, position: int, text: str):
+        self.position = position
+        self.text = text
+        self.normalized = normalize_text(text)
+        self.lines = {normalize_text(line) for line in text.splitlines() if line.strip()}
+        # Documentos que este contiene (el plato dentro de su sección)
+        self.members: List["_Candidate"] = []
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    def covers(self, other: "_Candidate") -> bool:
+        if other.normalized in self.normalized:
+            return True
+        if not other.lines:
+            return False
+        return len(other.lines & self.lines) / len(other.lines) >= LINE_COVERAGE_THRESHOLD
+
+
+def _overlap(head: str, tail: str) -> int:
+    """Longitud del mayor final de `head` que es a la vez principio de `tail`."""
+    longest = min(len(head), len(tail), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if head.endswith(tail[:size]):
+            return size
+    return 0
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """Corta el texto en el último salto de línea que cabe en el presupuesto."""
+    limit = max(0, max_tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARK) - 1)
+    cut = text.rfind("\n", 0, limit)
+    return text[:cut if cut > 0 else limit].rstrip() + "\n" + TRUNCATION_MARK
+
+
+class ContextPacker:
+    """
+    Ensambla el contexto para el LLM a partir de los documentos recuperados (en orden de
+    relevancia): descarta los repetidos o contenidos en otro, colapsa plato y sección de
+    la carta en un solo fragmento, recorta el solapamiento entre fragmentos consecutivos
+    del splitter y empaqueta el resultado dentro de un presupuesto de tokens.
+    """
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_before = 0
+        self.tokens_saved = 0
+
+    def pack(self, documents: Sequence[Document], token_budget: Optional[int] = None) -> PackedContext:
+        budget = self.token_budget if token_budget is None else token_budget
+        packed = PackedContext(chunks=[])
+        kept: List[_Candidate] = []
+
+        for position, doc in enumerate(documents):
+            text = doc.page_content.strip()
+            packed.tokens_before += estimate_tokens(text)
+            candidate = _Candidate(position, text)
+            if not candidate.normalized:
+                # Documento vacío: no aporta nada, pero cuenta como descartado
+                packed.dropped.append(position)
+                continue
+            container = next((k for k in kept if k.covers(candidate)), None)
+            if container is not None:
+                container.members.append(candidate)
+                continue
+
+            # Un documento posterior que contiene a otros ya aceptados ocupa el lugar del primero
+            contained = [k for k in kept if candidate.covers(k)]
+            if contained:
+                slot = kept.index(contained[0])
+                for k in contained:
+                    candidate.members.extend([k] + k.members)
+                    k.members = []
+                kept = [k for k in kept if k not in contained]
+                if self._trim_overlaps(candidate, kept):
+                    packed.trimmed += 1
+                kept.insert(slot, candidate)
+                continue
+
+            if self._trim_overlaps(candidate, kept):
+                packed.trimmed += 1
+            kept.append(candidate)
+
+        self._fit_budget(kept, budget, packed)
+        packed.tokens_after = sum(chunk.tokens for chunk in packed.chunks)
+
+        with self._lock:
+            self.requests += 1
+            self.tokens_before += packed.tokens_before
+            self.tokens_saved += packed.tokens_saved
+        logger.info(
+            "Contexto empaquetado: %d documentos -> %d fragmentos, %d -> %d tokens (%d ahorrados)",
+            len(documents), len(packed.chunks), packed.tokens_before, packed.tokens_after, packed.tokens_saved
+        )
+        return packed
+
+    @staticmethod
+    def _trim_overlaps(candidate: _Candidate, kept: List[_Candidate]) -> bool:
+        """Elimina del candidato el texto que ya aporta un fragmento vecino del mismo documento."""
+        trimmed = False
+        for k in kept:
+            size = _overlap(k.text, candidate.text)
+            if size:
+                candidate.text = candidate.text[size:].lstrip()
+                trimmed = True
+            size = _overlap(candidate.text, k.text)
+            if size:
+                candidate.text = candidate.text[:-size].rstrip()
+                trimmed = True
+        return trimmed
+
+    @staticmethod
+    def _fit_budget(kept: List[_Candidate], budget: int, packed: PackedContext):
+        remaining = budget
+        for candidate in kept:
+            members = sorted(candidate.members, key=lambda m: m.position)
+            if candidate.tokens <= remaining:
+                packed.chunks.append(PackedChunk(candidate.position, candidate.text, candidate.tokens))
+                remaining -= candidate.tokens
+                for member in members:
+                    packed.covered[member.position] = candidate.position
+                continue
+
+            # Si la sección no cabe, se queda el plato mejor situado que quepa
+            substitute = next((m for m in members if m.tokens <= remaining), None)
+            if substitute is not None:
+                packed.chunks.append(PackedChunk(substitute.position, substitute.text, substitute.tokens))
+                remaining -= substitute.tokens
+                packed.dropped.extend(m.position for m in [candidate] + members if m is not substitute)
+            elif remaining >= MIN_TRUNCATED_TOKENS:
+                text = _truncate(candidate.text, remaining)
+                packed.chunks.append(PackedChunk(candidate.position, text, estimate_tokens(text), truncated=True))
+                remaining = 0
+                packed.dropped.extend(m.position for m in members)
+            else:
+                packed.dropped.extend(m.position for m in [candidate] + members)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "token_budget": self.token_budget,
+                "tokens_before": self.tokens_before,
+                "tokens_saved": self.tokens_saved,
+                "saved_ratio": round(self.tokens_saved / self.tokens_before, 4) if self.tokens_before else 0.0
+            }
+
+
+# Empaquetador compartido por todos los agentes especialistas del proceso
+context_packer = ContextPacker()
@@ -1,7 +1,9 @@
 # coordinator_agent/agent.py
 import os
 import sys
+from typing import Dict, Optional
 from google.adk.agents import Agent
+from google.adk.tools import ToolContext
 
 # Agregar el directorio de agentes al path para imports relativos
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -9,6 +11,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from culinary.agent import root_agent as culinary_agent
 from nutrition.agent import root_agent as nutrition_agent
 from sumiller.agent import root_agent as sumiller_agent
+from agents.parallel_dispatch import COORDINATOR_PARALLEL_DISPATCH, ParallelDispatcher
+from agents.answer_cache import ANSWER_CACHE_ENABLED, answer_cache, create_answer_cache_callbacks
+from agents.intent_router import INTENT_ROUTER_ENABLED, create_router_callbacks, intent_router
+from agents.metrics import after_agent_timing, before_agent_timing, timed_tool
+from agents.tracing import traced_tool
 
 # Configurar variables de entorno para Vertex AI
 os.environ['GOOGLE_GENAI_USE_VERTEXAI'] = 'true'
@@ -22,10 +29,59 @@ instruction_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'
 with open(instruction_path, 'r', encoding='utf-8') as f:
     COORDINATOR_INSTRUCTION = f.read()
 
+# Orden fijo en el que se combinan las respuestas de la consulta paralela
+dispatcher = ParallelDispatcher([nutrition_agent, culinary_agent, sumiller_agent])
+
+
+async def consult_specialists(
+    tool_context: ToolContext,
+    nutrition_request: Optional[str] = None,
+    culinary_request: Optional[str] = None,
+    sumiller_request: Optional[str] = None
+) -> Dict:
+    """
+    Consulta a la vez a varios especialistas, cada uno con su propia subpregunta, para
+    consultas que abarcan varios dominios (p. ej. "plato bajo en calorías y un vino para
+    maridarlo"). Deja vacíos los especialistas que no hagan falta. Devuelve sus respuestas
+    en orden: nutrición, cocina y sumiller.
+    """
+    return await dispatcher.dispatch({
+        nutrition_agent.name: nutrition_request,
+        culinary_agent.name: culinary_request,
+        sumiller_agent.name: sumiller_request
+    }, tool_context)
+
+
+PARALLEL_DISPATCH_INSTRUCTION = """
+
+⚡ CONSULTA PARALELA:
+Cuando una consulta necesite a DOS O MÁS especialistas, no los consultes uno tras otro:
+usa la herramienta consult_specialists en una sola llamada, con una subpregunta completa y
+autocontenida para cada especialista necesario. Después sintetiza sus respuestas en el
+orden recibido. Para consultas de un solo dominio, delega como siempre."""
+
+# Caché semántica de respuestas completas delante del coordinador (solo primeras preguntas de sesión)
+before_agent_callback, after_agent_callback = (
+    create_answer_cache_callbacks(answer_cache, "gastronomy_coordinator") if ANSWER_CACHE_ENABLED else (None, None)
+)
+# La medición de duración va después de la caché: los aciertos no cuentan como ejecución del agente
+before_agent_callbacks = [callback for callback in (before_agent_callback, before_agent_timing) if callback]
+after_agent_callbacks = [callback for callback in (after_agent_timing, after_agent_callback) if callback]
+
+# Enrutado local de las consultas claras de un solo dominio, sin la llamada de enrutado al LLM
+before_model_callback, after_model_callback = (
+    create_router_callbacks(intent_router, [nutrition_agent.name, culinary_agent.name, sumiller_agent.name])
+    if INTENT_ROUTER_ENABLED else (None, None)
+)
 
 root_agent = Agent(
     name="gastronomy_coordinator",
     model="gemini-2.5-flash",
-    instruction=COORDINATOR_INSTRUCTION,
-    sub_agents=[nutrition_agent, culinary_agent, sumiller_agent]
+    instruction=COORDINATOR_INSTRUCTION + (PARALLEL_DISPATCH_INSTRUCTION if COORDINATOR_PARALLEL_DISPATCH else ""),
+    sub_agents=[nutrition_agent, culinary_agent, sumiller_agent],
+    tools=[timed_tool("gastronomy_coordinator", traced_tool(consult_specialists))] if COORDINATOR_PARALLEL_DISPATCH else [],
+    before_agent_callback=before_agent_callbacks,
+    after_agent_callback=after_agent_callbacks,
+    before_model_callback=before_model_callback,
+    after_model_callback=after_model_callback
 ) 
\ No newline at end of file
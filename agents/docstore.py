@@ -0,0 +1,107 @@
+# agents/docstore.py
+import json
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from typing import Iterator, List, Union
+
+from langchain_community.docstore.base import Docstore
+from langchain_core.documents import Document
+
+# Formato en disco (sin pickle):
+#   docstore.bin -> por cada documento, el texto UTF-8 seguido de sus metadatos en JSON compacto
+#   docstore.idx -> cabecera + una fila (offset, bytes de texto, bytes de metadatos) por documento,
+#                   en el mismo orden que los vectores del índice FAISS
+DOCSTORE_BLOB_FILE = "docstore.bin"
+DOCSTORE_OFFSETS_FILE = "docstore.idx"
+
+_MAGIC = b"GDOCS001"
+_HEADER = struct.Struct("<8sI")
+_ROW = struct.Struct("<QII")
+
+
+def has_compact_docstore(index_path: str) -> bool:
+    return os.path.exists(os.path.join(index_path, DOCSTORE_OFFSETS_FILE))
+
+
+def write_compact_docstore(index_path: str, documents: List[Document]):
+    """
+    Escribe los documentos en el formato compacto. `documents[i]` debe corresponder
+    al vector i del índice FAISS.
+    """
+    rows = []
+    offset = 0
+    with open(os.path.join(index_path, DOCSTORE_BLOB_FILE), "wb") as blob:
+        for doc in documents:
+            text = doc.page_content.encode("utf-8")
+            meta = json.dumps(doc.metadata, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+            blob.write(text)
+            blob.write(meta)
+            rows.append(_ROW.pack(offset, len(text), len(meta)))
+            offset += len(text) + len(meta)
+
+    with open(os.path.join(index_path, DOCSTORE_OFFSETS_FILE), "wb") as idx:
+        idx.write(_HEADER.pack(_MAGIC, len(rows)))
+        idx.write(b"".join(rows))
+
+
+class PositionalIds(Mapping):
+    """
+    Sustituye al diccionario `index_to_docstore_id` de LangChain: el id de cada
+    documento es su posición en el índice, así que no hace falta materializarlo.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+
+    def __getitem__(self, position: int) -> str:
+        if not 0 <= position < self._size:
+            raise KeyError(position)
+        return str(position)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self._size))
+
+
+class CompactDocstore(Docstore):
+    """
+    Docstore de solo lectura sobre el formato compacto. El blob se mapea en memoria y
+    solo se decodifican los documentos que devuelve cada búsqueda.
+    """
+
+    def __init__(self, index_path: str):
+        with open(os.path.join(index_path, DOCSTORE_OFFSETS_FILE), "rb") as f:
+            magic, count = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC:
+                raise ValueError(f"Formato de docstore no reconocido en '{index_path}'")
+            self._rows = f.read(count * _ROW.size)
+        self._count = count
+
+        blob_path = os.path.join(index_path, DOCSTORE_BLOB_FILE)
+        self.blob_bytes = os.path.getsize(blob_path)
+        with open(blob_path, "rb") as f:
+            # mmap no admite ficheros vacíos (índice sin documentos)
+            self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.blob_bytes else b""
+
+    def __len__(self) -> int:
+        return self._count
+
+    def search(self, search: str) -> Union[str, Document]:
+        try:
+            position = int(search)
+        except (TypeError, ValueError):
+            return f"ID {search} not found."
+        if not 0 <= position < self._count:
+            return f"ID {search} not found."
+
+        offset, text_len, meta_len = _ROW.unpack_from(self._rows, position * _ROW.size)
+        text = self._blob[offset:offset + text_len].decode("utf-8")
+        meta = self._blob[offset + text_len:offset + text_len + meta_len]
+        return Document(page_content=text, metadata=json.loads(meta))
+
+    def delete(self, ids: List) -> None:
+        raise NotImplementedError("CompactDocstore es de solo lectura; reconstruye el índice con data_ingestion/ingest.py")
@@ -0,0 +1,186 @@
+# agents/embedding_backends.py
+import hashlib
+import math
+import os
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from agents.bm25 import fold_accents
+
+# Backend de embeddings: vertex (text-embedding-004), hashed (n-gramas locales), onnx (modelo local)
+# o stub (hashed con latencia simulada, para pruebas de carga)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "vertex").lower()
+VERTEX_EMBEDDING_MODEL = os.getenv("VERTEX_EMBEDDING_MODEL", "text-embedding-004")
+# Dimensión del backend hashed (la misma que text-embedding-004 para poder comparar índices)
+HASHED_EMBEDDING_DIMENSION = int(os.getenv("HASHED_EMBEDDING_DIMENSION", "768"))
+# Directorio con model.onnx y tokenizer.json (p. ej. un modelo sentence-transformers exportado)
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "./models/embeddings")
+# Backend stub: los vectores del backend hashed con la latencia simulada de una llamada remota
+STUB_EMBEDDING_LATENCY_MS = float(os.getenv("STUB_EMBEDDING_LATENCY_MS", "60"))
+
+
+@lru_cache(maxsize=1 << 16)
+def _feature_slot(feature: str, dimension: int) -> Tuple[int, float]:
+    """Posición y signo de un rasgo: hash estable entre procesos (hash() de Python no lo es)."""
+    digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+    return digest % dimension, 1.0 if (digest >> 63) & 1 else -1.0
+
+
+class HashedNgramEmbeddings(Embeddings):
+    """
+    Embeddings deterministas sin red ni GPU: palabras y n-gramas de caracteres (sin tildes)
+    proyectados con feature hashing y normalizados. No entienden sinónimos como un modelo
+    neuronal, pero bastan para construir índices, probar la recuperación y medir su
+    rendimiento sin credenciales de Google Cloud.
+    """
+
+    def __init__(self, dimension: int = HASHED_EMBEDDING_DIMENSION, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dimension = dimension
+        self.ngram_range = ngram_range
+
+    @property
+    def model_name(self) -> str:
+        return f"hashed-ngram-{self.dimension}"
+
+    def _features(self, text: str) -> Counter:
+        features: Counter = Counter()
+        low, high = self.ngram_range
+        for word in fold_accents(text).split():
+            word = "".join(c for c in word if c.isalnum())
+            if not word:
+                continue
+            features[f"w:{word}"] += 2
+            padded = f"<{word}>"
+            for n in range(low, high + 1):
+                for i in range(len(padded) - n + 1):
+                    features[padded[i:i + n]] += 1
+        if not features and text.strip():
+            # Textos sin letras ni cifras ("---"): un vector nulo quedaría a distancia L2
+            # menor de cualquier consulta que los documentos reales y ganaría siempre
+            features[f"t:{text.strip()}"] += 1
+        return features
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            slot, sign = _feature_slot(feature, self.dimension)
+            vector[slot] += sign * (1.0 + math.log(count))
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class StubEmbeddings(HashedNgramEmbeddings):
+    """
+    Sustituto de Vertex AI para pruebas de carga: mismos vectores que el backend hashed
+    (compatible con sus índices) y una espera fija por llamada, como un viaje de red.
+    """
+
+    def __init__(self, latency_ms: float = STUB_EMBEDDING_LATENCY_MS, **kwargs):
+        super().__init__(**kwargs)
+        self.latency_seconds = latency_ms / 1000
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_seconds)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_seconds)
+        return super().embed_query(text)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Modelo de embeddings local en ONNX Runtime (CPU), con mean pooling y normalización L2.
+    El directorio debe contener `model.onnx` y el `tokenizer.json` de Hugging Face.
+    """
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, max_length: int = 256, batch_size: int = 32):
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(
+                "El backend de embeddings 'onnx' necesita onnxruntime y tokenizers "
+                "(pip install onnxruntime tokenizers)"
+            ) from e
+
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+    @property
+    def model_name(self) -> str:
+        return f"onnx:{os.path.basename(os.path.normpath(self.model_dir))}"
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        output = self.session.run(None, feeds)[0]
+        if output.ndim == 3:
+            # Mean pooling sobre los tokens reales (sin relleno)
+            mask = attention_mask[..., None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return output / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed_batch(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+
+def embedding_model_name(backend: Optional[str] = None) -> str:
+    """
+    Nombre del modelo de un backend, sin construirlo. Forma parte de la clave de la caché de
+    embeddings y se guarda con cada índice para detectar índices de otro modelo.
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "vertex":
+        return VERTEX_EMBEDDING_MODEL
+    if backend in ("hashed", "stub"):
+        return f"hashed-ngram-{HASHED_EMBEDDING_DIMENSION}"
+    if backend == "onnx":
+        return f"onnx:{os.path.basename(os.path.normpath(ONNX_MODEL_DIR))}"
+    raise ValueError(f"Backend de embeddings no soportado: '{backend}' (vertex, hashed, onnx o stub)")
+
+
+def create_embeddings(backend: Optional[str] = None) -> Embeddings:
+    """Construye el modelo de embeddings del backend configurado en EMBEDDING_BACKEND."""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "vertex":
+        # Importación diferida: los backends locales no necesitan el SDK de Vertex AI
+        from langchain_google_vertexai import VertexAIEmbeddings
+        return VertexAIEmbeddings(model_name=VERTEX_EMBEDDING_MODEL)
+    if backend == "hashed":
+        return HashedNgramEmbeddings()
+    if backend == "stub":
+        return StubEmbeddings()
+    if backend == "onnx":
+        return OnnxEmbeddings()
+    raise ValueError(f"Backend de embeddings no soportado: '{backend}' (vertex, hashed, onnx o stub)")
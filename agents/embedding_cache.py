@@ -0,0 +1,208 @@
+# agents/embedding_cache.py
+import array
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Union
+
+from langchain_core.embeddings import Embeddings
+
+from agents.embedding_backends import create_embeddings, embedding_model_name
+from agents.metrics import EMBEDDING_DURATION
+from agents.tracing import tracer
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza un texto para usarlo como clave de caché (minúsculas y espacios colapsados).
+    """
+    return " ".join(text.lower().split())
+
+
+class EmbeddingCache(Embeddings):
+    """
+    Envuelve un modelo de embeddings con una caché LRU en memoria y un almacén
+    opcional en disco (SQLite), ambos indexados por modelo y texto normalizado.
+    Las preguntas repetidas no vuelven a llamar al servicio remoto.
+    """
+
+    def __init__(
+        self,
+        embeddings: Union[Embeddings, Callable[[], Embeddings]],
+        model_name: str,
+        max_entries: int = 2048,
+        disk_path: Optional[str] = None
+    ):
+        # Se admite una fábrica para no construir el cliente remoto hasta el primer fallo de caché
+        is_factory = not hasattr(embeddings, "embed_query")
+        self._embeddings = None if is_factory else embeddings
+        self._embeddings_factory = embeddings if is_factory else None
+        self._factory_lock = threading.Lock()
+        self.model_name = model_name
+        self.max_entries = max_entries
+
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Contadores de aciertos y fallos
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._disk: Optional[sqlite3.Connection] = None
+        if disk_path:
+            self._open_disk_store(disk_path)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        """Modelo de embeddings subyacente (se construye al primer uso si se pasó una fábrica)."""
+        if self._embeddings is None:
+            with self._factory_lock:
+                if self._embeddings is None:
+                    self._embeddings = self._embeddings_factory()
+        return self._embeddings
+
+    def _open_disk_store(self, disk_path: str):
+        """Abre (o crea) el almacén SQLite de embeddings."""
+        directory = os.path.dirname(os.path.abspath(disk_path))
+        os.makedirs(directory, exist_ok=True)
+        self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " vector BLOB NOT NULL)"
+        )
+        self._disk.commit()
+
+    def _key(self, text: str, task: str) -> str:
+        # Consultas y documentos se embeben con tareas distintas, así que no comparten entrada
+        normalized = normalize_text(text)
+        return hashlib.sha1(f"{self.model_name}\x00{task}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        """Busca un vector en memoria y, si no está, en disco (promocionándolo a memoria)."""
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT vector FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    vector = array.array("f", row[0]).tolist()
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def _remember(self, key: str, vector: List[float]):
+        """Guarda un vector en la LRU en memoria. Requiere tener el lock."""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _store(self, items: Dict[str, List[float]]):
+        with self._lock:
+            for key, vector in items.items():
+                self._remember(key, vector)
+            if self._disk is not None and items:
+                self._disk.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector) VALUES (?, ?, ?)",
+                    [
+                        (key, self.model_name, array.array("f", vector).tobytes())
+                        for key, vector in items.items()
+                    ]
+                )
+                self._disk.commit()
+
+    def embed_query(self, text: str) -> List[float]:
+        with tracer.start_as_current_span("embedding") as span:
+            key = self._key(text, "query")
+            vector = self._lookup(key)
+            span.set_attribute("embedding.model", self.model_name)
+            span.set_attribute("embedding.task", "query")
+            span.set_attribute("embedding.texts", 1)
+            span.set_attribute("embedding.cache_hits", int(vector is not None))
+            if vector is None:
+                with EMBEDDING_DURATION.time(model=self.model_name, task="query"):
+                    vector = self.embeddings.embed_query(text)
+                self._store({key: vector})
+            return vector
+
+    def _embed_many(self, texts: List[str], task: str, compute: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        with tracer.start_as_current_span("embedding") as span:
+            keys = [self._key(text, task) for text in texts]
+            vectors: List[Optional[List[float]]] = [self._lookup(key) for key in keys]
+
+            # Solo se envían al modelo remoto los textos que no estaban en caché (en un único lote)
+            pending = [i for i, vector in enumerate(vectors) if vector is None]
+            span.set_attribute("embedding.model", self.model_name)
+            span.set_attribute("embedding.task", task)
+            span.set_attribute("embedding.texts", len(texts))
+            span.set_attribute("embedding.cache_hits", len(texts) - len(pending))
+            if pending:
+                with EMBEDDING_DURATION.time(model=self.model_name, task=task):
+                    computed = compute([texts[i] for i in pending])
+                new_items = {}
+                for i, vector in zip(pending, computed):
+                    vectors[i] = vector
+                    new_items[keys[i]] = vector
+                self._store(new_items)
+
+            return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_many(texts, "document", self.embeddings.embed_documents)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embebe varias consultas con una sola llamada remota para los fallos de caché.
+        Usa la tarea de consulta (RETRIEVAL_QUERY) si el modelo admite lotes de consultas.
+        """
+        def compute(pending: List[str]) -> List[List[float]]:
+            backend = self.embeddings
+            if hasattr(backend, "embed"):
+                return backend.embed(pending, embeddings_task_type="RETRIEVAL_QUERY")
+            return [backend.embed_query(text) for text in pending]
+
+        return self._embed_many(texts, "query", compute)
+
+    def stats(self) -> Dict[str, float]:
+        """Devuelve los contadores de aciertos/fallos de la caché."""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory)
+            }
+
+    def clear(self):
+        """Vacía la caché en memoria (el almacén en disco se conserva)."""
+        with self._lock:
+            self._memory.clear()
+
+
+# Modelo de embeddings compartido por todo el proceso (agentes, enrutador y caché de
+# respuestas), envuelto en una caché LRU (y opcionalmente en disco) para que una pregunta
+# ya embebida por cualquiera de ellos no vuelva a llamar al modelo. El backend se elige con
+# EMBEDDING_BACKEND y se construye en el primer fallo de caché, no al importar
+embedding_model = EmbeddingCache(
+    create_embeddings,
+    model_name=embedding_model_name(),
+    max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "2048")),
+    disk_path=os.getenv("EMBEDDING_CACHE_PATH") or None
+)
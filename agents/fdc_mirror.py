@@ -0,0 +1,171 @@
+# agents/fdc_mirror.py
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Réplica local de FoodData Central (Foundation y SR Legacy) que genera
+# data_ingestion/import_fdc.py; si el fichero no existe se usa solo la API
+FDC_MIRROR_PATH = os.getenv("FDC_MIRROR_PATH", "./indexes/fdc_mirror.sqlite")
+# prefer: réplica primero y API si no hay resultados; fallback: API primero y réplica si
+# falla o no quedan tokens; only: nunca llamar a la API; off: desactivada
+FDC_MIRROR_MODE = os.getenv("FDC_MIRROR_MODE", "prefer").lower()
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def search_nutrients(food_nutrients: Iterable[Dict]) -> List[Dict]:
+    """
+    Convierte los nutrientes de los ficheros de descarga ({"nutrient": {...}, "amount"})
+    al formato plano de /foods/search, el que entiende format_nutrition_data.
+    """
+    nutrients = []
+    for entry in food_nutrients or []:
+        nutrient = entry.get("nutrient") or {}
+        if entry.get("amount") is None or not nutrient.get("name"):
+            continue
+        nutrients.append({
+            "nutrientId": nutrient.get("id"),
+            "nutrientName": nutrient["name"],
+            "nutrientNumber": nutrient.get("number"),
+            "unitName": (nutrient.get("unitName") or "").upper(),
+            "value": entry["amount"]
+        })
+    return nutrients
+
+
+class FoodDataMirror:
+    """
+    Almacén SQLite de solo lectura con los alimentos de FoodData Central y un índice de
+    texto FTS5 (stemming inglés, sin tildes) sobre descripción y categoría. `search`
+    devuelve la misma forma que /foods/search, así que el resto del cliente no distingue
+    si la respuesta viene de la API o de la réplica. Cada hilo abre su propia conexión.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        meta = dict(self._connection().execute("SELECT key, value FROM meta").fetchall())
+        self.foods = int(meta.get("foods", 0))
+        self.sources = json.loads(meta.get("sources", "[]"))
+        self.built_at = float(meta.get("built_at", 0))
+
+    @classmethod
+    def open(cls, path: Optional[str] = FDC_MIRROR_PATH) -> Optional["FoodDataMirror"]:
+        """Abre la réplica si existe y es válida; None en caso contrario."""
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            mirror = cls(path)
+        except sqlite3.Error as e:
+            logger.warning("No se pudo abrir la réplica de FoodData Central '%s': %s", path, e)
+            return None
+        logger.info("Réplica de FoodData Central con %d alimentos (%s)", mirror.foods, ", ".join(mirror.sources))
+        return mirror
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(f"file:{os.path.abspath(self.path)}?mode=ro", uri=True, check_same_thread=False)
+            self._local.db = db
+        return db
+
+    @staticmethod
+    def _match_expression(query: str) -> Optional[str]:
+        # Cualquiera de las palabras (como requireAllWords=False en la API); bm25 premia las que
+        # coinciden en más términos y las descripciones cortas ("Salmon, raw" antes que un plato)
+        words = [word for word in _WORD.findall(query.lower()) if len(word) > 1]
+        return " OR ".join(f'"{word}"' for word in words) or None
+
+    def search(self, query: str, data_types: Optional[List[str]] = None, page_size: int = 5) -> Dict:
+        match = self._match_expression(query)
+        if match is None:
+            return {"totalHits": 0, "currentPage": 1, "totalPages": 0, "foods": []}
+        sql = (
+            "SELECT f.fdc_id, f.description, f.data_type, f.category, f.published, f.nutrients,"
+            " bm25(foods_fts, 10.0, 1.0) AS score"
+            " FROM foods_fts JOIN foods f ON f.fdc_id = foods_fts.rowid"
+            " WHERE foods_fts MATCH ?"
+        )
+        params: list = [match]
+        if data_types:
+            sql += f" AND f.data_type IN ({', '.join('?' for _ in data_types)})"
+            params.extend(data_types)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(page_size)
+        rows = self._connection().execute(sql, params).fetchall()
+        foods = [
+            {
+                "fdcId": fdc_id,
+                "description": description,
+                "dataType": data_type,
+                "foodCategory": category,
+                "publishedDate": published,
+                "foodNutrients": json.loads(nutrients),
+                # bm25 de SQLite es negativo (menor = mejor); la API devuelve puntuaciones positivas
+                "score": round(-score, 4)
+            }
+            for fdc_id, description, data_type, category, published, nutrients, score in rows
+        ]
+        return {"totalHits": len(foods), "currentPage": 1, "totalPages": 1 if foods else 0, "foods": foods}
+
+    @staticmethod
+    def build(foods: Iterable[Dict], path: str, sources: List[str]) -> int:
+        """
+        Escribe una réplica nueva a partir de alimentos en el formato de los ficheros de
+        descarga de FoodData Central. Se construye en un fichero temporal y se sustituye
+        al final, así que un servidor en marcha nunca ve una réplica a medias.
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        db = sqlite3.connect(tmp_path)
+        try:
+            db.executescript(
+                "CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);"
+                "CREATE TABLE foods ("
+                " fdc_id INTEGER PRIMARY KEY,"
+                " description TEXT NOT NULL,"
+                " data_type TEXT NOT NULL,"
+                " category TEXT,"
+                " published TEXT,"
+                " nutrients TEXT NOT NULL);"
+                "CREATE VIRTUAL TABLE foods_fts USING fts5("
+                " description, category, content='foods', content_rowid='fdc_id',"
+                " tokenize='porter unicode61 remove_diacritics 2');"
+            )
+            count = 0
+            for food in foods:
+                category = food.get("foodCategory")
+                if isinstance(category, dict):
+                    category = category.get("description")
+                db.execute(
+                    "INSERT OR REPLACE INTO foods (fdc_id, description, data_type, category, published, nutrients)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        food["fdcId"], food.get("description", ""), food.get("dataType", ""), category,
+                        food.get("publicationDate"),
+                        json.dumps(search_nutrients(food.get("foodNutrients")), separators=(",", ":"))
+                    )
+                )
+                count += 1
+            db.execute("INSERT INTO foods_fts (foods_fts) VALUES ('rebuild')")
+            db.execute("INSERT INTO foods_fts (foods_fts) VALUES ('optimize')")
+            db.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("foods", str(count)),
+                ("sources", json.dumps(sources)),
+                ("built_at", str(time.time()))
+            ])
+            db.commit()
+            db.execute("VACUUM")
+        finally:
+            db.close()
+        os.replace(tmp_path, path)
+        return count
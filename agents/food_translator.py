@@ -0,0 +1,127 @@
+# agents/food_translator.py
+import json
+import os
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from agents.bm25 import fold_accents
+
+# Léxico español -> inglés de alimentos (un objeto JSON por categoría)
+FOOD_LEXICON_PATH = os.getenv(
+    "FOOD_LEXICON_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "food_lexicon_es_en.json")
+)
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_WORD_PATTERN = re.compile(r"\w+")
+# Marca de fin de término en los nodos del trie (no puede coincidir con un token)
+_TERM = ""
+
+
+class FoodMatch(NamedTuple):
+    spanish: str
+    english: str
+    # Posición en caracteres dentro del texto original
+    start: int
+    end: int
+
+
+def _plural_candidates(token: str) -> Tuple[str, ...]:
+    """Singulares posibles de un plural español: nueces -> nuez, limones -> limon, tomates -> tomate."""
+    candidates = []
+    if token.endswith("ces"):
+        candidates.append(token[:-3] + "z")
+    if token.endswith("es"):
+        candidates.append(token[:-2])
+    if token.endswith("s"):
+        candidates.append(token[:-1])
+    return tuple(candidate for candidate in candidates if candidate)
+
+
+class FoodTranslator:
+    """
+    Traductor de alimentos por coincidencia de frases sobre un trie de tokens (sin tildes ni
+    mayúsculas). Recorre el texto una vez de izquierda a derecha y en cada posición se queda
+    con el término más largo del léxico ('pechuga de pollo' antes que 'pollo'); como los
+    términos tienen pocas palabras, el coste es lineal en la longitud del texto y no depende
+    del tamaño del léxico. Los plurales se reducen a la forma que aparece en el léxico, así que
+    'pimientos verdes' encuentra 'pimiento verde' sin reglas de plural frágiles.
+    """
+
+    def __init__(self, lexicon: Dict[str, str]):
+        folded = {tuple(_TOKEN_PATTERN.findall(fold_accents(spanish))): english for spanish, english in lexicon.items()}
+        folded.pop((), None)
+        self._vocabulary = {token for tokens in folded for token in tokens}
+        # Forma canónica de cada palabra del léxico: el singular si también figura en él
+        self._canonical = {token: self._singular(token) or token for token in self._vocabulary}
+        self._trie: Dict = {}
+        for tokens, english in folded.items():
+            node = self._trie
+            for token in tokens:
+                node = node.setdefault(self._canonical[token], {})
+            node.setdefault(_TERM, english)
+        self.terms = len(folded)
+
+    @classmethod
+    def from_file(cls, path: str = FOOD_LEXICON_PATH) -> "FoodTranslator":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        lexicon = {}
+        for section, terms in data.items():
+            if not section.startswith("_"):
+                lexicon.update(terms)
+        return cls(lexicon)
+
+    def _singular(self, token: str) -> Optional[str]:
+        return next((candidate for candidate in _plural_candidates(token) if candidate in self._vocabulary), None)
+
+    def _normalize(self, token: str) -> str:
+        """Forma del trie para un token del texto (los desconocidos se quedan como están)."""
+        if token in self._canonical:
+            return self._canonical[token]
+        singular = self._singular(token)
+        return self._canonical[singular] if singular else token
+
+    def foods(self, text: str) -> List[FoodMatch]:
+        """Todos los alimentos del texto, en orden y sin solaparse, en una sola pasada."""
+        # Cada palabra se pliega por separado para conservar sus posiciones en el texto original
+        tokens = []
+        for word in _WORD_PATTERN.finditer(text):
+            folded = "".join(_TOKEN_PATTERN.findall(fold_accents(word.group())))
+            if folded:
+                tokens.append((word.start(), word.end(), self._normalize(folded)))
+        matches = []
+        i = 0
+        while i < len(tokens):
+            node = self._trie
+            best: Optional[Tuple[int, str]] = None
+            j = i
+            while j < len(tokens) and tokens[j][2] in node:
+                node = node[tokens[j][2]]
+                j += 1
+                if _TERM in node:
+                    best = (j, node[_TERM])
+            if best is None:
+                i += 1
+                continue
+            end, english = best
+            start_char, end_char = tokens[i][0], tokens[end - 1][1]
+            matches.append(FoodMatch(text[start_char:end_char], english, start_char, end_char))
+            i = end
+        return matches
+
+    def translate(self, text: str) -> str:
+        """
+        Consulta en inglés para FoodData Central: los alimentos reconocidos, sin repetir
+        ('pechuga de pollo con arroz' -> 'chicken breast, rice'). Sin coincidencias devuelve
+        el texto original (puede que ya esté en inglés).
+        """
+        english = list(dict.fromkeys(match.english for match in self.foods(text)))
+        return ", ".join(english) if english else text
+
+    def translate_ingredients(self, ingredients: Iterable[str]) -> Dict[str, List[str]]:
+        """Alimentos en inglés de cada ingrediente de un plato, en una sola llamada."""
+        return {ingredient: [match.english for match in self.foods(ingredient)] for ingredient in ingredients}
+
+
+# Instancia global, cargada una vez por proceso
+food_translator = FoodTranslator.from_file()
@@ -0,0 +1,176 @@
+# agents/index_config.py
+import json
+import math
+import os
+from dataclasses import asdict, dataclass, replace
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+# Fichero opcional con ajustes por dominio que sobrescriben los valores por defecto, p. ej.:
+# {"nutrition": {"kind": "hnsw", "hnsw_m": 32, "ef_search": 64, "storage": "float16"}}
+INDEX_SETTINGS_FILE = os.getenv("INDEX_SETTINGS_FILE", "./index_settings.json")
+
+# FAISS recomienda al menos ~39 puntos de entrenamiento por lista IVF
+_MIN_POINTS_PER_LIST = 39
+# Por debajo de 2^4 centroides por subcuantizador la PQ pierde demasiada precisión
+_MIN_PQ_NBITS = 4
+
+# Copia float16 de los vectores con la que se re-puntúan los candidatos de un índice PQ
+RESCORE_VECTORS_FILE = "rescore_vectors.npy"
+
+
+@dataclass(frozen=True)
+class IndexSettings:
+    """Tipo de índice FAISS y sus parámetros de construcción y búsqueda."""
+    kind: str = "flat"          # flat | ivf | hnsw
+    nlist: int = 64             # IVF: número de listas (se ajusta al tamaño del corpus)
+    nprobe: int = 8             # IVF: listas que se visitan por búsqueda
+    hnsw_m: int = 32            # HNSW: vecinos por nodo
+    ef_construction: int = 40   # HNSW: amplitud de búsqueda al construir
+    ef_search: int = 64         # HNSW: amplitud de búsqueda al consultar
+    storage: str = "float32"    # float32 | float16 | pq: codificación de los vectores en el índice
+    pq_m: int = 48              # PQ: subcuantizadores (bytes por vector con 8 bits)
+    pq_nbits: int = 8           # PQ: bits por subcuantizador
+    rescore_factor: int = 10    # PQ: candidatos por resultado que se re-puntúan en float16 (0 = no)
+
+    def describe(self) -> str:
+        if self.kind == "ivf":
+            base = f"ivf(nlist={self.nlist}, nprobe={self.nprobe})"
+        elif self.kind == "hnsw":
+            base = f"hnsw(M={self.hnsw_m}, efSearch={self.ef_search})"
+        else:
+            base = "flat"
+        if self.storage == "float16":
+            return f"{base}+fp16"
+        if self.storage == "pq":
+            rescore = f", rescore x{self.rescore_factor}" if uses_rescoring(self) else ""
+            return f"{base}+pq({self.pq_m}x{self.pq_nbits}{rescore})"
+        return base
+
+
+# Valores por defecto por dominio: con cientos de documentos el índice exacto es lo más
+# rápido; IVF/HNSW compensan cuando se cargan varias bodegas o corpus de nutrición grandes
+DEFAULT_DOMAIN_SETTINGS: Dict[str, IndexSettings] = {
+    "enology": IndexSettings(kind="flat"),
+    "culinary": IndexSettings(kind="flat"),
+    "nutrition": IndexSettings(kind="flat"),
+}
+
+
+def load_domain_settings(domain: str, settings_file: Optional[str] = None) -> IndexSettings:
+    """Ajustes de un dominio: valores por defecto combinados con el fichero de ajustes, si existe."""
+    settings = DEFAULT_DOMAIN_SETTINGS.get(domain, IndexSettings())
+    path = settings_file or INDEX_SETTINGS_FILE
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            overrides = json.load(f).get(domain, {})
+        settings = replace(settings, **overrides)
+    return settings
+
+
+def uses_rescoring(settings: IndexSettings) -> bool:
+    """Solo la PQ pierde suficiente precisión como para re-puntuar sus candidatos."""
+    return settings.storage == "pq" and settings.rescore_factor > 1
+
+
+def _pq_subquantizers(dimension: int, wanted: int) -> int:
+    """Mayor divisor de la dimensión que no supera el número de subcuantizadores pedido."""
+    return max(m for m in range(1, min(wanted, dimension) + 1) if dimension % m == 0)
+
+
+def _factory_string(settings: IndexSettings, n: int, dimension: int) -> str:
+    """Descripción del índice para faiss.index_factory (p. ej. 'IVF64,PQ48x8' o 'HNSW32,SQfp16')."""
+    storage = settings.storage
+    nbits = min(settings.pq_nbits, int(math.log2(n))) if n > 1 else 0
+    if storage == "pq" and nbits < _MIN_PQ_NBITS:
+        # Corpus demasiado pequeño para entrenar los centroides de la PQ
+        storage = "float16"
+
+    if storage == "float32":
+        codec = "Flat"
+    elif storage == "float16":
+        codec = "SQfp16"
+    elif storage == "pq":
+        codec = f"PQ{_pq_subquantizers(dimension, settings.pq_m)}x{nbits}"
+    else:
+        raise ValueError(f"Almacenamiento de vectores no soportado: '{settings.storage}'")
+
+    if settings.kind == "ivf":
+        nlist = max(1, min(settings.nlist, n // _MIN_POINTS_PER_LIST))
+        return f"IVF{nlist},{codec}"
+    if settings.kind == "hnsw":
+        # FAISS solo admite la PQ dentro de HNSW con la sintaxis HNSW<M>_PQ<m>
+        separator = "_" if codec.startswith("PQ") else ","
+        return f"HNSW{settings.hnsw_m}{separator}{codec}"
+    if settings.kind == "flat":
+        return codec
+    raise ValueError(f"Tipo de índice no soportado: '{settings.kind}'")
+
+
+def build_faiss_index(vectors: np.ndarray, settings: IndexSettings) -> faiss.Index:
+    """
+    Construye (y entrena si hace falta) un índice FAISS L2 con los vectores dados, con
+    los vectores en float32, float16 (cuantizador escalar) o cuantización por producto.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dimension = vectors.shape
+
+    index = faiss.index_factory(dimension, _factory_string(settings, n, dimension), faiss.METRIC_L2)
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efConstruction = settings.ef_construction
+        index.hnsw.efSearch = settings.ef_search
+    if not index.is_trained:
+        index.train(vectors)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(settings.nprobe, ivf.nlist)
+
+    index.add(vectors)
+    return index
+
+
+def save_rescore_vectors(index_path: str, vectors: np.ndarray):
+    """Guarda la copia float16 de los vectores, en el mismo orden que el índice."""
+    np.save(os.path.join(index_path, RESCORE_VECTORS_FILE), np.asarray(vectors, dtype=np.float16))
+
+
+def load_rescore_vectors(index_path: str) -> Optional[np.ndarray]:
+    """
+    Abre la copia float16 mapeada en memoria: solo se leen del disco las filas de los
+    candidatos que se re-puntúan. Devuelve None si el índice no la tiene.
+    """
+    path = os.path.join(index_path, RESCORE_VECTORS_FILE)
+    return np.load(path, mmap_mode="r") if os.path.exists(path) else None
+
+
+def rescore(queries: np.ndarray, rankings: List[List[int]], vectors: np.ndarray, k: int) -> List[List[int]]:
+    """Reordena los candidatos de cada consulta por distancia L2 exacta y se queda con k."""
+    rescored = []
+    for query, ranking in zip(queries, rankings):
+        if not ranking:
+            rescored.append([])
+            continue
+        candidates = np.array(ranking, dtype=np.int64)
+        rows = np.asarray(vectors[candidates], dtype=np.float32)
+        distances = ((rows - query) ** 2).sum(axis=1)
+        rescored.append([int(candidates[i]) for i in np.argsort(distances, kind="stable")[:k]])
+    return rescored
+
+
+def search_parameters(index: faiss.Index, selector=None) -> faiss.SearchParameters:
+    """
+    Parámetros de búsqueda del tipo que espera cada índice (IVF y HNSW rechazan los
+    genéricos), conservando nprobe/efSearch y aplicando un selector de ids opcional.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def settings_as_dict(settings: IndexSettings) -> Dict:
+    return asdict(settings)
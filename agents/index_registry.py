@@ -0,0 +1,294 @@
+# agents/index_registry.py
+import logging
+import os
+import pickle
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from agents.bm25 import BM25_FILE, BM25Index
+from agents.metadata_index import METADATA_INDEX_FILE, MetadataIndex
+from agents.docstore import CompactDocstore, PositionalIds, has_compact_docstore
+from agents.index_config import RESCORE_VECTORS_FILE, load_rescore_vectors
+from agents.retrieval_cache import read_index_details, read_index_version
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.faiss"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+# Los índices antiguos (index.pkl) solo se aceptan si se permite explícitamente el unpickle
+ALLOW_PICKLE_DOCSTORE = os.getenv("ALLOW_PICKLE_DOCSTORE", "false").lower() == "true"
+
+
+class _UnboundEmbeddings(Embeddings):
+    """
+    Marcador para índices precargados durante el calentamiento, antes de que ningún
+    agente haya asociado su modelo de embeddings.
+    """
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        raise RuntimeError("El índice aún no tiene un modelo de embeddings asociado.")
+
+    def embed_query(self, text: str) -> List[float]:
+        raise RuntimeError("El índice aún no tiene un modelo de embeddings asociado.")
+
+
+@dataclass
+class LoadedIndex:
+    """Índice FAISS cargado junto con los datos necesarios para reportar su consumo."""
+    path: str
+    store: FAISS
+    bm25: Optional[BM25Index]
+    metadata: Optional[MetadataIndex]
+    version: str
+    mmapped: bool
+    load_seconds: float
+    file_bytes: int
+    # Copia float16 mapeada para re-puntuar los candidatos de los índices PQ
+    rescore_vectors: Optional[np.ndarray] = None
+    rescore_factor: int = 0
+    # Modelo de embeddings con el que se construyó (None en índices antiguos)
+    embedding_model: Optional[str] = None
+
+
+def _read_faiss_index(index_file: str):
+    """
+    Lee un índice FAISS mapeándolo en memoria cuando la versión de FAISS lo permite,
+    de modo que los procesos del mismo contenedor comparten las páginas de vectores
+    (solo lectura) a través de la caché de páginas del sistema operativo.
+    """
+    flags = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+    try:
+        index = faiss.read_index(index_file, flags)
+    except RuntimeError as e:
+        logger.warning("No se pudo mapear '%s' en memoria (%s); se carga en el heap.", index_file, e)
+        return faiss.read_index(index_file), False
+    # Sin IO_FLAG_MMAP_IFC, FAISS lee los índices flat e IVF-flat al heap aunque se pida mmap:
+    # solo cuenta como mapeado si el fichero aparece realmente en las regiones del proceso
+    mmapped = _mapped_rss_bytes(index_file) is not None
+    if not mmapped:
+        logger.info("FAISS no mapeó '%s' en memoria; el índice está en el heap del proceso.", index_file)
+    return index, mmapped
+
+
+def _mapped_rss_bytes(file_path: str) -> Optional[int]:
+    """
+    Suma la memoria residente (Rss) de las regiones mapeadas de un fichero según
+    /proc/self/smaps. Devuelve None si el sistema no expone esa información o si el
+    fichero no está mapeado en el proceso.
+    """
+    real_path = os.path.realpath(file_path)
+    total_kb = 0
+    in_mapping = False
+    matched = False
+    try:
+        with open("/proc/self/smaps", "r") as f:
+            for line in f:
+                fields = line.split()
+                if not fields:
+                    continue
+                if not fields[0].endswith(":"):
+                    # Cabecera de región: "inicio-fin permisos offset dev inodo [ruta]"
+                    in_mapping = len(fields) >= 6 and fields[5] == real_path
+                    matched = matched or in_mapping
+                elif in_mapping and fields[0] == "Rss:":
+                    total_kb += int(fields[1])
+    except OSError:
+        return None
+    return total_kb * 1024 if matched else None
+
+
+class IndexRegistry:
+    """
+    Registro de índices FAISS a nivel de proceso: cada índice se carga una sola vez,
+    aunque lo usen varios agentes, y se puede consultar su memoria residente.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, LoadedIndex] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        # Estado por índice: pending, loading, warm, missing o error
+        self._states: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._warm_up_thread: Optional[threading.Thread] = None
+
+    def _path_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def register(self, index_path: str):
+        """Registra un índice para cargarlo más tarde (al calentar o en la primera consulta)."""
+        key = os.path.abspath(index_path)
+        with self._lock:
+            self._states.setdefault(key, "pending")
+
+    def discover(self, indexes_dir: str):
+        """Registra todos los índices que existan bajo `indexes_dir`."""
+        if not os.path.isdir(indexes_dir):
+            return
+        for entry in sorted(os.listdir(indexes_dir)):
+            if os.path.exists(os.path.join(indexes_dir, entry, INDEX_FILE)):
+                self.register(os.path.join(indexes_dir, entry))
+
+    def get(self, index_path: str, embeddings: Optional[Embeddings] = None) -> Optional[LoadedIndex]:
+        """
+        Devuelve el índice de `index_path`, cargándolo la primera vez. Solo se bloquea
+        a quien pide ese mismo índice mientras se carga.
+        """
+        key = os.path.abspath(index_path)
+        loaded = self._indexes.get(key)
+        if loaded is None:
+            with self._path_lock(key):
+                loaded = self._indexes.get(key)
+                if loaded is None:
+                    loaded = self._load(key)
+                    if loaded is not None:
+                        self._indexes[key] = loaded
+
+        # Los índices precargados en el calentamiento se asocian al modelo del primer agente que los usa
+        if loaded is not None and embeddings is not None and isinstance(loaded.store.embedding_function, _UnboundEmbeddings):
+            model_name = getattr(embeddings, "model_name", None)
+            if loaded.embedding_model and model_name and model_name != loaded.embedding_model:
+                logger.warning(
+                    "El índice '%s' se construyó con '%s' pero se consulta con '%s'; "
+                    "reconstrúyelo con el mismo EMBEDDING_BACKEND.",
+                    os.path.basename(key), loaded.embedding_model, model_name
+                )
+            loaded.store.embedding_function = embeddings
+        return loaded
+
+    def _load(self, index_path: str) -> Optional[LoadedIndex]:
+        index_file = os.path.join(index_path, INDEX_FILE)
+        if not os.path.exists(index_file):
+            self._states[index_path] = "missing"
+            return None
+
+        self._states[index_path] = "loading"
+        try:
+            loaded = self._read(index_path, index_file)
+        except Exception as e:
+            logger.error("Error al cargar el índice '%s': %s", index_path, e)
+            self._states[index_path] = "error"
+            return None
+        self._states[index_path] = "warm"
+        return loaded
+
+    def _read(self, index_path: str, index_file: str) -> LoadedIndex:
+        start = time.perf_counter()
+        index, mmapped = _read_faiss_index(index_file)
+        if has_compact_docstore(index_path):
+            docstore = CompactDocstore(index_path)
+            index_to_docstore_id = PositionalIds(len(docstore))
+        elif ALLOW_PICKLE_DOCSTORE:
+            logger.warning(
+                "El índice '%s' usa el docstore pickle heredado; reconstrúyelo o conviértelo con "
+                "`python -m data_ingestion.convert_docstore`.", index_path
+            )
+            with open(os.path.join(index_path, LEGACY_DOCSTORE_FILE), "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+        else:
+            # Sin docstore compacto no se carga nada: convertir es un paso explícito con índices propios
+            raise ValueError(
+                f"El índice '{index_path}' no tiene docstore compacto y el formato pickle está deshabilitado; "
+                "conviértelo con `python -m data_ingestion.convert_docstore` (o ALLOW_PICKLE_DOCSTORE=true)"
+            )
+
+        store = FAISS(_UnboundEmbeddings(), index, docstore, index_to_docstore_id)
+        bm25 = BM25Index.load(index_path) if os.path.exists(os.path.join(index_path, BM25_FILE)) else None
+        metadata = (
+            MetadataIndex.load(index_path)
+            if os.path.exists(os.path.join(index_path, METADATA_INDEX_FILE)) else None
+        )
+        rescore_vectors = load_rescore_vectors(index_path)
+        details = read_index_details(index_path)
+        return LoadedIndex(
+            path=index_path,
+            store=store,
+            bm25=bm25,
+            metadata=metadata,
+            version=read_index_version(index_path),
+            mmapped=mmapped,
+            load_seconds=time.perf_counter() - start,
+            file_bytes=os.path.getsize(index_file),
+            rescore_vectors=rescore_vectors,
+            rescore_factor=int((details.get("index_settings") or {}).get("rescore_factor", 10)) if rescore_vectors is not None else 0,
+            embedding_model=details.get("embedding_model")
+        )
+
+    def warm_up(self):
+        """Carga de forma síncrona todos los índices registrados que aún no estén cargados."""
+        with self._lock:
+            pending = [key for key, state in self._states.items() if state != "warm"]
+        for key in pending:
+            start = time.perf_counter()
+            if self.get(key) is not None:
+                logger.info("Índice '%s' calentado en %.2fs", os.path.basename(key), time.perf_counter() - start)
+
+    def start_warm_up(self) -> threading.Thread:
+        """Lanza el calentamiento en un hilo en segundo plano (solo una vez por proceso)."""
+        with self._lock:
+            if self._warm_up_thread is None:
+                self._warm_up_thread = threading.Thread(
+                    target=self.warm_up, name="index-warm-up", daemon=True
+                )
+                self._warm_up_thread.start()
+            return self._warm_up_thread
+
+    def versions(self) -> Dict[str, str]:
+        """
+        Versión de cada índice registrado: la del índice cargado en memoria, que es el que
+        responde (la del disco solo para los que aún no se han cargado).
+        """
+        with self._lock:
+            keys = sorted(self._states)
+            loaded = {key: self._indexes[key].version for key in keys if key in self._indexes}
+        return {os.path.basename(key): loaded.get(key) or read_index_version(key) for key in keys}
+
+    def readiness(self) -> Dict:
+        """Indica qué índices están calentados y si todos los registrados están listos."""
+        with self._lock:
+            states = {os.path.basename(key): state for key, state in sorted(self._states.items())}
+        return {
+            # Un índice inexistente no bloquea la disponibilidad: su agente responde sin base de conocimientos
+            "ready": all(state in ("warm", "missing") for state in states.values()),
+            "indexes": states
+        }
+
+    def memory_report(self) -> Dict[str, Dict]:
+        """
+        Informa, por índice, del tamaño de los vectores y de la memoria realmente residente
+        en este proceso (páginas mapeadas compartidas o copia privada en el heap).
+        """
+        report = {}
+        for key, loaded in list(self._indexes.items()):
+            index = loaded.store.index
+            vector_bytes = index.ntotal * getattr(index, "code_size", index.d * 4)
+            mapped_rss = _mapped_rss_bytes(os.path.join(key, INDEX_FILE)) if loaded.mmapped else None
+            rescore_file = os.path.join(key, RESCORE_VECTORS_FILE)
+            report[os.path.basename(key)] = {
+                "vectors": index.ntotal,
+                "dimension": index.d,
+                "file_bytes": loaded.file_bytes,
+                "docstore_bytes": getattr(loaded.store.docstore, "blob_bytes", None),
+                "mmapped": loaded.mmapped,
+                "resident_bytes": mapped_rss if mapped_rss is not None else vector_bytes,
+                "shared": mapped_rss is not None,
+                "storage": type(index).__name__,
+                "rescore_file_bytes": os.path.getsize(rescore_file) if loaded.rescore_vectors is not None else None,
+                "rescore_resident_bytes": _mapped_rss_bytes(rescore_file) if loaded.rescore_vectors is not None else None,
+                "load_seconds": round(loaded.load_seconds, 4),
+                "embedding_model": loaded.embedding_model,
+                "version": loaded.version
+            }
+        return report
+
+
+# Registro único por proceso, compartido por todos los agentes especialistas
+index_registry = IndexRegistry()
@@ -0,0 +1,299 @@
+# agents/intent_router.py
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from agents.bm25 import tokenize
+from agents.embedding_cache import embedding_model
+from agents.metrics import ROUTER_DECISIONS
+from agents.tool_executor import run_blocking
+
+logger = logging.getLogger(__name__)
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+# Confianza mínima para despachar sin pasar por el LLM del coordinador
+INTENT_ROUTER_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.8"))
+# Centroides de embeddings para las consultas sin palabras clave (una llamada de embedding)
+INTENT_ROUTER_CENTROIDS = os.getenv("INTENT_ROUTER_CENTROIDS", "true").lower() == "true"
+# Temperatura del softmax sobre las similitudes con los centroides
+CENTROID_TEMPERATURE = 0.05
+# El softmax solo compara los dominios entre sí: para enrutar por centroide la consulta debe
+# parecerse de verdad al dominio (similitud coseno) y destacar sobre el segundo (margen);
+# así los saludos o las preguntas sobre horarios siguen yendo al LLM
+INTENT_ROUTER_MIN_SIMILARITY = float(os.getenv("INTENT_ROUTER_MIN_SIMILARITY", "0.6"))
+INTENT_ROUTER_MIN_MARGIN = float(os.getenv("INTENT_ROUTER_MIN_MARGIN", "0.05"))
+
+# Palabras clave inequívocas de cada especialista (sin tildes; los plurales se reducen al singular)
+DOMAIN_KEYWORDS: Dict[str, Sequence[str]] = {
+    "sumiller_specialist": (
+        "vino", "tinto", "rosado", "espumoso", "cava", "champagne", "champan", "brut", "bodega",
+        "maridaje", "maridar", "marida", "sumiller", "uva", "crianza", "gran reserva", "copa de vino",
+        "botella", "enologia", "cata", "rioja", "ribera del duero", "albarino", "verdejo",
+        "tempranillo", "garnacha", "godello", "txakoli", "jerez", "denominacion de origen"
+    ),
+    "culinary_specialist": (
+        "receta", "cocinar", "cocina", "plato", "carta", "menu", "entrante", "postre", "chef",
+        "ingrediente", "preparar", "preparacion", "horno", "asar", "guiso", "guisar", "tecnica culinaria",
+        "sofrito", "emplatar", "coccion", "tapa", "racion"
+    ),
+    "nutrition_specialist": (
+        "caloria", "kcal", "proteina", "grasa", "carbohidrato", "hidrato de carbono", "nutricion",
+        "nutricional", "nutriente", "dieta", "vitamina", "fibra", "sodio", "colesterol", "alergeno",
+        "gluten", "lactosa", "celiaco", "vegano", "saludable", "azucar", "macronutriente", "indice glucemico"
+    ),
+}
+
+# Ejemplos con los que se calcula el centroide de cada especialista
+DOMAIN_EXAMPLES: Dict[str, Sequence[str]] = {
+    "sumiller_specialist": (
+        "¿Qué me recomiendas beber con el cordero?",
+        "Algo para acompañar un pescado blanco a la plancha",
+        "¿Tenéis algo de Burdeos o de la Borgoña?",
+        "Quiero algo fresco y afrutado para el aperitivo",
+    ),
+    "culinary_specialist": (
+        "¿Cómo se hace un risotto de setas?",
+        "¿Qué lleva la merluza en salsa verde?",
+        "¿Qué me recomiendas de primero?",
+        "¿Cuánto tiempo hay que dejar reposar la masa?",
+    ),
+    "nutrition_specialist": (
+        "¿Es sano comer huevos todos los días?",
+        "¿Qué alimentos tienen más hierro?",
+        "Soy diabético, ¿qué puedo comer?",
+        "¿Engorda mucho el aguacate?",
+    ),
+}
+
+
+def _stem(token: str) -> str:
+    """Plural español básico: 'vinos' -> 'vino', 'calorias' -> 'caloria'."""
+    return token[:-1] if len(token) > 3 and token.endswith("s") else token
+
+
+def _terms(text: str) -> List[str]:
+    return [_stem(token) for token in tokenize(text)]
+
+
+class _KeywordTrie:
+    """Trie de términos: reconoce palabras clave de varias palabras ('ribera del duero')."""
+
+    _END = "\x00"
+
+    def __init__(self, keywords: Dict[str, Sequence[str]]):
+        self.root: Dict = {}
+        for domain, phrases in keywords.items():
+            for phrase in phrases:
+                node = self.root
+                for term in _terms(phrase):
+                    node = node.setdefault(term, {})
+                node[self._END] = domain
+
+    def match(self, terms: List[str]) -> List[Tuple[str, str]]:
+        """Coincidencias más largas de izquierda a derecha, como pares (dominio, frase)."""
+        matches = []
+        i = 0
+        while i < len(terms):
+            node, j, longest = self.root, i, None
+            while j < len(terms) and terms[j] in node:
+                node = node[terms[j]]
+                j += 1
+                if self._END in node:
+                    longest = (node[self._END], j)
+            if longest is None:
+                i += 1
+            else:
+                matches.append((longest[0], " ".join(terms[i:longest[1]])))
+                i = longest[1]
+        return matches
+
+
+@dataclass
+class RoutingDecision:
+    """Especialista elegido (None = decide el LLM), con su confianza y el motivo."""
+    agent_name: Optional[str]
+    confidence: float
+    method: str
+    scores: Dict[str, float] = field(default_factory=dict)
+    elapsed_ms: float = 0.0
+
+
+class IntentRouter:
+    """
+    Clasificador local de intenciones delante del coordinador: las consultas claras de un
+    solo dominio se envían directamente al especialista sin la llamada de enrutado al LLM.
+    Primero aplica las palabras clave; si no hay ninguna, el centroide de embeddings más
+    cercano. Las consultas ambiguas o de varios dominios siguen yendo al LLM.
+    """
+
+    def __init__(
+        self,
+        embeddings=None,
+        threshold: float = INTENT_ROUTER_THRESHOLD,
+        use_centroids: bool = INTENT_ROUTER_CENTROIDS,
+        min_similarity: float = INTENT_ROUTER_MIN_SIMILARITY,
+        min_margin: float = INTENT_ROUTER_MIN_MARGIN
+    ):
+        self.trie = _KeywordTrie(DOMAIN_KEYWORDS)
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.use_centroids = use_centroids and embeddings is not None
+        self._centroids: Optional[Tuple[List[str], np.ndarray]] = None
+        self._lock = threading.Lock()
+        self.routed: Dict[str, int] = {}
+        self.fallbacks = 0
+        # Media móvil de la latencia de la llamada de enrutado del LLM (para estimar el ahorro)
+        self.llm_routing_ms: Optional[float] = None
+        self.saved_ms = 0.0
+
+    def _centroid_matrix(self) -> Tuple[List[str], np.ndarray]:
+        if self._centroids is None:
+            names = list(DOMAIN_EXAMPLES)
+            rows = []
+            for name in names:
+                # Los ejemplos son preguntas: se embeben con la misma tarea que las consultas
+                vectors = np.array(self.embeddings.embed_queries(list(DOMAIN_EXAMPLES[name])), dtype=np.float32)
+                centroid = vectors.mean(axis=0)
+                rows.append(centroid / (np.linalg.norm(centroid) or 1.0))
+            self._centroids = (names, np.stack(rows))
+        return self._centroids
+
+    def _by_centroid(self, query: str) -> RoutingDecision:
+        names, centroids = self._centroid_matrix()
+        vector = np.array(self.embeddings.embed_query(query), dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        similarities = centroids @ vector
+        weights = np.exp((similarities - similarities.max()) / CENTROID_TEMPERATURE)
+        probabilities = weights / weights.sum()
+        best = int(np.argmax(probabilities))
+        decision = RoutingDecision(
+            names[best], float(probabilities[best]), "centroid",
+            {name: round(float(p), 4) for name, p in zip(names, probabilities)}
+        )
+        # Sin parecido suficiente a ningún dominio, o con dos dominios casi empatados, no se decide
+        ranked = np.sort(similarities)[::-1]
+        if ranked[0] < self.min_similarity or ranked[0] - ranked[1] < self.min_margin:
+            decision.agent_name = None
+        return decision
+
+    def classify(self, query: str) -> RoutingDecision:
+        start = time.perf_counter()
+        matches = self.trie.match(_terms(query))
+        scores: Dict[str, float] = {}
+        for domain, _ in matches:
+            scores[domain] = scores.get(domain, 0.0) + 1.0
+
+        if scores:
+            best = max(scores, key=scores.get)
+            decision = RoutingDecision(best, scores[best] / sum(scores.values()), "keywords", scores)
+        elif self.use_centroids:
+            decision = self._by_centroid(query)
+        else:
+            decision = RoutingDecision(None, 0.0, "none")
+
+        if decision.confidence < self.threshold:
+            decision.agent_name = None
+        decision.elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+        return decision
+
+    def record_llm_routing(self, elapsed_ms: float):
+        with self._lock:
+            self.llm_routing_ms = elapsed_ms if self.llm_routing_ms is None else 0.9 * self.llm_routing_ms + 0.1 * elapsed_ms
+
+    def record_decision(self, decision: RoutingDecision, query: str):
+        ROUTER_DECISIONS.inc(agent=decision.agent_name or "llm", method=decision.method)
+        with self._lock:
+            if decision.agent_name is None:
+                self.fallbacks += 1
+                saved = None
+            else:
+                self.routed[decision.agent_name] = self.routed.get(decision.agent_name, 0) + 1
+                saved = (self.llm_routing_ms - decision.elapsed_ms) if self.llm_routing_ms is not None else None
+                if saved is not None:
+                    self.saved_ms += saved
+        if decision.agent_name is None:
+            logger.info(
+                "Enrutado al LLM (%s, confianza %.2f, %.1fms): %s",
+                decision.method, decision.confidence, decision.elapsed_ms, query
+            )
+        else:
+            logger.info(
+                "Enrutado local a '%s' (%s, confianza %.2f, %.1fms%s): %s",
+                decision.agent_name, decision.method, decision.confidence, decision.elapsed_ms,
+                f", ~{saved:.0f}ms ahorrados" if saved is not None else "", query
+            )
+
+    def stats(self) -> Dict:
+        with self._lock:
+            routed = sum(self.routed.values())
+            total = routed + self.fallbacks
+            return {
+                "routed": dict(self.routed),
+                "fallbacks": self.fallbacks,
+                "routed_ratio": round(routed / total, 4) if total else 0.0,
+                "llm_routing_ms": round(self.llm_routing_ms, 1) if self.llm_routing_ms is not None else None,
+                "estimated_saved_ms": round(self.saved_ms, 1)
+            }
+
+
+def _is_new_user_turn(llm_request: LlmRequest) -> bool:
+    """Solo se enruta la primera llamada al LLM de un turno (no tras una respuesta de herramienta)."""
+    if not llm_request.contents:
+        return False
+    last = llm_request.contents[-1]
+    return last.role == "user" and not any(part.function_response for part in (last.parts or []))
+
+
+def create_router_callbacks(router: IntentRouter, specialist_names: Sequence[str]) -> Tuple:
+    """
+    Callbacks before/after model de ADK para el coordinador. Cuando el clasificador es
+    concluyente, before_model devuelve directamente la llamada a transfer_to_agent que
+    habría generado el LLM; si no, se mide la llamada real para estimar el ahorro.
+    """
+    allowed = set(specialist_names)
+    pending: Dict[str, float] = {}
+
+    async def before_model(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+        if not _is_new_user_turn(llm_request):
+            return None
+        query = "".join(part.text or "" for part in (callback_context.user_content.parts or [])) if callback_context.user_content else ""
+        if not query.strip():
+            return None
+        try:
+            decision = await run_blocking(router.classify, query)
+        except Exception as e:
+            logger.warning("El enrutador local falló; decide el LLM: %s", e)
+            return None
+        if decision.agent_name not in allowed:
+            decision.agent_name = None
+        router.record_decision(decision, query)
+        if decision.agent_name is None:
+            pending[callback_context.invocation_id] = time.perf_counter()
+            return None
+        return LlmResponse(content=types.Content(role="model", parts=[
+            types.Part(function_call=types.FunctionCall(name="transfer_to_agent", args={"agent_name": decision.agent_name}))
+        ]))
+
+    async def after_model(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+        # En streaming se mide hasta el primer fragmento
+        start = pending.pop(callback_context.invocation_id, None)
+        if start is not None:
+            router.record_llm_routing((time.perf_counter() - start) * 1000)
+        return None
+
+    return before_model, after_model
+
+
+# Enrutador único por proceso, sobre el modelo de embeddings compartido: una pregunta ya
+# embebida por otro componente (p. ej. la caché de respuestas) no vuelve a llamar al modelo
+intent_router = IntentRouter(embedding_model)
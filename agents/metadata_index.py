@@ -0,0 +1,154 @@
+# agents/metadata_index.py
+import bisect
+import json
+import logging
+import os
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+from agents.bm25 import fold_accents
+
+logger = logging.getLogger(__name__)
+
+# Índice columnar de metadatos que data_ingestion/ingest.py guarda junto a cada índice FAISS
+METADATA_INDEX_FILE = "metadata_index.json"
+
+# Columnas categóricas que se indexan si aparecen en los metadatos de los documentos
+CATEGORICAL_COLUMNS = ("category", "bodega", "section", "type")
+# Columnas numéricas y los campos de metadatos de los que se alimentan (el primero presente)
+NUMERIC_COLUMNS = {
+    "price": ("price", "price_eur", "price_bottle"),
+    "price_glass": ("price_glass",)
+}
+
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def parse_price(value) -> Optional[float]:
+    """
+    Convierte precios como 16.0, '6,50€', '290€' o '1.200,50€' a float. Devuelve None si
+    no hay número. Con coma decimal los puntos son separadores de miles; sin coma, un punto
+    seguido de tres cifras también lo es ('1.200€'), como en las cartas en español.
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = _NUMBER_PATTERN.search(value)
+        if match:
+            number = match.group()
+            if "," in number:
+                number = number.replace(".", "").replace(",", ".")
+            elif number.count(".") > 1 or re.fullmatch(r"\d+\.\d{3}", number):
+                number = number.replace(".", "")
+            return float(number)
+    return None
+
+
+class MetadataIndex:
+    """
+    Índice columnar sobre los metadatos de los documentos (por posición en el índice FAISS).
+    Resuelve filtros como categoría, bodega, sección o rango de precio a un conjunto de
+    posiciones candidatas antes de la búsqueda vectorial.
+    """
+
+    def __init__(self, size: int, categorical: Dict[str, Dict[str, List[int]]], numeric: Dict[str, List[List[float]]]):
+        self.size = size
+        # columna -> valor normalizado -> posiciones
+        self.categorical = categorical
+        # columna -> pares [valor, posición] ordenados por valor
+        self.numeric = numeric
+        self._numeric_values = {column: [pair[0] for pair in pairs] for column, pairs in numeric.items()}
+
+    @classmethod
+    def build(cls, metadatas: Iterable[Dict]) -> "MetadataIndex":
+        categorical: Dict[str, Dict[str, List[int]]] = defaultdict(lambda: defaultdict(list))
+        numeric: Dict[str, List[List[float]]] = defaultdict(list)
+        size = 0
+        for position, metadata in enumerate(metadatas):
+            size += 1
+            for column in CATEGORICAL_COLUMNS:
+                value = metadata.get(column)
+                if isinstance(value, str) and value and value != "N/A":
+                    categorical[column][fold_accents(value).strip()].append(position)
+            for column, sources in NUMERIC_COLUMNS.items():
+                for source in sources:
+                    value = parse_price(metadata.get(source))
+                    if value is not None:
+                        numeric[column].append([value, position])
+                        break
+        return cls(
+            size,
+            {column: dict(values) for column, values in categorical.items()},
+            {column: sorted(pairs) for column, pairs in numeric.items()}
+        )
+
+    def save(self, index_path: str):
+        with open(os.path.join(index_path, METADATA_INDEX_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "size": self.size,
+                "categorical": self.categorical,
+                "numeric": self.numeric
+            }, f, ensure_ascii=False, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, index_path: str) -> "MetadataIndex":
+        with open(os.path.join(index_path, METADATA_INDEX_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["size"], data["categorical"], data["numeric"])
+
+    def columns(self) -> List[str]:
+        return sorted(set(self.categorical) | set(self.numeric))
+
+    def _match_categorical(self, column: str, value: str) -> Set[int]:
+        """Coincidencia sin tildes ni mayúsculas; si no hay valor exacto, por subcadena ('taittinger')."""
+        values = self.categorical[column]
+        wanted = fold_accents(value).strip()
+        if wanted in values:
+            return set(values[wanted])
+        return {p for candidate, positions in values.items() if wanted in candidate for p in positions}
+
+    def _match_range(self, column: str, minimum: Optional[float], maximum: Optional[float]) -> Set[int]:
+        pairs = self.numeric[column]
+        values = self._numeric_values[column]
+        lo = bisect.bisect_left(values, minimum) if minimum is not None else 0
+        hi = bisect.bisect_right(values, maximum) if maximum is not None else len(values)
+        return {int(pairs[i][1]) for i in range(lo, hi)}
+
+    def supports(self, key: str) -> bool:
+        if key in self.categorical:
+            return True
+        return key.startswith(("min_", "max_")) and key[4:] in self.numeric
+
+    def unsupported(self, filters: Dict) -> List[str]:
+        """Filtros con valor que este índice no puede aplicar (p. ej. precio en un índice sin precios)."""
+        return [key for key, value in filters.items() if value not in (None, "") and not self.supports(key)]
+
+    def resolve(self, filters: Dict) -> Optional[Set[int]]:
+        """
+        Resuelve los filtros a un conjunto de posiciones. Devuelve None si ningún filtro aplica
+        a este índice (se busca en todo el índice). Las claves admitidas son las columnas
+        categóricas y `min_<columna>` / `max_<columna>` para las numéricas; las demás se
+        ignoran y se registran en el log, y `unsupported` permite comprobarlas antes.
+        """
+        unsupported = self.unsupported(filters)
+        if unsupported:
+            logger.warning("Filtros no disponibles en este índice (se ignoran): %s", ", ".join(unsupported))
+        candidates: Optional[Set[int]] = None
+        for key, value in filters.items():
+            if value is None or value == "":
+                continue
+            if key in self.categorical:
+                matched = self._match_categorical(key, str(value))
+            elif key.startswith(("min_", "max_")) and key[4:] in self.numeric:
+                column = key[4:]
+                bound = float(value)
+                matched = self._match_range(
+                    column,
+                    bound if key.startswith("min_") else None,
+                    bound if key.startswith("max_") else None
+                )
+            else:
+                continue
+            candidates = matched if candidates is None else candidates & matched
+        return candidates
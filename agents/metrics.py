@@ -0,0 +1,408 @@
+# agents/metrics.py
+import bisect
+import functools
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Buckets de latencia en segundos: de búsquedas locales (ms) a respuestas completas del LLM
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(f"{self.name}_total", dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # clave -> (cuentas por bucket, suma, total)
+        self._values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels) -> "_Timer":
+        return _Timer(self, labels)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+        samples = []
+        for key, counts, total, count in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class _Timer:
+    """Context manager que observa la duración del bloque en un histograma."""
+
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas en memoria con exposición en formato de texto de Prometheus.
+    Los colectores permiten publicar en cada scrape contadores que ya mantienen otros
+    componentes (cachés, enrutador) sin instrumentar su camino crítico.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        """`collector()` devuelve tuplas (nombre, tipo, ayuda, muestras) en el momento del scrape."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        families = [(m.name, m.kind, m.documentation, m.samples()) for m in metrics]
+        for collector in collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                logger.warning("Error en un colector de métricas: %s", e)
+
+        lines = []
+        for name, kind, documentation, samples in families:
+            # Los contadores se exponen como <nombre>_total: HELP y TYPE deben usar el mismo nombre
+            if kind == "counter" and not name.endswith("_total"):
+                name = f"{name}_total"
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- Métricas de la aplicación ---
+REQUEST_DURATION = registry.histogram(
+    "maitre_request_duration_seconds", "Duración de las peticiones HTTP hasta el último byte.", ("app", "endpoint", "status")
+)
+REQUEST_FIRST_BYTE = registry.histogram(
+    "maitre_request_first_byte_seconds", "Tiempo hasta el primer byte de la respuesta.", ("app", "endpoint")
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "maitre_requests_in_flight", "Peticiones HTTP en curso.", ("app", "endpoint")
+)
+AGENT_DURATION = registry.histogram(
+    "maitre_agent_duration_seconds", "Duración de cada ejecución de un agente (incluye sus subagentes).", ("agent",)
+)
+TOOL_DURATION = registry.histogram(
+    "maitre_tool_duration_seconds", "Duración de las llamadas a herramientas.", ("agent", "tool", "status")
+)
+EMBEDDING_DURATION = registry.histogram(
+    "maitre_embedding_duration_seconds", "Duración de las llamadas al modelo de embeddings (fallos de caché).", ("model", "task")
+)
+RETRIEVAL_STAGE_DURATION = registry.histogram(
+    "maitre_retrieval_stage_seconds", "Duración de cada etapa de la recuperación (BM25, embedding, FAISS...).", ("index", "stage")
+)
+USDA_REQUEST_DURATION = registry.histogram(
+    "maitre_usda_request_seconds", "Latencia de las peticiones a la API USDA FoodData Central.", ("status",)
+)
+USDA_RATE_LIMIT_WAIT = registry.histogram(
+    "maitre_usda_rate_limit_wait_seconds", "Espera por un token del rate limiting antes de llamar a la API USDA.",
+    buckets=(0.0, 0.1, 0.5, 1.0, 2.0, 4.0, 8.0, 16.0)
+)
+USDA_RATE_LIMITED = registry.counter(
+    "maitre_usda_rate_limited", "Peticiones a la API USDA rechazadas por el rate limiting (fallback=cache|none).", ("fallback",)
+)
+USDA_RETRIES = registry.counter(
+    "maitre_usda_retries", "Reintentos de peticiones a la API USDA por el estado del intento fallido.", ("status",)
+)
+USDA_COALESCED = registry.counter(
+    "maitre_usda_coalesced", "Búsquedas USDA que esperaron a una petición idéntica ya en curso (single-flight)."
+)
+ROUTER_DECISIONS = registry.counter(
+    "maitre_router_decisions", "Decisiones del enrutador local (agent=\"llm\" cuando decide el LLM).", ("agent", "method")
+)
+
+
+def timed_tool(agent_name: str, func: Callable) -> Callable:
+    """
+    Envuelve una herramienta async de ADK para medir llamadas y duración. `functools.wraps`
+    conserva nombre, docstring y firma, así que ADK genera la misma declaración.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = await func(*args, **kwargs)
+            status = result.get("status", "success") if isinstance(result, dict) else "success"
+            return result
+        finally:
+            TOOL_DURATION.observe(time.perf_counter() - start, agent=agent_name, tool=func.__name__, status=status)
+
+    return wrapper
+
+
+# Inicio de cada ejecución de agente en curso, por (invocación, agente)
+_agent_started: Dict[Tuple[str, str], float] = {}
+# Las ejecuciones que terminan con una excepción no pasan por after_agent: se descartan las más antiguas
+_MAX_AGENTS_IN_FLIGHT = 4096
+
+
+def before_agent_timing(callback_context):
+    """Callback before_agent de ADK: marca el inicio de la ejecución del agente."""
+    if len(_agent_started) >= _MAX_AGENTS_IN_FLIGHT:
+        _agent_started.pop(next(iter(_agent_started)), None)
+    _agent_started[(callback_context.invocation_id, callback_context.agent_name)] = time.perf_counter()
+    return None
+
+
+def after_agent_timing(callback_context):
+    """Callback after_agent de ADK: observa la duración del agente."""
+    start = _agent_started.pop((callback_context.invocation_id, callback_context.agent_name), None)
+    if start is not None:
+        AGENT_DURATION.observe(time.perf_counter() - start, agent=callback_context.agent_name)
+    return None
+
+
+# --- Cachés: se leen sus contadores en cada scrape, sin coste en el camino crítico ---
+_cache_stats: Dict[str, Callable[[], Dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], Dict]):
+    """Publica los aciertos y fallos de una caché con método stats()."""
+    _cache_stats[name] = stats
+
+
+def _collect_caches():
+    hits, misses, ratios = [], [], []
+    for name, stats in list(_cache_stats.items()):
+        values = stats()
+        cache_hits = values.get("hits", values.get("memory_hits", 0) + values.get("disk_hits", 0))
+        labels = {"cache": name}
+        hits.append(("maitre_cache_hits_total", labels, cache_hits))
+        misses.append(("maitre_cache_misses_total", labels, values.get("misses", 0)))
+        ratios.append(("maitre_cache_hit_ratio", labels, values.get("hit_ratio", 0.0)))
+    return [
+        ("maitre_cache_hits", "counter", "Aciertos de cada caché.", hits),
+        ("maitre_cache_misses", "counter", "Fallos de cada caché.", misses),
+        ("maitre_cache_hit_ratio", "gauge", "Proporción de aciertos de cada caché desde el arranque.", ratios),
+    ]
+
+
+registry.register_collector(_collect_caches)
+
+
+# --- Middleware ASGI ---
+_RUN_ENDPOINTS = ("/run", "/run_sse")
+
+
+def _endpoint(path: str) -> str:
+    """Ruta con baja cardinalidad para las etiquetas."""
+    if path in _RUN_ENDPOINTS or path in ("/health", "/metrics"):
+        return path
+    if path.startswith("/apps/"):
+        return "/apps/*"
+    return "other"
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI puro (no bufferiza respuestas, así que no rompe el streaming SSE) que
+    mide latencia total, tiempo hasta el primer byte y peticiones en curso por app. En
+    /run y /run_sse el nombre de la app viene en el cuerpo JSON (appName), que se lee y
+    se vuelve a entregar intacto a la aplicación. El nombre lo envía el cliente: solo se
+    usan como etiqueta las apps conocidas (`app_names`) y el resto cuenta como "other".
+    """
+
+    def __init__(self, app, app_names: Iterable[str] = ()):
+        self.app = app
+        self.app_names = frozenset(app_names)
+
+    def _app_label(self, name: str) -> str:
+        if not name:
+            return "-"
+        return name if name in self.app_names else "other"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope.get("path", "")
+        endpoint = _endpoint(path)
+        app_name = "-"
+        if endpoint in _RUN_ENDPOINTS and scope.get("method") == "POST":
+            body, receive = await self._buffer_body(receive)
+            try:
+                payload = json.loads(body or b"{}")
+                app_name = self._app_label(str(payload.get("appName") or payload.get("app_name") or ""))
+            except (ValueError, AttributeError):
+                pass
+        elif endpoint == "/apps/*":
+            app_name = self._app_label(path.split("/")[2])
+
+        start = time.perf_counter()
+        status = {"code": 500, "first_byte": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body" and not status["first_byte"]:
+                status["first_byte"] = True
+                REQUEST_FIRST_BYTE.observe(time.perf_counter() - start, app=app_name, endpoint=endpoint)
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(app=app_name, endpoint=endpoint)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.dec(app=app_name, endpoint=endpoint)
+            REQUEST_DURATION.observe(time.perf_counter() - start, app=app_name, endpoint=endpoint, status=str(status["code"]))
+
+    @staticmethod
+    async def _buffer_body(receive) -> Tuple[bytes, Callable]:
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] != "http.request":
+                # Desconexión antes de terminar el cuerpo: se entrega tal cual
+                pending = [message]
+                break
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        else:
+            pending = []
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            if pending:
+                return pending.pop(0)
+            return await receive()
+
+        return body, replay
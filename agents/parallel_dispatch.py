@@ -0,0 +1,68 @@
+# agents/parallel_dispatch.py
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, List, Optional
+
+from google.adk.agents import BaseAgent
+from google.adk.tools import AgentTool, ToolContext
+
+logger = logging.getLogger(__name__)
+
+# Modo de consulta paralela del coordinador (herramienta consult_specialists)
+COORDINATOR_PARALLEL_DISPATCH = os.getenv("COORDINATOR_PARALLEL_DISPATCH", "true").lower() == "true"
+# Tiempo máximo por especialista: uno lento no retiene la respuesta de los demás indefinidamente
+SPECIALIST_TIMEOUT_SECONDS = float(os.getenv("SPECIALIST_TIMEOUT_SECONDS", "60"))
+
+
+class ParallelDispatcher:
+    """
+    Ejecuta varios especialistas a la vez, cada uno con su propia subpregunta, y combina
+    sus respuestas siempre en el mismo orden (el de `specialists`), sea cual sea el orden
+    en que terminen. La latencia total es la del especialista más lento.
+    """
+
+    def __init__(self, specialists: List[BaseAgent], timeout_seconds: float = SPECIALIST_TIMEOUT_SECONDS):
+        self.order = [agent.name for agent in specialists]
+        self.tools = {agent.name: AgentTool(agent) for agent in specialists}
+        self.timeout_seconds = timeout_seconds
+
+    async def _consult(self, name: str, request: str, tool_context: ToolContext) -> Dict[str, str]:
+        start = time.perf_counter()
+        try:
+            answer = await asyncio.wait_for(
+                self.tools[name].run_async(args={"request": request}, tool_context=tool_context),
+                timeout=self.timeout_seconds
+            )
+            status = "success" if answer else "partial"
+        except asyncio.TimeoutError:
+            answer = f"El especialista no respondió en {self.timeout_seconds:.0f} segundos."
+            status = "error"
+        except Exception as e:
+            logger.error("Error al consultar a '%s': %s", name, e)
+            answer = f"El especialista no está disponible en este momento: {e}"
+            status = "error"
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        logger.info("Especialista '%s' respondió en %.1fms (%s)", name, elapsed_ms, status)
+        return {"specialist": name, "request": request, "status": status, "answer": str(answer), "elapsed_ms": elapsed_ms}
+
+    async def dispatch(self, requests: Dict[str, Optional[str]], tool_context: ToolContext) -> Dict:
+        """`requests` asocia cada especialista con su subpregunta; los vacíos no se consultan."""
+        selected = [name for name in self.order if (requests.get(name) or "").strip()]
+        if not selected:
+            return {
+                "status": "error",
+                "responses": [],
+                "suggestion": "Indica la subpregunta de al menos un especialista."
+            }
+
+        start = time.perf_counter()
+        # gather conserva el orden de entrada: la combinación es determinista
+        responses = await asyncio.gather(*(self._consult(name, requests[name], tool_context) for name in selected))
+        statuses = {response["status"] for response in responses}
+        return {
+            "status": "success" if statuses == {"success"} else ("error" if statuses == {"error"} else "partial"),
+            "responses": list(responses),
+            "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+        }
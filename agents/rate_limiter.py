@@ -0,0 +1,83 @@
+# agents/rate_limiter.py
+import asyncio
+import threading
+import time
+from typing import Dict
+
+
+class RateLimitExceeded(Exception):
+    """No hay token disponible dentro de la espera máxima permitida."""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Límite de peticiones alcanzado; reintentar en {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Token bucket compartido por hilos y tareas asyncio: `rate` tokens por segundo con
+    ráfagas de hasta `capacity`. Cada llamada reserva su token bajo un lock que solo
+    protege la aritmética (nunca se duerme con él tomado) y después espera fuera de él,
+    con time.sleep en los hilos o asyncio.sleep en el bucle de eventos. Si el token no
+    llega dentro de `max_wait`, la reserva se rechaza sin consumir nada.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("El token bucket necesita rate > 0 y capacity >= 1")
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.granted = 0
+        self.rejected = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: float = 0.0) -> float:
+        """
+        Reserva un token y devuelve cuántos segundos hay que esperar para usarlo (0 si ya
+        está disponible). Los tokens pueden quedar en negativo: es la cola de reservas
+        pendientes, que se atiende en orden a medida que se recargan.
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            wait = max(0.0, (1.0 - self._tokens) / self.rate)
+            if wait > max_wait:
+                self.rejected += 1
+                raise RateLimitExceeded(wait)
+            self._tokens -= 1.0
+            self.granted += 1
+            return wait
+
+    def acquire(self, max_wait: float = 0.0) -> float:
+        """Versión bloqueante para hilos; devuelve la espera realizada."""
+        wait = self.reserve(max_wait)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, max_wait: float = 0.0) -> float:
+        """Versión async: la espera no bloquea el bucle de eventos."""
+        wait = self.reserve(max_wait)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+    def available(self) -> float:
+        """Tokens disponibles ahora (negativo si hay reservas en cola)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+    def stats(self) -> Dict:
+        return {
+            "rate_per_second": self.rate,
+            "capacity": self.capacity,
+            "available": round(self.available(), 3),
+            "granted": self.granted,
+            "rejected": self.rejected
+        }
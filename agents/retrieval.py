@@ -0,0 +1,246 @@
+# agents/retrieval.py
+import logging
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Collection, Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from agents.bm25 import fold_accents, reciprocal_rank_fusion, tokenize
+from agents.index_config import rescore, search_parameters
+from agents.index_registry import LoadedIndex
+from agents.metrics import RETRIEVAL_STAGE_DURATION
+from agents.tracing import set_attributes, tracer
+
+logger = logging.getLogger(__name__)
+
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+# Candidatos que aporta cada etapa antes de la fusión
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))
+# Consultas de hasta este número de términos se tratan como búsquedas por nombre
+EXACT_MATCH_MAX_TERMS = 6
+# Campos de metadatos con nombres propios (vinos, bodegas y platos de la carta)
+EXACT_MATCH_FIELDS = ("wine_name", "bodega", "dish_name")
+# Si un "nombre" coincide con más documentos que estos, no es una búsqueda por nombre ("brut")
+EXACT_MATCH_MAX_DOCS = 5
+
+
+@dataclass
+class RetrievalResult:
+    """Documentos recuperados junto con la estrategia usada y la latencia de cada etapa."""
+    documents: List[Document]
+    strategy: str
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+
+
+class _StageTimer:
+    """Acumula la duración de cada etapa en milisegundos; cada etapa es además un span."""
+
+    def __init__(self):
+        self.timings_ms: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            with tracer.start_as_current_span(f"retrieval.{name}") as span:
+                yield span
+        finally:
+            self.timings_ms[name] = round((time.perf_counter() - start) * 1000, 3)
+
+
+def _fetch_documents(loaded: LoadedIndex, positions: List[int]) -> List[Document]:
+    store = loaded.store
+    return [store.docstore.search(store.index_to_docstore_id[i]) for i in positions]
+
+
+def _exact_matches(loaded: LoadedIndex, query: str, candidates: List[int]) -> List[int]:
+    """
+    Candidatos BM25 cuyo nombre de vino, bodega o plato contiene literalmente la consulta
+    (sin tildes ni mayúsculas), p. ej. "Taittinger Brut Reserva". Solo aplica a consultas
+    cortas y a nombres selectivos.
+    """
+    terms = tokenize(query)
+    if not terms or len(terms) > EXACT_MATCH_MAX_TERMS:
+        return []
+    phrase = " ".join(fold_accents(query).split())
+    matches = [
+        position for position, doc in zip(candidates, _fetch_documents(loaded, candidates))
+        if any(
+            phrase in " ".join(fold_accents(str(doc.metadata.get(field, ""))).split())
+            for field in EXACT_MATCH_FIELDS
+        )
+    ]
+    return matches if len(matches) <= EXACT_MATCH_MAX_DOCS else []
+
+
+def embed_queries(embeddings, queries: List[str]) -> List[List[float]]:
+    """Embebe varias consultas en una sola llamada cuando el modelo lo permite."""
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(queries)
+    return [embeddings.embed_query(query) for query in queries]
+
+
+def vector_positions(
+    loaded: LoadedIndex,
+    embeddings: List[List[float]],
+    k: int,
+    candidates: Optional[Collection[int]] = None
+) -> List[List[int]]:
+    """
+    Busca en FAISS un lote de consultas con una sola llamada y devuelve, por consulta, las
+    posiciones de los k vecinos más cercanos. Con `candidates` la búsqueda se limita a ese
+    subconjunto mediante un selector de ids de FAISS. En los índices PQ los candidatos se
+    re-puntúan con la copia float16 de los vectores.
+    """
+    index = loaded.store.index
+    queries = np.array(embeddings, dtype=np.float32)
+    if loaded.rescore_vectors is None:
+        return _faiss_positions(index, queries, k, candidates)
+
+    # Índices PQ: se piden más candidatos y se reordenan con los vectores float16
+    rankings = _faiss_positions(index, queries, k * loaded.rescore_factor, candidates)
+    return rescore(queries, rankings, loaded.rescore_vectors, k)
+
+
+def _faiss_positions(index: faiss.Index, queries: np.ndarray, k: int, candidates: Optional[Collection[int]]) -> List[List[int]]:
+    if candidates is None:
+        _, indices = index.search(queries, k)
+        return [[int(i) for i in row if i != -1] for row in indices]
+
+    ids = np.fromiter(sorted(candidates), dtype=np.int64)
+    try:
+        params = search_parameters(index, faiss.IDSelectorBatch(ids))
+        _, indices = index.search(queries, min(k, len(ids)), params=params)
+        return [[int(i) for i in row if i != -1] for row in indices]
+    except (AttributeError, TypeError, RuntimeError):
+        # Versiones de FAISS sin SearchParameters: búsqueda exacta sobre los candidatos
+        vectors = np.vstack([index.reconstruct(int(i)) for i in ids])
+        rankings = []
+        for query in queries:
+            distances = ((vectors - query) ** 2).sum(axis=1)
+            rankings.append([int(ids[i]) for i in np.argsort(distances, kind="stable")[:k]])
+        return rankings
+
+
+def unsupported_filters(loaded: LoadedIndex, filters: Optional[Dict]) -> List[str]:
+    """Filtros con valor que el índice no puede aplicar (sin índice de metadatos, ninguno)."""
+    if not filters:
+        return []
+    if loaded.metadata is None:
+        return [key for key, value in filters.items() if value not in (None, "")]
+    return loaded.metadata.unsupported(filters)
+
+
+def search_index(loaded: LoadedIndex, query: str, k: int, filters: Optional[Dict] = None) -> RetrievalResult:
+    """
+    Recuperación híbrida: BM25 local + búsqueda vectorial fusionadas con Reciprocal Rank
+    Fusion. Si la consulta es un nombre que aparece literalmente en algún documento
+    (vino, bodega o plato), se responde solo con BM25 y no se llama al modelo de embeddings.
+    Los filtros de metadatos (categoría, bodega, sección, precio) se resuelven primero a un
+    conjunto de candidatos y ambas búsquedas se ejecutan solo sobre ese subconjunto.
+    """
+    return search_index_batch(loaded, [query], k, filters)[0]
+
+
+def search_index_batch(
+    loaded: LoadedIndex,
+    queries: List[str],
+    k: int,
+    filters: Optional[Dict] = None
+) -> List[RetrievalResult]:
+    """
+    Versión por lotes de `search_index`: las consultas que no se resuelven por nombre exacto
+    se embeben en una sola llamada y se buscan en FAISS con una sola búsqueda por lotes.
+    """
+    with tracer.start_as_current_span("retrieval.search") as span:
+        results = _search_batch(loaded, queries, k, filters)
+        set_attributes(
+            span,
+            **{
+                "retrieval.index": os.path.basename(loaded.path),
+                "retrieval.k": k,
+                "retrieval.queries": len(queries),
+                "retrieval.filtered": bool(filters and any(v is not None for v in filters.values())),
+                "retrieval.strategy": ",".join(sorted({result.strategy for result in results})),
+                "retrieval.result_count": sum(len(result.documents) for result in results)
+            }
+        )
+        return results
+
+
+def _search_batch(loaded: LoadedIndex, queries: List[str], k: int, filters: Optional[Dict]) -> List[RetrievalResult]:
+    timer = _StageTimer()
+    fetch_k = max(k, HYBRID_FETCH_K)
+    bm25 = loaded.bm25 if HYBRID_SEARCH else None
+
+    candidates = None
+    if filters and loaded.metadata is not None:
+        with timer.stage("metadata_filter") as span:
+            candidates = loaded.metadata.resolve(filters)
+            set_attributes(span, **{"retrieval.candidates": len(candidates) if candidates is not None else None})
+        if candidates is not None and not candidates:
+            _log(loaded, "filtered_empty", timer)
+            return [RetrievalResult([], "filtered_empty", timer.timings_ms) for _ in queries]
+
+    rankings: List[Optional[List[int]]] = [None] * len(queries)
+    strategies = ["vector"] * len(queries)
+    bm25_rankings: List[List[int]] = [[] for _ in queries]
+    if bm25 is not None:
+        with timer.stage("bm25"):
+            bm25_rankings = [[doc_id for doc_id, _ in bm25.search(query, fetch_k, candidates)] for query in queries]
+
+        with timer.stage("exact_match"):
+            for i, query in enumerate(queries):
+                exact = _exact_matches(loaded, query, bm25_rankings[i])
+                if exact:
+                    rankings[i] = exact + [p for p in bm25_rankings[i] if p not in exact]
+                    strategies[i] = "exact_match"
+
+    pending = [i for i, ranking in enumerate(rankings) if ranking is None]
+    if pending:
+        with timer.stage("embedding"):
+            embeddings = embed_queries(loaded.store.embedding_function, [queries[i] for i in pending])
+        with timer.stage("vector_search") as span:
+            vector_k = fetch_k if bm25 is not None else k
+            vector_rankings = vector_positions(loaded, embeddings, vector_k, candidates)
+            set_attributes(
+                span,
+                **{
+                    "faiss.queries": len(pending),
+                    "faiss.k": vector_k,
+                    "faiss.rescore_factor": loaded.rescore_factor if loaded.rescore_vectors is not None else None
+                }
+            )
+
+        with timer.stage("fusion"):
+            for i, vector_ranking in zip(pending, vector_rankings):
+                if bm25_rankings[i]:
+                    rankings[i] = reciprocal_rank_fusion([vector_ranking, bm25_rankings[i]])
+                    strategies[i] = "hybrid"
+                else:
+                    rankings[i] = vector_ranking
+
+    with timer.stage("fetch_documents"):
+        documents = [_fetch_documents(loaded, ranking[:k]) for ranking in rankings]
+
+    _log(loaded, ",".join(sorted(set(strategies))), timer)
+    return [
+        RetrievalResult(documents=docs, strategy=strategy, timings_ms=timer.timings_ms)
+        for docs, strategy in zip(documents, strategies)
+    ]
+
+
+def _log(loaded: LoadedIndex, strategy: str, timer: _StageTimer):
+    index_name = os.path.basename(loaded.path)
+    for stage, ms in timer.timings_ms.items():
+        RETRIEVAL_STAGE_DURATION.observe(ms / 1000, index=index_name, stage=stage)
+    logger.info(
+        "Recuperación en '%s' (%s): %s",
+        index_name, strategy,
+        ", ".join(f"{stage}={ms}ms" for stage, ms in timer.timings_ms.items())
+    )
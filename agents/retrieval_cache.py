@@ -0,0 +1,164 @@
+# agents/retrieval_cache.py
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from agents.embedding_cache import normalize_text
+
+# Fichero que data_ingestion/ingest.py escribe junto a cada índice al reconstruirlo
+INDEX_VERSION_FILE = "index_version.json"
+UNVERSIONED = "unversioned"
+
+_version_lock = threading.Lock()
+_version_cache: Dict[str, Tuple[float, str]] = {}
+
+
+def write_index_version(index_path: str, documents: int, **details) -> str:
+    """
+    Escribe un identificador de versión nuevo para un índice recién construido.
+    Los `details` (p. ej. los ajustes del índice) se guardan junto a la versión.
+    """
+    version_id = f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    with open(os.path.join(index_path, INDEX_VERSION_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "version_id": version_id,
+            "created_at": time.time(),
+            "documents": documents,
+            **details
+        }, f, ensure_ascii=False, indent=2)
+    return version_id
+
+
+def read_index_version(index_path: str) -> str:
+    """
+    Devuelve la versión actual de un índice. Solo relee el fichero cuando cambia su mtime,
+    así que puede llamarse en cada consulta.
+    """
+    version_path = os.path.join(index_path, INDEX_VERSION_FILE)
+    try:
+        mtime = os.stat(version_path).st_mtime
+    except OSError:
+        return UNVERSIONED
+
+    with _version_lock:
+        cached = _version_cache.get(version_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    try:
+        with open(version_path, "r", encoding="utf-8") as f:
+            version_id = json.load(f).get("version_id", UNVERSIONED)
+    except (OSError, ValueError):
+        version_id = UNVERSIONED
+
+    with _version_lock:
+        _version_cache[version_path] = (mtime, version_id)
+    return version_id
+
+
+def read_index_details(index_path: str) -> Dict:
+    """Contenido completo del fichero de versión (vacío en índices sin versión)."""
+    try:
+        with open(os.path.join(index_path, INDEX_VERSION_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def read_index_settings(index_path: str) -> Dict:
+    """Ajustes con los que se construyó el índice (vacío en índices antiguos)."""
+    return read_index_details(index_path).get("index_settings") or {}
+
+
+def _estimate_size(value: Any) -> int:
+    """Estimación barata del tamaño en bytes de un resultado formateado."""
+    if isinstance(value, dict):
+        return sum(_estimate_size(k) + _estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_estimate_size(v) for v in value)
+    if isinstance(value, str):
+        return len(value)
+    return 16
+
+
+class ResultCache:
+    """
+    Caché LRU con TTL y presupuesto de memoria para los resultados formateados de
+    las consultas a la base de conocimientos. Cada entrada queda ligada a la versión
+    del índice, de modo que una reconstrucción invalida las entradas antiguas.
+    """
+
+    def __init__(self, ttl_seconds: float = 600, max_bytes: int = 8 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple, Tuple[float, int, Dict]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(agent_name: str, k: int, query: str, version: str, filters: Optional[Dict] = None) -> Tuple:
+        active_filters = tuple(sorted((key, value) for key, value in (filters or {}).items() if value is not None))
+        return (agent_name, k, normalize_text(query), active_filters, version)
+
+    def get(self, key: Tuple) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, size, value = entry
+            if expires_at < now:
+                self._discard(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, value: Dict):
+        size = _estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, size, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+
+    def _discard(self, key: Tuple):
+        """Elimina una entrada. Requiere tener el lock."""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+# Caché compartida por todos los agentes especialistas del proceso
+result_cache = ResultCache(
+    ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "600")),
+    max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+)
@@ -0,0 +1,115 @@
+# agents/stub_models.py
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from typing import AsyncGenerator, List, Optional
+
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.models.registry import LLMRegistry
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# Sustituye Gemini por un modelo local determinista (pruebas de carga sin red ni cuota)
+STUB_LLM = os.getenv("STUB_LLM", "false").lower() == "true"
+# Latencia simulada de cada llamada al modelo (hasta el primer fragmento en streaming)
+STUB_LLM_LATENCY_MS = float(os.getenv("STUB_LLM_LATENCY_MS", "800"))
+# Fragmentos de la respuesta final en modo streaming y pausa entre ellos
+STUB_LLM_STREAM_CHUNKS = int(os.getenv("STUB_LLM_STREAM_CHUNKS", "5"))
+STUB_LLM_CHUNK_INTERVAL_MS = float(os.getenv("STUB_LLM_CHUNK_INTERVAL_MS", "40"))
+
+_TRANSFER_TOOL = "transfer_to_agent"
+
+
+def _user_text(llm_request: LlmRequest) -> str:
+    """Texto de la última pregunta del usuario en la conversación."""
+    for content in reversed(llm_request.contents or []):
+        if content.role == "user":
+            text = "".join(part.text or "" for part in (content.parts or []) if not part.function_response)
+            if text.strip():
+                return text.strip()
+    return ""
+
+
+def _declarations(llm_request: LlmRequest) -> List[types.FunctionDeclaration]:
+    config_tools = (llm_request.config.tools if llm_request.config else None) or []
+    return [declaration for tool in config_tools for declaration in (getattr(tool, "function_declarations", None) or [])]
+
+
+def _transfer_targets(declaration: types.FunctionDeclaration) -> List[str]:
+    """Agentes admitidos por transfer_to_agent, leídos de la declaración que vería el LLM."""
+    schema = declaration.parameters_json_schema
+    if isinstance(schema, dict):
+        return list((schema.get("properties", {}).get("agent_name") or {}).get("enum") or [])
+    if declaration.parameters and declaration.parameters.properties:
+        agent_name = declaration.parameters.properties.get("agent_name")
+        return list(agent_name.enum or []) if agent_name else []
+    return []
+
+
+class StubLlm(BaseLlm):
+    """
+    Modelo determinista que imita el comportamiento de los agentes sin llamar a Gemini:
+    el coordinador delega en un especialista elegido por el hash de la pregunta, el
+    especialista consulta su base de conocimientos y, tras la respuesta de la herramienta,
+    contesta con un resumen. Así una prueba de carga ejercita transferencias, herramientas,
+    FAISS y streaming del servidor con una latencia de modelo fija y configurable.
+    """
+
+    model: str = "stub"
+
+    @classmethod
+    def supported_models(cls) -> List[str]:
+        # Los mismos nombres que Gemini: los agentes no cambian su configuración
+        return [r"gemini-.*"]
+
+    def _next_call(self, llm_request: LlmRequest) -> Optional[types.FunctionCall]:
+        last = llm_request.contents[-1] if llm_request.contents else None
+        if last is None or any(part.function_response for part in (last.parts or [])):
+            return None
+        question = _user_text(llm_request)
+        declarations = _declarations(llm_request)
+        knowledge_base = next((d for d in declarations if d.name.endswith("_kb")), None)
+        if knowledge_base is not None:
+            return types.FunctionCall(name=knowledge_base.name, args={"query": question})
+        transfer = next((d for d in declarations if d.name == _TRANSFER_TOOL), None)
+        targets = _transfer_targets(transfer) if transfer is not None else []
+        if targets:
+            digest = int(hashlib.md5(question.encode("utf-8")).hexdigest(), 16)
+            return types.FunctionCall(name=_TRANSFER_TOOL, args={"agent_name": sorted(targets)[digest % len(targets)]})
+        return None
+
+    @staticmethod
+    def _answer(llm_request: LlmRequest) -> str:
+        last = llm_request.contents[-1] if llm_request.contents else None
+        responses = [part.function_response.response for part in (last.parts or []) if part.function_response] if last else []
+        if responses:
+            summary = json.dumps(responses[0], ensure_ascii=False)[:400]
+            return f"Respuesta de prueba basada en la herramienta: {summary}"
+        return f"Respuesta de prueba a: {_user_text(llm_request)}"
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        await asyncio.sleep(STUB_LLM_LATENCY_MS / 1000)
+        call = self._next_call(llm_request)
+        if call is not None:
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+            return
+
+        answer = self._answer(llm_request)
+        if stream and STUB_LLM_STREAM_CHUNKS > 1:
+            size = max(1, -(-len(answer) // STUB_LLM_STREAM_CHUNKS))
+            for start in range(0, len(answer), size):
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=answer[start:start + size])]), partial=True)
+                await asyncio.sleep(STUB_LLM_CHUNK_INTERVAL_MS / 1000)
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=answer)]), turn_complete=True)
+
+
+def install_stub_llm():
+    """Registra StubLlm para los modelos gemini-* de todos los agentes del proceso."""
+    LLMRegistry.register(StubLlm)
+    logger.warning(
+        "Modo de prueba: Gemini sustituido por StubLlm (%.0fms por llamada, %d fragmentos)",
+        STUB_LLM_LATENCY_MS, STUB_LLM_STREAM_CHUNKS
+    )
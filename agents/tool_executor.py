@@ -0,0 +1,26 @@
+# agents/tool_executor.py
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+# Hilos para el trabajo bloqueante de las herramientas (búsqueda FAISS, embeddings, carga de
+# índices). El límite evita que una ráfaga de sesiones sature la CPU o agote los sockets.
+TOOL_EXECUTOR_WORKERS = int(os.getenv("TOOL_EXECUTOR_WORKERS", "8"))
+
+_executor = ThreadPoolExecutor(max_workers=TOOL_EXECUTOR_WORKERS, thread_name_prefix="tool-worker")
+
+
+async def run_blocking(func: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Ejecuta una función bloqueante en el pool acotado de herramientas sin bloquear el
+    bucle de eventos, de modo que las demás sesiones siguen transmitiendo mientras tanto.
+    El contexto (span de traza actual incluido) se copia al hilo, como en asyncio.to_thread.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(context.run, func, *args, **kwargs))
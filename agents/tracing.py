@@ -0,0 +1,122 @@
+# agents/tracing.py
+import functools
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable, Sequence
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter, SpanExportResult
+
+logger = logging.getLogger(__name__)
+
+# Fichero JSONL donde se exportan los spans (vacío = sin exportación a fichero). Para un
+# colector OTLP basta con OTEL_EXPORTER_OTLP_ENDPOINT, que ya configura ADK.
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+
+# Mismo proveedor que los spans de ADK (invoke_agent, execute_tool, call_llm): los de las
+# herramientas cuelgan de ellos en la misma traza
+tracer = trace.get_tracer("maitre_digital.agents")
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Escribe cada span terminado como una línea JSON (una traza se reconstruye por trace_id)."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def _to_dict(span: ReadableSpan) -> dict:
+        context = span.get_span_context()
+        return {
+            "name": span.name,
+            "trace_id": format(context.trace_id, "032x"),
+            "span_id": format(context.span_id, "016x"),
+            "parent_span_id": format(span.parent.span_id, "016x") if span.parent else None,
+            "start_time_unix_nano": span.start_time,
+            "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+            "status": span.status.status_code.name,
+            "attributes": dict(span.attributes or {}),
+        }
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(self._to_dict(span), ensure_ascii=False) + "\n" for span in spans)
+        try:
+            with self._lock:
+                self._file.write(lines)
+                self._file.flush()
+        except OSError as e:
+            logger.warning("No se pudieron escribir las trazas en '%s': %s", self.path, e)
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+def configure_tracing(trace_file: str = TRACE_FILE):
+    """
+    Añade la exportación a fichero al proveedor de trazas del proceso. Se llama después de
+    crear la app de ADK, que ya instala su propio proveedor (y el exportador OTLP si procede).
+    """
+    if not trace_file:
+        return
+    provider = trace.get_tracer_provider()
+    if not isinstance(provider, TracerProvider):
+        provider = TracerProvider()
+        trace.set_tracer_provider(provider)
+    provider.add_span_processor(BatchSpanProcessor(JsonlSpanExporter(trace_file)))
+    logger.info("Trazas exportadas a '%s'", trace_file)
+
+
+@contextmanager
+def tool_span(name: str, tool_context=None, **attributes):
+    """
+    Span de una herramienta enlazado con la sesión, la invocación y la llamada de función
+    de ADK que la ejecuta. Los atributos con valor None se omiten.
+    """
+    with tracer.start_as_current_span(name) as span:
+        if tool_context is not None:
+            span.set_attribute("adk.invocation_id", tool_context.invocation_id)
+            if tool_context.function_call_id:
+                span.set_attribute("adk.function_call_id", tool_context.function_call_id)
+            # _invocation_context: las versiones de ADK anteriores no exponen la sesión en el contexto
+            span.set_attribute("adk.session_id", tool_context._invocation_context.session.id)
+        set_attributes(span, **attributes)
+        yield span
+
+
+def set_attributes(span, **attributes):
+    for key, value in attributes.items():
+        if value is not None:
+            span.set_attribute(key, value)
+
+
+def annotate(**attributes):
+    """Añade atributos al span actual (el de la herramienta o la etapa en curso)."""
+    set_attributes(trace.get_current_span(), **attributes)
+
+
+def traced_tool(func: Callable, **attributes) -> Callable:
+    """
+    Envuelve una herramienta async de ADK en un span con su nombre. La herramienta debe
+    aceptar `tool_context` para que ADK se lo pase y el span quede enlazado a la sesión.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with tool_span(func.__name__, kwargs.get("tool_context"), **attributes) as span:
+            result = await func(*args, **kwargs)
+            if isinstance(result, dict):
+                set_attributes(span, **{"tool.status": result.get("status")})
+            return result
+
+    return wrapper
@@ -1,117 +1,108 @@
 import os
+import asyncio
 import requests
 import json
-from typing import Dict, List, Optional
+import random
+import threading
+from typing import Dict, List, Optional, Set, Tuple
 import time
 
+import aiohttp
+from requests.adapters import HTTPAdapter
+
+from agents.metrics import (
+    USDA_COALESCED, USDA_RATE_LIMIT_WAIT, USDA_RATE_LIMITED, USDA_REQUEST_DURATION, USDA_RETRIES, register_cache, registry
+)
+from agents.rate_limiter import RateLimitExceeded, TokenBucket
+from agents.tool_executor import run_blocking
+from agents.tracing import set_attributes, tracer
+from agents.usda_cache import CachedResponse, USDAResponseCache
+from agents.fdc_mirror import FDC_MIRROR_MODE, FoodDataMirror
+from agents.food_translator import food_translator
+
+# Cuota de la API (1000 peticiones/hora por clave) y ráfaga máxima permitida
+USDA_RATE_LIMIT_PER_HOUR = float(os.getenv("USDA_RATE_LIMIT_PER_HOUR", "1000"))
+USDA_RATE_LIMIT_BURST = float(os.getenv("USDA_RATE_LIMIT_BURST", "10"))
+# Espera máxima por un token; si se supera se responde al momento (0 = no esperar nunca)
+USDA_RATE_LIMIT_MAX_WAIT_SECONDS = float(os.getenv("USDA_RATE_LIMIT_MAX_WAIT_SECONDS", "0"))
+# URL base de la API (p. ej. benchmarks/fake_fdc_server.py para pruebas locales)
+USDA_API_BASE_URL = os.getenv("USDA_API_BASE_URL", "https://api.nal.usda.gov/fdc/v1").rstrip("/")
+# Conexiones del pool y peticiones simultáneas como máximo
+USDA_MAX_CONNECTIONS = int(os.getenv("USDA_MAX_CONNECTIONS", "20"))
+USDA_MAX_CONCURRENCY = int(os.getenv("USDA_MAX_CONCURRENCY", "8"))
+# Reintentos ante 429, 5xx, timeouts y errores de conexión, con backoff exponencial y jitter
+USDA_MAX_RETRIES = int(os.getenv("USDA_MAX_RETRIES", "2"))
+USDA_BACKOFF_BASE_SECONDS = float(os.getenv("USDA_BACKOFF_BASE_SECONDS", "0.25"))
+USDA_BACKOFF_MAX_SECONDS = float(os.getenv("USDA_BACKOFF_MAX_SECONDS", "2"))
+# Tiempo máximo de cada intento y plazo total de la búsqueda (reintentos incluidos)
+USDA_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("USDA_ATTEMPT_TIMEOUT_SECONDS", "4"))
+USDA_DEADLINE_SECONDS = float(os.getenv("USDA_DEADLINE_SECONDS", "8"))
+
 class USDAFoodDataAPI:
     """Cliente para la API USDA FoodData Central"""
     
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv("USDA_API_KEY", "ToxKfxHz0Twh1ED6COLu4gYkdRjQYLpzEfVH6JsT")
-        self.base_url = "https://api.nal.usda.gov/fdc/v1"
+        self.base_url = USDA_API_BASE_URL
         self.session = requests.Session()
+        # Sin reintentos en urllib3: _request reintenta a mano para que cada intento consuma un token
+        self.session.mount("https://", HTTPAdapter(pool_maxsize=USDA_MAX_CONNECTIONS, max_retries=0))
+        self.session.mount("http://", HTTPAdapter(pool_maxsize=USDA_MAX_CONNECTIONS, max_retries=0))
+        # Sesión aiohttp para las herramientas async; se crea en el bucle de eventos que la usa
+        self._async_session: Optional[aiohttp.ClientSession] = None
+        self._request_slots: Optional[asyncio.Semaphore] = None
+        # Peticiones async en curso por búsqueda (single-flight)
+        self._in_flight: Dict[str, asyncio.Task] = {}
         
-        # Rate limiting: 1000 requests/hour = ~16 requests/minute
-        self.last_request_time = 0
-        self.min_request_interval = 4  # seconds between requests (safe margin)
+        # Rate limiting: token bucket con la cuota real, compartido por hilos y tareas async
+        self.rate_limiter = TokenBucket(rate=USDA_RATE_LIMIT_PER_HOUR / 3600, capacity=USDA_RATE_LIMIT_BURST)
+        self.max_wait = USDA_RATE_LIMIT_MAX_WAIT_SECONDS
+        # Respuestas persistentes por búsqueda: TTL, LRU y stale-while-revalidate; también
+        # sirven de respaldo cuando no quedan tokens o la API falla
+        self.cache = USDAResponseCache()
+        self._refreshing: Set[str] = set()
+        self._refresh_lock = threading.Lock()
+        self._refresh_tasks: Set[asyncio.Task] = set()
+        # Réplica local de Foundation y SR Legacy (data_ingestion/import_fdc.py), sin cuota
+        self.mirror = FoodDataMirror.open() if FDC_MIRROR_MODE != "off" else None
         
-        # Diccionario de traducción español -> inglés para alimentos comunes
-        self.translation_dict = {
-            'salmón': 'salmon',
-            'salmon': 'salmon',
-            'pollo': 'chicken',
-            'pechuga de pollo': 'chicken breast',
-            'pecho de pollo': 'chicken breast',
-            'ternera': 'beef',
-            'carne de res': 'beef',
-            'cerdo': 'pork',
-            'pescado': 'fish',
-            'atún': 'tuna',
-            'bacalao': 'cod',
-            'merluza': 'hake',
-            'arroz': 'rice',
-            'pasta': 'pasta',
-            'pan': 'bread',
-            'huevo': 'egg',
-            'huevos': 'eggs',
-            'leche': 'milk',
-            'queso': 'cheese',
-            'yogur': 'yogurt',
-            'mantequilla': 'butter',
-            'aceite': 'oil',
-            'aceite de oliva': 'olive oil',
-            'tomate': 'tomato',
-            'tomates': 'tomatoes',
-            'cebolla': 'onion',
-            'ajo': 'garlic',
-            'patata': 'potato',
-            'papa': 'potato',
-            'patatas': 'potatoes',
-            'papas': 'potatoes',
-            'zanahoria': 'carrot',
-            'brócoli': 'broccoli',
-            'espinacas': 'spinach',
-            'lechuga': 'lettuce',
-            'manzana': 'apple',
-            'naranja': 'orange',
-            'plátano': 'banana',
-            'fresa': 'strawberry',
-            'fresas': 'strawberries',
-            'uva': 'grape',
-            'uvas': 'grapes',
-            'almendras': 'almonds',
-            'nueces': 'walnuts',
-            'avena': 'oats',
-            'quinoa': 'quinoa',
-            'lentejas': 'lentils',
-            'garbanzos': 'chickpeas',
-            'frijoles': 'beans',
-            'judías': 'beans'
-        }
+        # Léxico español -> inglés de alimentos (agents/data/food_lexicon_es_en.json)
+        self.translator = food_translator
     
     def _translate_query(self, query: str) -> str:
         """
-        Traduce términos comunes del español al inglés para la API USDA
+        Traduce al inglés todos los alimentos de la consulta para la API USDA, con la
+        coincidencia más larga ('pechuga de pollo con arroz' -> 'chicken breast, rice')
         """
-        query_lower = query.lower().strip()
-        
-        # Buscar coincidencia exacta primero
-        if query_lower in self.translation_dict:
-            return self.translation_dict[query_lower]
-        
-        # Buscar coincidencias parciales
-        for spanish_term, english_term in self.translation_dict.items():
-            if spanish_term in query_lower:
-                return english_term
-        
-        # Si no encuentra traducción, devolver original (podría ya estar en inglés)
-        return query
+        return self.translator.translate(query.strip())
     
-    def _rate_limit(self):
-        """Implementa rate limiting simple"""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
-        if time_since_last < self.min_request_interval:
-            time.sleep(self.min_request_interval - time_since_last)
-        self.last_request_time = time.time()
+    def _rate_limit(self) -> float:
+        """Toma un token del bucket. Devuelve la espera en segundos; RateLimitExceeded si no hay"""
+        wait = self.rate_limiter.acquire(self.max_wait)
+        USDA_RATE_LIMIT_WAIT.observe(wait)
+        return wait
     
-    def search_foods(self, query: str, data_types: List[str] = None, page_size: int = 5) -> Dict:
-        """
-        Busca alimentos en la API USDA
-        
-        Args:
-            query: Término de búsqueda en español o inglés (se traduce automáticamente)
-            data_types: Tipos de datos a incluir ["Foundation", "SR Legacy", "Survey", "Branded"]
-            page_size: Número de resultados (máximo 200)
-        """
-        self._rate_limit()
-        
+    async def _rate_limit_async(self) -> float:
+        """Igual que _rate_limit, pero esperando sin bloquear el bucle de eventos"""
+        wait = await self.rate_limiter.acquire_async(self.max_wait)
+        USDA_RATE_LIMIT_WAIT.observe(wait)
+        return wait
+    
+    def _rate_limited_result(self, error: RateLimitExceeded, has_fallback: bool) -> Dict:
+        """Sin tokens: error inmediato (quien llama recurre a la caché si tiene la búsqueda)"""
+        USDA_RATE_LIMITED.inc(fallback="cache" if has_fallback else "none")
+        return {
+            "error": f"Límite de consultas a la API USDA alcanzado; reintentar en {error.retry_after:.0f}s",
+            "foods": [],
+            "rate_limited": True,
+            "retry_after": round(error.retry_after, 1)
+        }
+    
+    def _build_search(self, query: str, data_types: Optional[List[str]], page_size: int) -> Tuple[str, Dict]:
+        """Traduce la consulta y construye el cuerpo de /foods/search"""
         # Traducir consulta al inglés
         english_query = self._translate_query(query)
         
-        url = f"{self.base_url}/foods/search"
-        
         payload = {
             "query": english_query,  # Usar consulta traducida
             "pageSize": min(page_size, 10),  # Limitar para no saturar respuestas
@@ -124,25 +115,349 @@ class USDAFoodDataAPI:
             # Por defecto, usar datos más confiables
             payload["dataType"] = ["Foundation", "SR Legacy"]
         
+        return english_query, payload
+    
+    @staticmethod
+    def _add_translation_info(result: Dict, query: str, english_query: str) -> Dict:
+        # Agregar información de traducción al resultado
+        if english_query != query:
+            result['translation_info'] = f"Consulta traducida: '{query}' → '{english_query}'"
+        return result
+    
+    @staticmethod
+    def _fallback_reason(failed: Dict) -> str:
+        return "límite de la API USDA alcanzado" if failed.get("rate_limited") else "API USDA no disponible"
+    
+    def _from_cache(self, span, cached: CachedResponse, query: str, english_query: str, failed: Optional[Dict] = None) -> Dict:
+        """Respuesta guardada; `failed` es el error de la API cuando se sirve como respaldo"""
+        result = dict(cached.response)
+        if failed is not None:
+            state = "fallback"
+            result["fallback_reason"] = self._fallback_reason(failed)
+        else:
+            state = "fresh" if cached.fresh else "stale"
+        set_attributes(span, **{
+            "usda.query": query,
+            "usda.english_query": english_query,
+            "usda.cache": state,
+            "usda.cache_age_s": round(cached.age)
+        })
+        return self._add_translation_info(result, query, english_query)
+    
+    def _search_mirror(self, span, query: str, english_query: str, payload: Dict) -> Dict:
+        """Búsqueda en la réplica local con el mismo cuerpo que se enviaría a la API"""
+        start = time.perf_counter()
+        result = self.mirror.search(payload["query"], payload.get("dataType"), payload["pageSize"])
+        set_attributes(span, **{
+            "usda.query": query,
+            "usda.english_query": english_query,
+            "usda.source": "mirror",
+            "usda.mirror_ms": round((time.perf_counter() - start) * 1000, 3)
+        })
+        result["data_source"] = "mirror"
+        return self._add_translation_info(result, query, english_query)
+    
+    def _local_first(self, span, query: str, english_query: str, payload: Dict) -> Optional[Dict]:
+        """En modo prefer/only responde la réplica (en only, aunque no encuentre nada)"""
+        if self.mirror is None or FDC_MIRROR_MODE not in ("prefer", "only"):
+            return None
+        result = self._search_mirror(span, query, english_query, payload)
+        return result if result["foods"] or FDC_MIRROR_MODE == "only" else None
+    
+    def _fallback(self, span, failed: Dict, cached: Optional[CachedResponse], query: str, english_query: str, payload: Dict) -> Dict:
+        """La API no respondió: la caché (aunque esté caducada), la réplica local o el error"""
+        if cached is not None:
+            return self._from_cache(span, cached, query, english_query, failed=failed)
+        if self.mirror is not None and FDC_MIRROR_MODE == "fallback":
+            result = self._search_mirror(span, query, english_query, payload)
+            if result["foods"]:
+                result["fallback_reason"] = self._fallback_reason(failed)
+                return result
+        return failed
+    
+    def _claim_refresh(self, key: str) -> bool:
+        """Solo una revalidación en curso por búsqueda"""
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+    
+    def _release_refresh(self, key: str):
+        with self._refresh_lock:
+            self._refreshing.discard(key)
+    
+    def search_foods(self, query: str, data_types: List[str] = None, page_size: int = 5) -> Dict:
+        """
+        Busca alimentos en la API USDA
+        
+        Args:
+            query: Término de búsqueda en español o inglés (se traduce automáticamente)
+            data_types: Tipos de datos a incluir ["Foundation", "SR Legacy", "Survey", "Branded"]
+            page_size: Número de resultados (máximo 200)
+        """
+        with tracer.start_as_current_span("usda.search") as span:
+            english_query, payload = self._build_search(query, data_types, page_size)
+            local = self._local_first(span, query, english_query, payload)
+            if local is not None:
+                return local
+            cached = self.cache.lookup(payload)
+            if cached is not None and (cached.fresh or cached.revalidate):
+                if cached.revalidate:
+                    self._revalidate(payload)
+                return self._from_cache(span, cached, query, english_query)
+            
+            result = self._request(span, query, english_query, payload, has_fallback=cached is not None)
+            if "error" in result:
+                return self._fallback(span, result, cached, query, english_query, payload)
+            return self._add_translation_info(result, query, english_query)
+    
+    def _request(self, span, query: str, english_query: str, payload: Dict, has_fallback: bool = False) -> Dict:
+        """
+        Llama a /foods/search con reintentos dentro del plazo total, como _fetch_async: cada
+        intento toma un token, así los reintentos tampoco superan la cuota configurada
+        """
+        deadline = time.monotonic() + USDA_DEADLINE_SECONDS
+        wait = 0.0
+        result: Dict = {}
+        attempts = 0
+        for attempt in range(USDA_MAX_RETRIES + 1):
+            try:
+                wait += self._rate_limit()
+            except RateLimitExceeded as e:
+                if attempt == 0:
+                    set_attributes(span, **{"usda.rate_limited": True, "usda.retry_after_s": round(e.retry_after, 1)})
+                    return self._rate_limited_result(e, has_fallback)
+                # Sin tokens para reintentar: se devuelve el último error
+                break
+            attempts += 1
+            result, status, retry_after = self._attempt(span, query, english_query, payload, deadline, wait)
+            if retry_after is None or attempt == USDA_MAX_RETRIES:
+                break
+            backoff = self._backoff(attempt, retry_after)
+            if time.monotonic() + backoff >= deadline:
+                break
+            USDA_RETRIES.inc(status=status)
+            time.sleep(backoff)
+        set_attributes(span, **{"usda.attempts": attempts})
+        return result
+    
+    def _attempt(self, span, query: str, english_query: str, payload: Dict, deadline: float, wait: float) -> Tuple[Dict, str, Optional[float]]:
+        """Un intento síncrono; devuelve lo mismo que _attempt_async"""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return {"error": "Error en API USDA: plazo agotado", "foods": []}, "timeout", None
+        url = f"{self.base_url}/foods/search"
         params = {"api_key": self.api_key}
         
+        start = time.perf_counter()
+        status = "error"
         try:
             response = self.session.post(
                 url, 
                 json=payload, 
                 params=params,
-                timeout=10
+                timeout=min(USDA_ATTEMPT_TIMEOUT_SECONDS, remaining)
             )
+            status = str(response.status_code)
+            if response.status_code == 429 or response.status_code >= 500:
+                error = {"error": f"Error en API USDA: HTTP {response.status_code}", "foods": []}
+                return error, status, self._retry_after(response.headers.get("Retry-After"))
             response.raise_for_status()
             result = response.json()
-            
-            # Agregar información de traducción al resultado
-            if english_query != query:
-                result['translation_info'] = f"Consulta traducida: '{query}' → '{english_query}'"
-            
-            return result
+            self.cache.store(payload, result)
+            return result, status, None
+        except requests.exceptions.Timeout as e:
+            status = "timeout"
+            return {"error": f"Error en API USDA: {str(e)}", "foods": []}, status, 0.0
+        except requests.exceptions.ConnectionError as e:
+            # Conexión rechazada o cortada: reintentable
+            return {"error": f"Error en API USDA: {str(e)}", "foods": []}, status, 0.0
         except requests.exceptions.RequestException as e:
-            return {"error": f"Error en API USDA: {str(e)}", "foods": []}
+            return {"error": f"Error en API USDA: {str(e)}", "foods": []}, status, None
+        finally:
+            elapsed = time.perf_counter() - start
+            USDA_REQUEST_DURATION.observe(elapsed, status=status)
+            self._annotate_search(span, query, english_query, status, wait, elapsed)
+    
+    def _revalidate(self, payload: Dict):
+        """Refresca en segundo plano una entrada caducada mientras se sirve la anterior"""
+        key = self.cache.key(payload)
+        if not self._claim_refresh(key):
+            return
+        
+        def refresh():
+            try:
+                with tracer.start_as_current_span("usda.revalidate") as span:
+                    self._request(span, payload["query"], payload["query"], payload, has_fallback=True)
+            finally:
+                self._release_refresh(key)
+        
+        threading.Thread(target=refresh, name="usda-revalidate", daemon=True).start()
+    
+    @staticmethod
+    def _annotate_search(span, query: str, english_query: str, status: str, wait: float, elapsed: float):
+        set_attributes(span, **{
+            "usda.query": query,
+            "usda.english_query": english_query,
+            "http.status": status,
+            "usda.rate_limit_wait_ms": round(wait * 1000, 1),
+            "usda.request_ms": round(elapsed * 1000, 1)
+        })
+    
+    def _get_async_session(self) -> aiohttp.ClientSession:
+        if self._async_session is None or self._async_session.closed:
+            # Pool de conexiones keep-alive; el semáforo acota las peticiones simultáneas a la API
+            connector = aiohttp.TCPConnector(limit=USDA_MAX_CONNECTIONS, ttl_dns_cache=300, keepalive_timeout=30)
+            self._async_session = aiohttp.ClientSession(
+                connector=connector, timeout=aiohttp.ClientTimeout(total=USDA_ATTEMPT_TIMEOUT_SECONDS)
+            )
+            self._request_slots = asyncio.Semaphore(USDA_MAX_CONCURRENCY)
+        return self._async_session
+    
+    async def search_foods_async(self, query: str, data_types: List[str] = None, page_size: int = 5) -> Dict:
+        """
+        Versión async de search_foods para las herramientas de los agentes: ni la caché en
+        disco, ni la espera del rate limiting ni la petición HTTP bloquean a las demás sesiones.
+        """
+        with tracer.start_as_current_span("usda.search") as span:
+            english_query, payload = self._build_search(query, data_types, page_size)
+            # La réplica responde en menos de un milisegundo: más barato que saltar a un hilo
+            local = self._local_first(span, query, english_query, payload)
+            if local is not None:
+                return local
+            cached = await run_blocking(self.cache.lookup, payload)
+            if cached is not None and (cached.fresh or cached.revalidate):
+                if cached.revalidate:
+                    self._revalidate_async(payload)
+                return self._from_cache(span, cached, query, english_query)
+            
+            result = await self._request_async(span, query, english_query, payload, has_fallback=cached is not None)
+            if "error" in result:
+                return self._fallback(span, result, cached, query, english_query, payload)
+            return self._add_translation_info(result, query, english_query)
+    
+    async def _request_async(self, span, query: str, english_query: str, payload: Dict, has_fallback: bool = False) -> Dict:
+        """
+        Single-flight: las búsquedas idénticas simultáneas (varios invitados preguntando por
+        el mismo ingrediente) esperan a la misma petición HTTP en lugar de repetirla.
+        """
+        key = self.cache.key(payload)
+        loop = asyncio.get_running_loop()
+        task = self._in_flight.get(key)
+        if task is not None and task.get_loop() is loop:
+            USDA_COALESCED.inc()
+            set_attributes(span, **{"usda.query": query, "usda.english_query": english_query, "usda.coalesced": True})
+        else:
+            task = loop.create_task(self._fetch_async(span, query, english_query, payload, has_fallback))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._in_flight.pop(key, None) if self._in_flight.get(key) is done else None)
+        # shield: si un invitado se va, la petición sigue para los demás; cada uno recibe su copia
+        return dict(await asyncio.shield(task))
+    
+    @staticmethod
+    def _backoff(attempt: int, retry_after: float) -> float:
+        """Backoff exponencial con jitter completo; respeta el Retry-After del servidor"""
+        return max(retry_after, random.uniform(0, min(USDA_BACKOFF_MAX_SECONDS, USDA_BACKOFF_BASE_SECONDS * 2 ** attempt)))
+    
+    async def _fetch_async(self, span, query: str, english_query: str, payload: Dict, has_fallback: bool) -> Dict:
+        """Petición con reintentos (cada intento consume un token) dentro del plazo total"""
+        deadline = time.monotonic() + USDA_DEADLINE_SECONDS
+        wait = 0.0
+        result: Dict = {}
+        attempts = 0
+        for attempt in range(USDA_MAX_RETRIES + 1):
+            try:
+                wait += await self._rate_limit_async()
+            except RateLimitExceeded as e:
+                if attempt == 0:
+                    set_attributes(span, **{"usda.rate_limited": True, "usda.retry_after_s": round(e.retry_after, 1)})
+                    return self._rate_limited_result(e, has_fallback)
+                # Sin tokens para reintentar: se devuelve el último error
+                break
+            attempts += 1
+            result, status, retry_after = await self._attempt_async(span, query, english_query, payload, deadline, wait)
+            if retry_after is None or attempt == USDA_MAX_RETRIES:
+                break
+            backoff = self._backoff(attempt, retry_after)
+            if time.monotonic() + backoff >= deadline:
+                break
+            USDA_RETRIES.inc(status=status)
+            await asyncio.sleep(backoff)
+        set_attributes(span, **{"usda.attempts": attempts})
+        return result
+    
+    async def _attempt_async(self, span, query: str, english_query: str, payload: Dict, deadline: float, wait: float) -> Tuple[Dict, str, Optional[float]]:
+        """
+        Un intento. Devuelve (resultado, estado HTTP, retry_after): retry_after es None si no
+        tiene sentido reintentar (éxito o error del cliente) y, si no, la espera mínima antes
+        del siguiente intento.
+        """
+        session = self._get_async_session()
+        url = f"{self.base_url}/foods/search"
+        params = {"api_key": self.api_key}
+        
+        async with self._request_slots:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return {"error": "Error en API USDA: plazo agotado", "foods": []}, "timeout", None
+            start = time.perf_counter()
+            status = "error"
+            try:
+                timeout = aiohttp.ClientTimeout(total=min(USDA_ATTEMPT_TIMEOUT_SECONDS, remaining))
+                async with session.post(url, json=payload, params=params, timeout=timeout) as response:
+                    status = str(response.status)
+                    if response.status == 429 or response.status >= 500:
+                        error = {"error": f"Error en API USDA: HTTP {response.status}", "foods": []}
+                        return error, status, self._retry_after(response.headers.get("Retry-After"))
+                    response.raise_for_status()
+                    result = await response.json()
+                await run_blocking(self.cache.store, payload, result)
+                return result, status, None
+            except asyncio.TimeoutError:
+                status = "timeout"
+                return {"error": "Error en API USDA: tiempo de espera agotado", "foods": []}, status, 0.0
+            except aiohttp.ClientResponseError as e:
+                return {"error": f"Error en API USDA: {str(e)}", "foods": []}, status, None
+            except aiohttp.ClientError as e:
+                # Conexión rechazada o cortada: reintentable
+                return {"error": f"Error en API USDA: {str(e) or type(e).__name__}", "foods": []}, status, 0.0
+            finally:
+                elapsed = time.perf_counter() - start
+                USDA_REQUEST_DURATION.observe(elapsed, status=status)
+                self._annotate_search(span, query, english_query, status, wait, elapsed)
+    
+    @staticmethod
+    def _retry_after(header: Optional[str]) -> float:
+        try:
+            return min(float(header), USDA_DEADLINE_SECONDS) if header else 0.0
+        except ValueError:
+            return 0.0
+    
+    def _revalidate_async(self, payload: Dict):
+        """Como _revalidate, en una tarea del bucle de eventos"""
+        key = self.cache.key(payload)
+        if not self._claim_refresh(key):
+            return
+        
+        async def refresh():
+            try:
+                with tracer.start_as_current_span("usda.revalidate") as span:
+                    await self._request_async(span, payload["query"], payload["query"], payload, has_fallback=True)
+            finally:
+                self._release_refresh(key)
+        
+        # Referencia fuerte hasta que termine: asyncio solo guarda referencias débiles a las tareas
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+    
+    async def aclose(self):
+        """Cierra la sesión async (al apagar el servidor)"""
+        if self._refresh_tasks:
+            await asyncio.gather(*self._refresh_tasks, return_exceptions=True)
+        if self._async_session is not None and not self._async_session.closed:
+            await self._async_session.close()
     
     def format_nutrition_data(self, food_data: Dict) -> str:
         """
@@ -155,6 +470,11 @@ class USDAFoodDataAPI:
         result_header = ""
         if "translation_info" in food_data:
             result_header = f"📝 {food_data['translation_info']}\n\n"
+        if food_data.get("data_source") == "mirror":
+            reason = f" ({food_data['fallback_reason']})" if "fallback_reason" in food_data else ""
+            result_header += f"🗂️ Datos de la copia local de FoodData Central{reason}\n\n"
+        elif "fallback_reason" in food_data:
+            result_header += f"🗂️ Datos guardados de una consulta anterior ({food_data['fallback_reason']})\n\n"
         
         if "foods" in food_data:
             # Es resultado de búsqueda
@@ -220,4 +540,16 @@ class USDAFoodDataAPI:
             return result
 
 # Instancia global del cliente
-usda_client = USDAFoodDataAPI()
\ No newline at end of file
+usda_client = USDAFoodDataAPI()
+register_cache("usda_responses", usda_client.cache.stats)
+
+
+def _collect_rate_limit():
+    stats = usda_client.rate_limiter.stats()
+    return [(
+        "maitre_usda_rate_limit_tokens", "gauge", "Tokens disponibles en el rate limiting de la API USDA.",
+        [("maitre_usda_rate_limit_tokens", {}, stats["available"])]
+    )]
+
+
+registry.register_collector(_collect_rate_limit)
\ No newline at end of file
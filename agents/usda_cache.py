@@ -0,0 +1,154 @@
+# agents/usda_cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Los datos nutricionales de FoodData Central cambian muy poco: se refrescan cada semana
+# y, durante otro mes, la copia anterior se sirve al momento mientras se revalida
+USDA_CACHE_PATH = os.getenv("USDA_CACHE_PATH", "./cache/usda_responses.sqlite")
+USDA_CACHE_TTL_SECONDS = float(os.getenv("USDA_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+USDA_CACHE_STALE_SECONDS = float(os.getenv("USDA_CACHE_STALE_SECONDS", str(30 * 24 * 3600)))
+USDA_CACHE_MAX_ENTRIES = int(os.getenv("USDA_CACHE_MAX_ENTRIES", "5000"))
+
+
+class CachedResponse(NamedTuple):
+    response: Dict
+    age: float
+    # Dentro del TTL: se sirve tal cual
+    fresh: bool
+    # Caducada pero dentro de la ventana stale-while-revalidate: se sirve y se refresca
+    revalidate: bool
+
+
+class USDAResponseCache:
+    """
+    Caché persistente (SQLite) de respuestas de /foods/search indexada por el cuerpo de la
+    búsqueda (consulta ya traducida, tipos de datos y tamaño de página). Guarda la respuesta
+    cruda de la API; con más de `max_entries` entradas descarta las usadas hace más tiempo.
+    Las entradas caducadas no se borran al leerlas: siguen sirviendo de respaldo cuando la
+    API falla o el rate limiting no deja pasar la petición.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = USDA_CACHE_PATH,
+        ttl_seconds: float = USDA_CACHE_TTL_SECONDS,
+        stale_seconds: float = USDA_CACHE_STALE_SECONDS,
+        max_entries: int = USDA_CACHE_MAX_ENTRIES
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        # Sin ruta (o si no se puede abrir), la caché vive solo en memoria y no sobrevive a un reinicio
+        self.path = path or None
+        self._db = None
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+                self._db = self._open(path)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning("No se pudo abrir la caché USDA en '%s' (%s); se usará solo memoria", path, e)
+                self.path = None
+        if self._db is None:
+            self._db = self._open(":memory:")
+        self._entries = self._db.execute("SELECT COUNT(*) FROM usda_responses").fetchone()[0]
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        db = sqlite3.connect(path, check_same_thread=False)
+        if path != ":memory:":
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS usda_responses ("
+            " key TEXT PRIMARY KEY,"
+            " query TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " fetched_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS usda_responses_lru ON usda_responses (last_access)")
+        db.commit()
+        return db
+
+    @staticmethod
+    def key(payload: Dict) -> str:
+        normalized = {**payload, "query": " ".join(str(payload.get("query", "")).lower().split())}
+        if isinstance(normalized.get("dataType"), list):
+            normalized["dataType"] = sorted(normalized["dataType"])
+        return hashlib.sha1(json.dumps(normalized, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def lookup(self, payload: Dict) -> Optional[CachedResponse]:
+        """Devuelve la última respuesta guardada para la búsqueda (aunque esté caducada), o None."""
+        key = self.key(payload)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response, fetched_at FROM usda_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE usda_responses SET last_access = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            age = max(0.0, now - row[1])
+            fresh = age <= self.ttl_seconds
+            revalidate = not fresh and age <= self.ttl_seconds + self.stale_seconds
+            if fresh:
+                self.hits += 1
+            elif revalidate:
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+        return CachedResponse(json.loads(row[0]), age, fresh, revalidate)
+
+    def store(self, payload: Dict, response: Dict):
+        """Guarda una respuesta correcta de la API y aplica el límite de entradas (LRU)."""
+        key = self.key(payload)
+        now = time.time()
+        with self._lock:
+            existed = self._db.execute("SELECT 1 FROM usda_responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO usda_responses (key, query, response, fetched_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, str(payload.get("query", "")), json.dumps(response, ensure_ascii=False), now, now)
+            )
+            if existed is None:
+                self._entries += 1
+            if self._entries > self.max_entries:
+                self._db.execute(
+                    "DELETE FROM usda_responses WHERE key IN"
+                    " (SELECT key FROM usda_responses ORDER BY last_access LIMIT ?)",
+                    (self._entries - self.max_entries,)
+                )
+                self._entries = self.max_entries
+            self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            served = self.hits + self.stale_hits
+            return {
+                "hits": served,
+                "fresh_hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+                "entries": self._entries
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
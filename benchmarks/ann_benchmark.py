@@ -0,0 +1,165 @@
+"""
+Benchmark offline de tipos de índice FAISS (flat, IVF, HNSW) y de codificación de los
+vectores (float32, float16, PQ con y sin re-puntuación) para elegir los ajustes de cada
+dominio. Compara cada configuración con la búsqueda exacta (flat) y reporta recall@k,
+latencia p50/p99 por consulta, tiempo de construcción y memoria.
+
+Uso:
+    python -m benchmarks.ann_benchmark --index ./indexes/nutrition_index
+    python -m benchmarks.ann_benchmark --synthetic 50000 --output ann_results.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import faiss
+import numpy as np
+
+# Añadir el directorio raíz del proyecto al path para resolver importaciones
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.index_config import IndexSettings, build_faiss_index, load_rescore_vectors, rescore, uses_rescoring
+
+# Rejilla de configuraciones por defecto
+DEFAULT_CONFIGS = [
+    IndexSettings(kind="flat"),
+    IndexSettings(kind="ivf", nlist=64, nprobe=1),
+    IndexSettings(kind="ivf", nlist=64, nprobe=8),
+    IndexSettings(kind="ivf", nlist=64, nprobe=32),
+    IndexSettings(kind="hnsw", hnsw_m=16, ef_search=16),
+    IndexSettings(kind="hnsw", hnsw_m=32, ef_search=64),
+    IndexSettings(kind="hnsw", hnsw_m=32, ef_search=128),
+    IndexSettings(kind="flat", storage="float16"),
+    IndexSettings(kind="flat", storage="pq", rescore_factor=0),
+    IndexSettings(kind="flat", storage="pq", rescore_factor=4),
+    IndexSettings(kind="flat", storage="pq", rescore_factor=10),
+    IndexSettings(kind="ivf", nlist=64, nprobe=8, storage="pq", rescore_factor=4),
+    IndexSettings(kind="hnsw", hnsw_m=32, ef_search=64, storage="float16"),
+]
+
+
+def load_vectors(index_path: str) -> np.ndarray:
+    """
+    Extrae los vectores de un índice existente: de su copia float16 si es PQ o, si no,
+    reconstruyéndolos (debe admitir reconstrucción, p. ej. flat).
+    """
+    rescore_vectors = load_rescore_vectors(index_path)
+    if rescore_vectors is not None:
+        return np.asarray(rescore_vectors, dtype=np.float32)
+    index = faiss.read_index(os.path.join(index_path, "index.faiss"))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def synthetic_vectors(n: int, dimension: int, seed: int = 7) -> np.ndarray:
+    """Vectores agrupados en clusters, más realistas que ruido uniforme para IVF/HNSW."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 100), dimension)).astype(np.float32)
+    assignments = rng.integers(0, len(centers), n)
+    return centers[assignments] + 0.3 * rng.standard_normal((n, dimension)).astype(np.float32)
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float = 0.05, seed: int = 11) -> np.ndarray:
+    """Consultas cercanas a documentos reales: vectores del corpus con una perturbación."""
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), count)]
+    scale = noise * float(np.linalg.norm(vectors, axis=1).mean()) / np.sqrt(vectors.shape[1])
+    return (picks + scale * rng.standard_normal(picks.shape)).astype(np.float32)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    return float(np.percentile(np.array(values), pct)) if values else 0.0
+
+
+def benchmark_config(vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, settings: IndexSettings) -> Dict:
+    start = time.perf_counter()
+    index = build_faiss_index(vectors, settings)
+    build_seconds = time.perf_counter() - start
+    # Copia float16 de los vectores, como la que guarda la ingesta junto a los índices PQ
+    rescore_vectors = vectors.astype(np.float16) if uses_rescoring(settings) else None
+
+    # Una consulta cada vez, como en el servidor (incluida la re-puntuación)
+    latencies_ms = []
+    found = []
+    for query in queries:
+        t0 = time.perf_counter()
+        if rescore_vectors is None:
+            _, indices = index.search(query.reshape(1, -1), k)
+            row = indices[0]
+        else:
+            _, indices = index.search(query.reshape(1, -1), k * settings.rescore_factor)
+            ranking = [int(i) for i in indices[0] if i != -1]
+            row = np.array(rescore(query.reshape(1, -1), [ranking], rescore_vectors, k)[0])
+        latencies_ms.append((time.perf_counter() - t0) * 1000)
+        found.append(row)
+
+    index_bytes = int(faiss.serialize_index(index).nbytes)
+    rescore_bytes = int(rescore_vectors.nbytes) if rescore_vectors is not None else 0
+    recall = np.mean([
+        len(set(row[row != -1].tolist()) & set(expected.tolist())) / k
+        for row, expected in zip(found, truth)
+    ])
+    return {
+        "config": settings.describe(),
+        "settings": settings.__dict__,
+        f"recall@{k}": round(float(recall), 4),
+        "p50_ms": round(percentile(latencies_ms, 50), 4),
+        "p99_ms": round(percentile(latencies_ms, 99), 4),
+        "build_seconds": round(build_seconds, 3),
+        "index_bytes": index_bytes,
+        # Se lee del disco mapeado en memoria; solo quedan residentes las filas consultadas
+        "rescore_bytes": rescore_bytes,
+        # Huella completa de la configuración (en disco y, si se tocan todas las filas, en memoria)
+        "total_bytes": index_bytes + rescore_bytes
+    }
+
+
+def run(vectors: np.ndarray, k: int, query_count: int, configs: List[IndexSettings]) -> List[Dict]:
+    queries = make_queries(vectors, query_count)
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+    return [benchmark_config(vectors, queries, truth, k, settings) for settings in configs]
+
+
+def print_table(results: List[Dict], k: int):
+    print(
+        f"\n{'configuración':<48}{'recall@' + str(k):>10}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'build s':>10}{'índice':>12}{'re-punt.':>12}{'total':>12}"
+    )
+    for row in results:
+        print(
+            f"{row['config']:<48}{row[f'recall@{k}']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}"
+            f"{row['build_seconds']:>10}{row['index_bytes'] / 1024:>10.0f}KB{row['rescore_bytes'] / 1024:>10.0f}KB"
+            f"{row['total_bytes'] / 1024:>10.0f}KB"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de tipos de índice FAISS frente a la búsqueda exacta")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--index", help="Directorio de un índice existente (p. ej. ./indexes/enology_index)")
+    source.add_argument("--synthetic", type=int, help="Número de vectores sintéticos a generar")
+    parser.add_argument("--dim", type=int, default=768, help="Dimensión de los vectores sintéticos")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--output", help="Fichero JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    data = load_vectors(args.index) if args.index else synthetic_vectors(args.synthetic, args.dim)
+    print(f"🔬 Benchmark sobre {len(data)} vectores de dimensión {data.shape[1]} (k={args.k}, {args.queries} consultas)")
+
+    results = run(data, args.k, args.queries, DEFAULT_CONFIGS)
+    print_table(results, args.k)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "source": args.index or f"synthetic:{args.synthetic}x{args.dim}",
+                "vectors": len(data),
+                "k": args.k,
+                "results": results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
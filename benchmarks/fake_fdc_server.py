@@ -0,0 +1,157 @@
+"""
+Servidor falso de FoodData Central para probar el cliente USDA sin red ni cuota: responde
+a POST /fdc/v1/foods/search con alimentos sintéticos en el formato de la API, con latencia,
+errores 503, respuestas 429 (con Retry-After) y cuelgues configurables. Cuenta las
+peticiones recibidas por consulta para comprobar el single-flight y los reintentos.
+
+    GET  /stats          peticiones recibidas (total, por consulta y por respuesta)
+    POST /stats/reset    pone los contadores a cero
+    POST /config         cambia latencia y tasas de fallo en caliente (JSON con las opciones)
+
+Uso:
+    python -m benchmarks.fake_fdc_server --port 8099 --latency-ms 150 --error-rate 0.2
+    USDA_API_BASE_URL=http://localhost:8099/fdc/v1 uvicorn main:app
+"""
+import argparse
+import asyncio
+import random
+from collections import Counter
+from typing import Dict
+
+from aiohttp import web
+
+_NUTRIENTS = [
+    (1008, "208", "Energy", "KCAL"),
+    (1003, "203", "Protein", "G"),
+    (1004, "204", "Total lipid (fat)", "G"),
+    (1005, "205", "Carbohydrate, by difference", "G"),
+    (1079, "291", "Fiber, total dietary", "G"),
+    (1093, "307", "Sodium, Na", "MG"),
+]
+
+
+def _food(query: str, rank: int) -> Dict:
+    """Alimento sintético y estable para una consulta (mismos valores en cada llamada)."""
+    rng = random.Random(f"{query}:{rank}")
+    return {
+        "fdcId": 100000 + rng.randrange(900000),
+        "description": f"{query.capitalize()}, {'raw' if rank == 0 else f'variant {rank}'}",
+        "dataType": rng.choice(["Foundation", "SR Legacy"]),
+        "foodCategory": "Synthetic Foods",
+        "score": round(1000 / (rank + 1), 2),
+        "foodNutrients": [
+            {"nutrientId": nid, "nutrientNumber": number, "nutrientName": name, "unitName": unit,
+             "value": round(rng.uniform(0, 400 if unit == "KCAL" else 40), 1)}
+            for nid, number, name, unit in _NUTRIENTS
+        ]
+    }
+
+
+class FakeFoodDataCentral:
+    def __init__(self, latency_ms: float = 100, jitter_ms: float = 20, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, hang_rate: float = 0.0, retry_after: float = 1.0, seed: int = 7):
+        self.config = {
+            "latency_ms": latency_ms,
+            "jitter_ms": jitter_ms,
+            "error_rate": error_rate,
+            "throttle_rate": throttle_rate,
+            "hang_rate": hang_rate,
+            "retry_after": retry_after,
+        }
+        self.rng = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.by_query: Counter = Counter()
+        self.by_response: Counter = Counter()
+
+    async def search(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        query = str(body.get("query", ""))
+        self.requests += 1
+        self.by_query[query] += 1
+        config = self.config
+
+        latency = max(0.0, config["latency_ms"] + self.rng.uniform(-1, 1) * config["jitter_ms"]) / 1000
+        roll = self.rng.random()
+        if roll < config["hang_rate"]:
+            # Más lento que cualquier timeout razonable del cliente
+            self.by_response["hang"] += 1
+            await asyncio.sleep(60)
+        await asyncio.sleep(latency)
+        roll -= config["hang_rate"]
+        if roll < config["throttle_rate"]:
+            self.by_response["429"] += 1
+            return web.json_response(
+                {"error": {"code": "OVER_RATE_LIMIT"}}, status=429, headers={"Retry-After": str(config["retry_after"])}
+            )
+        roll -= config["throttle_rate"]
+        if roll < config["error_rate"]:
+            self.by_response["503"] += 1
+            return web.json_response({"error": "Service Unavailable"}, status=503)
+
+        self.by_response["200"] += 1
+        page_size = int(body.get("pageSize", 5))
+        foods = [_food(query, rank) for rank in range(page_size)]
+        return web.json_response({
+            "totalHits": len(foods), "currentPage": 1, "totalPages": 1,
+            "foodSearchCriteria": body, "foods": foods
+        })
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "requests": self.requests,
+            "by_query": dict(self.by_query),
+            "by_response": dict(self.by_response),
+            "config": self.config
+        })
+
+    async def reset_stats(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"status": "ok"})
+
+    async def update_config(self, request: web.Request) -> web.Response:
+        changes = await request.json()
+        self.config.update({key: float(value) for key, value in changes.items() if key in self.config})
+        return web.json_response(self.config)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/fdc/v1/foods/search", self.search)
+        app.router.add_get("/stats", self.stats)
+        app.router.add_post("/stats/reset", self.reset_stats)
+        app.router.add_post("/config", self.update_config)
+        return app
+
+
+async def start_fake_server(server: FakeFoodDataCentral, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+    """Arranca el servidor en el bucle actual (port=0 elige uno libre); devuelve el runner."""
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
+
+
+def bound_port(runner: web.AppRunner) -> int:
+    return runner.addresses[0][1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor falso de FoodData Central")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Proporción de respuestas 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Proporción de respuestas 429")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Proporción de peticiones que no responden")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After de las respuestas 429")
+    args = parser.parse_args()
+
+    fake = FakeFoodDataCentral(
+        args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate, args.hang_rate, args.retry_after
+    )
+    print(f"🥦 FoodData Central falso en http://{args.host}:{args.port}/fdc/v1")
+    web.run_app(fake.app(), host=args.host, port=args.port, print=None)
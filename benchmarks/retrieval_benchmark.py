@@ -0,0 +1,258 @@
+"""
+Benchmark de recuperación extremo a extremo sobre los índices del proyecto con un conjunto
+de consultas de referencia (benchmarks/golden_queries.json): nombres exactos de vinos y
+platos, búsquedas con filtros y preguntas sobre las tablas de nutrición. Ejecuta la misma
+recuperación híbrida que los agentes (search_index) y reporta recall@k, MRR, latencia
+p50/p95/p99 por consulta, consultas por segundo y tiempo de carga y memoria de cada índice.
+
+Funciona sin red: si el índice se construyó con otro modelo de embeddings que el backend
+configurado (por defecto el local `hashed`), se reembeben sus documentos con ese backend y
+se reconstruye el índice FAISS con los mismos ajustes. Las cifras absolutas no son las de
+producción, pero sí comparables entre ejecuciones para detectar regresiones de la ingesta
+(troceado, BM25, metadatos, filtros, tipo de índice).
+
+Uso:
+    python -m benchmarks.retrieval_benchmark
+    python -m benchmarks.retrieval_benchmark --k 1 3 5 --repeat 20 --output retrieval_results.json
+    python -m benchmarks.retrieval_benchmark --baseline retrieval_results.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Sin red por defecto: el backend local salvo que se pida otro explícitamente
+os.environ.setdefault("EMBEDDING_BACKEND", "hashed")
+
+# Añadir el directorio raíz del proyecto al path para resolver importaciones
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.bm25 import fold_accents
+from agents.embedding_backends import create_embeddings, embedding_model_name
+from agents.index_config import IndexSettings, build_faiss_index, uses_rescoring
+from agents.index_registry import IndexRegistry, LoadedIndex
+from agents.retrieval import search_index
+from agents.retrieval_cache import read_index_settings
+
+GOLDEN_QUERIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden_queries.json")
+DEFAULT_INDEXES = ("enology_index", "culinary_index", "nutrition_index")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    return float(np.percentile(np.array(values), pct)) if values else 0.0
+
+
+def _rss_bytes() -> Optional[int]:
+    """Memoria residente del proceso según /proc (None fuera de Linux)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_index(registry: IndexRegistry, index_path: str, embeddings) -> Dict:
+    """Carga el índice como lo hace el servidor y mide tiempo y memoria."""
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    loaded = registry.get(index_path, embeddings)
+    wall_seconds = time.perf_counter() - start
+    if loaded is None:
+        raise RuntimeError(f"No se pudo cargar el índice '{index_path}'")
+    rss_after = _rss_bytes()
+    report = registry.memory_report()[os.path.basename(index_path)]
+    return {
+        "loaded": loaded,
+        "load_seconds": round(wall_seconds, 4),
+        "rss_delta_bytes": rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+        "memory": report
+    }
+
+
+def reembed(loaded: LoadedIndex, embeddings) -> float:
+    """
+    Sustituye los vectores del índice por los del backend local, con los mismos ajustes
+    de construcción. Devuelve los segundos empleados (no cuentan como tiempo de carga).
+    """
+    start = time.perf_counter()
+    store = loaded.store
+    texts = [store.docstore.search(store.index_to_docstore_id[i]).page_content for i in range(store.index.ntotal)]
+    vectors = np.array(embeddings.embed_documents(texts), dtype=np.float32)
+    settings = IndexSettings(**read_index_settings(loaded.path))
+    store.index = build_faiss_index(vectors, settings)
+    loaded.rescore_vectors = vectors.astype(np.float16) if uses_rescoring(settings) else None
+    loaded.rescore_factor = settings.rescore_factor if loaded.rescore_vectors is not None else 0
+    return time.perf_counter() - start
+
+
+def _matches(documents, relevant: List[str]) -> List[Optional[int]]:
+    """Para cada texto relevante, la posición (desde 1) del primer resultado que lo contiene."""
+    contents = [fold_accents(doc.page_content) for doc in documents]
+    ranks = []
+    for item in relevant:
+        needle = fold_accents(item)
+        ranks.append(next((i for i, content in enumerate(contents, 1) if needle in content), None))
+    return ranks
+
+
+def evaluate(loaded: LoadedIndex, queries: List[Dict], ks: List[int], repeat: int, concurrency: int) -> Dict:
+    k_max = max(ks)
+
+    def run_query(golden: Dict):
+        return search_index(loaded, golden["query"], k_max, golden.get("filters"))
+
+    # Calentamiento: primera página de los mmap y cachés internas fuera de la medición
+    for golden in queries:
+        run_query(golden)
+
+    per_query = []
+    latencies_ms = []
+    for golden in queries:
+        timings = []
+        result = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            result = run_query(golden)
+            timings.append((time.perf_counter() - t0) * 1000)
+        latencies_ms.extend(timings)
+        ranks = _matches(result.documents, golden["relevant"])
+        found = [rank for rank in ranks if rank is not None]
+        per_query.append({
+            "query": golden["query"],
+            "type": golden.get("type"),
+            "strategy": result.strategy,
+            "ranks": ranks,
+            "reciprocal_rank": round(1.0 / min(found), 4) if found else 0.0,
+            **{f"recall@{k}": round(sum(1 for rank in found if rank <= k) / len(ranks), 4) for k in ks},
+            "p50_ms": round(percentile(timings, 50), 3)
+        })
+
+    # Rendimiento con varias consultas en paralelo, como con varias sesiones a la vez
+    workload = [golden for golden in queries for _ in range(repeat)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(run_query, workload))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "queries": len(queries),
+        **{f"recall@{k}": round(float(np.mean([q[f"recall@{k}"] for q in per_query])), 4) for k in ks},
+        "mrr": round(float(np.mean([q["reciprocal_rank"] for q in per_query])), 4),
+        "latency_ms": {
+            "p50": round(percentile(latencies_ms, 50), 3),
+            "p95": round(percentile(latencies_ms, 95), 3),
+            "p99": round(percentile(latencies_ms, 99), 3)
+        },
+        "qps": round(len(workload) / elapsed, 1) if elapsed else 0.0,
+        "per_query": per_query
+    }
+
+
+def run(indexes_dir: str, index_names: List[str], golden: Dict, ks: List[int], repeat: int, concurrency: int) -> Dict:
+    embeddings = create_embeddings()
+    model_name = embedding_model_name()
+    registry = IndexRegistry()
+    results = {}
+    for name in index_names:
+        index_path = os.path.join(indexes_dir, name)
+        queries = golden.get(name, [])
+        if not queries:
+            print(f"⚠️ Sin consultas de referencia para '{name}'; se omite.")
+            continue
+        load = load_index(registry, index_path, embeddings)
+        loaded = load.pop("loaded")
+        reembed_seconds = None
+        if loaded.embedding_model != model_name:
+            reembed_seconds = round(reembed(loaded, embeddings), 3)
+        results[name] = {
+            "documents": loaded.store.index.ntotal,
+            "index_model": loaded.embedding_model,
+            "reembedded_seconds": reembed_seconds,
+            **load,
+            **evaluate(loaded, queries, ks, repeat, concurrency)
+        }
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "embedding_model": model_name,
+        "k": ks,
+        "repeat": repeat,
+        "concurrency": concurrency,
+        "indexes": results
+    }
+
+
+def print_table(report: Dict, baseline: Optional[Dict] = None):
+    ks = report["k"]
+    recall_headers = "".join(f"{'R@' + str(k):>8}" for k in ks)
+    print(
+        f"\n{'índice':<18}{'docs':>6}{recall_headers}{'MRR':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'QPS':>9}{'carga s':>9}{'memoria':>11}"
+    )
+    for name, row in report["indexes"].items():
+        recalls = "".join(f"{row[f'recall@{k}']:>8}" for k in ks)
+        memory = row["memory"].get("resident_bytes") or row["memory"].get("vector_bytes") or 0
+        print(
+            f"{name:<18}{row['documents']:>6}{recalls}{row['mrr']:>8}{row['latency_ms']['p50']:>9}"
+            f"{row['latency_ms']['p95']:>9}{row['latency_ms']['p99']:>9}{row['qps']:>9}"
+            f"{row['load_seconds']:>9}{memory / 1024:>9.0f}KB"
+        )
+        previous = (baseline or {}).get("indexes", {}).get(name)
+        if previous:
+            deltas = ", ".join(
+                f"{metric} {row[metric] - previous[metric]:+.4f}"
+                for metric in [f"recall@{k}" for k in ks] + ["mrr"] if metric in previous
+            )
+            p95_delta = row["latency_ms"]["p95"] - previous["latency_ms"]["p95"]
+            print(f"{'':<18}Δ frente a la referencia: {deltas}, p95 {p95_delta:+.3f}ms")
+        misses = [q["query"] for q in row["per_query"] if q[f"recall@{ks[-1]}"] < 1.0]
+        if misses:
+            print(f"{'':<18}Sin recuperar en top-{ks[-1]}: {'; '.join(misses)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de recuperación con consultas de referencia")
+    parser.add_argument("--indexes-dir", default=os.getenv("INDEXES_DIR", "./indexes"))
+    parser.add_argument("--index", action="append", help="Índice a evaluar (repetible); por defecto los tres del proyecto")
+    parser.add_argument("--golden", default=GOLDEN_QUERIES_FILE, help="Fichero JSON de consultas de referencia")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--repeat", type=int, default=10, help="Repeticiones de cada consulta para medir latencia")
+    parser.add_argument("--concurrency", type=int, default=4, help="Hilos para medir consultas por segundo")
+    parser.add_argument("--output", help="Fichero JSON donde guardar los resultados")
+    parser.add_argument("--baseline", help="Resultados anteriores con los que comparar")
+    args = parser.parse_args()
+
+    with open(args.golden, "r", encoding="utf-8") as f:
+        golden_queries = json.load(f)
+    ks = sorted(set(args.k))
+    names = args.index or list(DEFAULT_INDEXES)
+    print(f"🔬 Benchmark de recuperación ({embedding_model_name()}, k={ks}, {args.repeat} repeticiones)")
+
+    report = run(args.indexes_dir, names, golden_queries, ks, args.repeat, args.concurrency)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_table(report, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
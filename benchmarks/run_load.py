@@ -0,0 +1,309 @@
+"""
+Prueba de carga de los endpoints /run y /run_sse del servidor (main.py): N invitados
+virtuales en paralelo, cada uno con su sesión, que hacen varias preguntas seguidas de una
+mezcla configurable. Reporta rendimiento (peticiones por segundo), percentiles de latencia,
+tiempo hasta el primer byte y el primer evento SSE, y tasa de errores por endpoint.
+
+Con --stub-server se arranca el propio servidor con Gemini y Vertex AI sustituidos por
+modelos locales deterministas (STUB_LLM y EMBEDDING_BACKEND=stub) con latencia fija, de
+modo que las cifras aíslan el coste de nuestro servidor y la prueba funciona sin red.
+
+Uso:
+    python -m benchmarks.run_load --stub-server --concurrency 20 --duration 60
+    python -m benchmarks.run_load --stub-server --llm-latency-ms 300 --endpoint run_sse --streaming
+    python -m benchmarks.run_load --base-url http://localhost:8080 --requests 500 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import aiohttp
+import numpy as np
+
+# Mezcla de preguntas por defecto: (peso, pregunta). Incluye consultas de un solo dominio
+# (enrutado local), ambiguas (decide el LLM) y repetidas (caché de respuestas)
+DEFAULT_QUESTION_MIX = [
+    (3, "¿Qué vino tinto de Rioja me recomiendas?"),
+    (2, "¿Tenéis Vega Sicilia Único?"),
+    (3, "¿Qué lleva la fabada asturiana?"),
+    (2, "¿Qué postres tenéis con chocolate?"),
+    (2, "¿Cuántas calorías tiene el aguacate?"),
+    (2, "¿A qué temperatura se degrada la vitamina C?"),
+    (2, "Quiero algo especial para celebrar un aniversario"),
+    (1, "Un plato de la parrilla bajo en grasa y un vino para acompañarlo"),
+]
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def percentile(values: List[float], pct: float) -> float:
+    return float(np.percentile(np.array(values), pct)) if values else 0.0
+
+
+def load_question_mix(path: Optional[str]) -> List[tuple]:
+    """Fichero JSON con una lista de preguntas o de objetos {"question", "weight"}."""
+    if not path:
+        return DEFAULT_QUESTION_MIX
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    return [(1, item) if isinstance(item, str) else (item.get("weight", 1), item["question"]) for item in items]
+
+
+class Stats:
+    """Resultados por endpoint: latencias, primer byte/evento y errores por tipo."""
+
+    def __init__(self):
+        self.latencies_ms: Dict[str, List[float]] = defaultdict(list)
+        self.first_byte_ms: Dict[str, List[float]] = defaultdict(list)
+        self.first_event_ms: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.requests: Dict[str, int] = defaultdict(int)
+
+    def error(self, endpoint: str, kind: str):
+        self.errors[endpoint][kind] += 1
+
+    def summary(self, elapsed: float) -> Dict:
+        report = {}
+        for endpoint in sorted(self.requests):
+            total = self.requests[endpoint]
+            errors = sum(self.errors[endpoint].values())
+            latencies = self.latencies_ms[endpoint]
+            row = {
+                "requests": total,
+                "errors": errors,
+                "error_rate": round(errors / total, 4) if total else 0.0,
+                "errors_by_kind": dict(self.errors[endpoint]),
+                "throughput_rps": round((total - errors) / elapsed, 2) if elapsed else 0.0,
+                "latency_ms": {p: round(percentile(latencies, int(p[1:])), 1) for p in ("p50", "p90", "p95", "p99")},
+            }
+            if self.first_byte_ms[endpoint]:
+                row["first_byte_ms"] = {p: round(percentile(self.first_byte_ms[endpoint], int(p[1:])), 1) for p in ("p50", "p95", "p99")}
+            if self.first_event_ms[endpoint]:
+                row["first_event_ms"] = {p: round(percentile(self.first_event_ms[endpoint], int(p[1:])), 1) for p in ("p50", "p95", "p99")}
+            report[endpoint] = row
+        return report
+
+
+class LoadTest:
+    def __init__(self, args, questions: List[tuple]):
+        self.args = args
+        self.weights = [weight for weight, _ in questions]
+        self.questions = [question for _, question in questions]
+        self.stats = Stats()
+        self.issued = 0
+        self.deadline = 0.0
+        self.rng = random.Random(args.seed)
+
+    def _next_question(self) -> str:
+        return self.rng.choices(self.questions, weights=self.weights)[0]
+
+    def _next_endpoint(self) -> str:
+        if self.args.endpoint == "mixed":
+            return "run_sse" if self.rng.random() < self.args.sse_ratio else "run"
+        return self.args.endpoint
+
+    def _has_budget(self) -> bool:
+        if self.args.requests is not None:
+            if self.issued >= self.args.requests:
+                return False
+            self.issued += 1
+            return True
+        return time.perf_counter() < self.deadline
+
+    async def _create_session(self, http: aiohttp.ClientSession, user_id: str) -> Optional[str]:
+        url = f"{self.args.base_url}/apps/{self.args.app}/users/{user_id}/sessions"
+        start = time.perf_counter()
+        try:
+            async with http.post(url, json={}) as response:
+                if response.status != 200:
+                    self.stats.error("create_session", f"http_{response.status}")
+                    return None
+                session = await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.stats.error("create_session", type(e).__name__)
+            return None
+        finally:
+            self.stats.requests["create_session"] += 1
+        self.stats.latencies_ms["create_session"].append((time.perf_counter() - start) * 1000)
+        return session["id"]
+
+    async def _ask(self, http: aiohttp.ClientSession, endpoint: str, user_id: str, session_id: str, question: str):
+        payload = {
+            "appName": self.args.app,
+            "userId": user_id,
+            "sessionId": session_id,
+            "newMessage": {"role": "user", "parts": [{"text": question}]},
+            "streaming": self.args.streaming,
+        }
+        self.stats.requests[endpoint] += 1
+        start = time.perf_counter()
+        try:
+            async with http.post(f"{self.args.base_url}/{endpoint}", json=payload) as response:
+                if response.status != 200:
+                    await response.read()
+                    self.stats.error(endpoint, f"http_{response.status}")
+                    return
+                if endpoint == "run":
+                    events = await response.json()
+                    self.stats.first_byte_ms[endpoint].append((time.perf_counter() - start) * 1000)
+                    if any(event.get("errorCode") or event.get("errorMessage") for event in events):
+                        self.stats.error(endpoint, "agent_error")
+                        return
+                else:
+                    if not await self._consume_sse(endpoint, response, start):
+                        return
+        except asyncio.TimeoutError:
+            self.stats.error(endpoint, "timeout")
+            return
+        except aiohttp.ClientError as e:
+            self.stats.error(endpoint, type(e).__name__)
+            return
+        self.stats.latencies_ms[endpoint].append((time.perf_counter() - start) * 1000)
+
+    async def _consume_sse(self, endpoint: str, response: aiohttp.ClientResponse, start: float) -> bool:
+        """Lee el stream hasta el final; devuelve False si llega un evento de error."""
+        first_byte = True
+        first_event = True
+        ok = True
+        async for line in response.content:
+            if first_byte:
+                first_byte = False
+                self.stats.first_byte_ms[endpoint].append((time.perf_counter() - start) * 1000)
+            if not line.startswith(b"data:"):
+                continue
+            if first_event:
+                first_event = False
+                self.stats.first_event_ms[endpoint].append((time.perf_counter() - start) * 1000)
+            try:
+                event = json.loads(line[5:])
+            except ValueError:
+                continue
+            if ok and (event.get("error") or event.get("errorCode") or event.get("errorMessage")):
+                self.stats.error(endpoint, "agent_error")
+                ok = False
+        return ok
+
+    async def _guest(self, http: aiohttp.ClientSession, guest: int):
+        """Un invitado: abre sesión, hace `turns` preguntas en ella y vuelve a empezar."""
+        user_id = f"load-{guest}-{uuid.uuid4().hex[:6]}"
+        while True:
+            session_id = await self._create_session(http, user_id)
+            if session_id is None:
+                if not self._has_budget():
+                    return
+                await asyncio.sleep(0.5)
+                continue
+            for _ in range(self.args.turns):
+                if not self._has_budget():
+                    return
+                await self._ask(http, self._next_endpoint(), user_id, session_id, self._next_question())
+                if self.args.think_time_ms:
+                    await asyncio.sleep(self.rng.expovariate(1000 / self.args.think_time_ms))
+
+    async def run(self) -> Dict:
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        connector = aiohttp.TCPConnector(limit=self.args.concurrency * 2)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as http:
+            self.deadline = time.perf_counter() + self.args.duration
+            start = time.perf_counter()
+            await asyncio.gather(*(self._guest(http, guest) for guest in range(self.args.concurrency)))
+            elapsed = time.perf_counter() - start
+        return {"elapsed_seconds": round(elapsed, 2), "endpoints": self.stats.summary(elapsed)}
+
+
+def start_stub_server(args) -> subprocess.Popen:
+    """Arranca main.py con los modelos sustituidos por stubs locales y espera a /health."""
+    env = {
+        **os.environ,
+        "STUB_LLM": "true",
+        "STUB_LLM_LATENCY_MS": str(args.llm_latency_ms),
+        "EMBEDDING_BACKEND": "stub",
+        "STUB_EMBEDDING_LATENCY_MS": str(args.embedding_latency_ms),
+    }
+    port = args.base_url.rsplit(":", 1)[-1].split("/")[0]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", port, "--log-level", "warning"],
+        cwd=PROJECT_ROOT, env=env
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("El servidor de prueba terminó durante el arranque")
+        try:
+            import urllib.request
+            with urllib.request.urlopen(f"{args.base_url}/health", timeout=1) as response:
+                health = json.loads(response.read())
+                if health.get("status") == "ok" and health.get("readiness", {}).get("ready", True):
+                    return process
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("El servidor de prueba no respondió a /health en 60 segundos")
+
+
+def print_report(report: Dict):
+    print(f"\n⏱️  Duración: {report['elapsed_seconds']}s")
+    print(
+        f"{'endpoint':<16}{'peticiones':>11}{'errores':>9}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'p99 ms':>9}{'1er byte p50':>14}{'1er evento p50':>16}"
+    )
+    for endpoint, row in report["endpoints"].items():
+        first_byte = row.get("first_byte_ms", {}).get("p50", "-")
+        first_event = row.get("first_event_ms", {}).get("p50", "-")
+        print(
+            f"{endpoint:<16}{row['requests']:>11}{row['errors']:>9}{row['throughput_rps']:>8}"
+            f"{row['latency_ms']['p50']:>9}{row['latency_ms']['p95']:>9}{row['latency_ms']['p99']:>9}"
+            f"{first_byte:>14}{first_event:>16}"
+        )
+        if row["errors_by_kind"]:
+            print(f"{'':<16}errores: {row['errors_by_kind']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prueba de carga de /run y /run_sse")
+    parser.add_argument("--base-url", default="http://localhost:8080")
+    parser.add_argument("--app", default="coordinator", help="Agente a invocar (coordinator, sumiller, ...)")
+    parser.add_argument("--endpoint", choices=["run", "run_sse", "mixed"], default="mixed")
+    parser.add_argument("--sse-ratio", type=float, default=0.5, help="Proporción de /run_sse en modo mixed")
+    parser.add_argument("--streaming", action="store_true", help="Pide respuestas en streaming (fragmentos SSE)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Invitados simultáneos")
+    parser.add_argument("--turns", type=int, default=3, help="Preguntas por sesión antes de abrir otra")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de prueba (si no se fija --requests)")
+    parser.add_argument("--requests", type=int, help="Número total de preguntas")
+    parser.add_argument("--think-time-ms", type=float, default=0, help="Pausa media entre preguntas de un invitado")
+    parser.add_argument("--questions", help="Fichero JSON con la mezcla de preguntas")
+    parser.add_argument("--timeout", type=float, default=120, help="Tiempo máximo por petición")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--stub-server", action="store_true", help="Arranca main.py con modelos locales simulados")
+    parser.add_argument("--llm-latency-ms", type=float, default=800, help="Latencia del LLM simulado")
+    parser.add_argument("--embedding-latency-ms", type=float, default=60, help="Latencia de los embeddings simulados")
+    parser.add_argument("--output", help="Fichero JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    server = start_stub_server(args) if args.stub_server else None
+    try:
+        print(
+            f"🚦 {args.concurrency} invitados contra {args.base_url} ({args.app}, {args.endpoint}, "
+            f"{args.turns} preguntas por sesión)"
+        )
+        report = asyncio.run(LoadTest(args, load_question_mix(args.questions)).run())
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    report["config"] = {key: value for key, value in vars(args).items() if key != "output"}
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
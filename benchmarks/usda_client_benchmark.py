@@ -0,0 +1,119 @@
+"""
+Benchmark del cliente async de la API USDA contra el servidor falso de FoodData Central
+(benchmarks/fake_fdc_server.py), arrancado en el mismo proceso. Escenarios:
+
+- identical: ráfagas de búsquedas idénticas simultáneas (el single-flight debe dejar una
+  sola petición por ráfaga)
+- distinct: ráfagas de búsquedas distintas (pool de conexiones y concurrencia acotada)
+- flaky: búsquedas distintas con errores 503 y 429 (reintentos con backoff y plazo total)
+
+La caché persistente y la réplica local se desactivan para medir solo la red.
+
+Uso:
+    python -m benchmarks.usda_client_benchmark
+    python -m benchmarks.usda_client_benchmark --burst 50 --rounds 5 --latency-ms 200 --output usda_client.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# Sin caché, sin réplica y sin límite de cuota efectivo: cada búsqueda llega a la red
+os.environ.setdefault("USDA_CACHE_PATH", "")
+os.environ.setdefault("FDC_MIRROR_MODE", "off")
+os.environ.setdefault("USDA_RATE_LIMIT_PER_HOUR", "36000000")
+os.environ.setdefault("USDA_RATE_LIMIT_BURST", "100000")
+
+# Añadir el directorio raíz del proyecto al path para resolver importaciones
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_fdc_server import FakeFoodDataCentral, bound_port, start_fake_server
+
+
+def percentile(values: List[float], pct: float) -> float:
+    return float(np.percentile(np.array(values), pct)) if values else 0.0
+
+
+async def run_scenario(client, fake: FakeFoodDataCentral, name: str, queries: List[List[str]]) -> Dict:
+    """Lanza cada ráfaga de consultas a la vez y espera a que termine antes de la siguiente."""
+    from agents.usda_cache import USDAResponseCache
+
+    fake.reset()
+    latencies_ms, errors, calls = [], 0, 0
+    start = time.perf_counter()
+    for burst in queries:
+        # Caché vacía en cada ráfaga: solo cuenta el single-flight, no las respuestas guardadas
+        client.cache = USDAResponseCache(path=None)
+
+        async def one(query: str):
+            t0 = time.perf_counter()
+            result = await client.search_foods_async(query, page_size=3)
+            return (time.perf_counter() - t0) * 1000, "error" in result
+
+        for latency, failed in await asyncio.gather(*(one(query) for query in burst)):
+            latencies_ms.append(latency)
+            errors += int(failed)
+            calls += 1
+    elapsed = time.perf_counter() - start
+    return {
+        "scenario": name,
+        "calls": calls,
+        "upstream_requests": fake.requests,
+        "upstream_responses": dict(fake.by_response),
+        "errors": errors,
+        "error_rate": round(errors / calls, 4) if calls else 0.0,
+        "latency_ms": {p: round(percentile(latencies_ms, int(p[1:])), 1) for p in ("p50", "p95", "p99")},
+        "throughput_qps": round(calls / elapsed, 1) if elapsed else 0.0
+    }
+
+
+async def main(args) -> List[Dict]:
+    fake = FakeFoodDataCentral(latency_ms=args.latency_ms, jitter_ms=args.latency_ms / 5)
+    runner = await start_fake_server(fake)
+    os.environ["USDA_API_BASE_URL"] = f"http://127.0.0.1:{bound_port(runner)}/fdc/v1"
+    # Importación diferida: el cliente lee USDA_API_BASE_URL al importarse
+    from agents.usda_api_client import usda_client
+
+    identical = [[f"salmon {round_}"] * args.burst for round_ in range(args.rounds)]
+    distinct = [[f"food {round_}-{i}" for i in range(args.burst)] for round_ in range(args.rounds)]
+    flaky = [[f"flaky {round_}-{i}" for i in range(args.burst)] for round_ in range(args.rounds)]
+    try:
+        results = [
+            await run_scenario(usda_client, fake, "identical", identical),
+            await run_scenario(usda_client, fake, "distinct", distinct),
+        ]
+        fake.config.update(error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=0.2)
+        results.append(await run_scenario(usda_client, fake, "flaky", flaky))
+    finally:
+        await usda_client.aclose()
+        await runner.cleanup()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark del cliente async de la API USDA")
+    parser.add_argument("--burst", type=int, default=20, help="Búsquedas simultáneas por ráfaga")
+    parser.add_argument("--rounds", type=int, default=5, help="Ráfagas por escenario")
+    parser.add_argument("--latency-ms", type=float, default=100, help="Latencia del servidor falso")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="Respuestas 503 en el escenario flaky")
+    parser.add_argument("--throttle-rate", type=float, default=0.1, help="Respuestas 429 en el escenario flaky")
+    parser.add_argument("--output", help="Fichero JSON donde guardar los resultados")
+    args = parser.parse_args()
+
+    print(f"🔬 Cliente USDA contra FoodData Central falso ({args.rounds} ráfagas de {args.burst}, {args.latency_ms}ms)")
+    results = asyncio.run(main(args))
+    print(f"\n{'escenario':<12}{'llamadas':>10}{'HTTP':>7}{'errores':>9}{'p50 ms':>9}{'p95 ms':>9}{'QPS':>8}  respuestas")
+    for row in results:
+        print(
+            f"{row['scenario']:<12}{row['calls']:>10}{row['upstream_requests']:>7}{row['errors']:>9}"
+            f"{row['latency_ms']['p50']:>9}{row['latency_ms']['p95']:>9}{row['throughput_qps']:>8}  {row['upstream_responses']}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Resultados guardados en {args.output}")
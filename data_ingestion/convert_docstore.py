@@ -0,0 +1,81 @@
+import os
+import sys
+import pickle
+
+# Añadir el directorio raíz del proyecto al path para resolver importaciones
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.documents import Document
+
+from agents.docstore import CompactDocstore, write_compact_docstore, has_compact_docstore
+from agents.retrieval_cache import write_index_version
+from agents.bm25 import BM25Index
+from agents.metadata_index import MetadataIndex
+from data_ingestion.json_wine_loader import prices_from_content
+
+INDEXES_DIR = "./indexes"
+
+
+def convert_index(index_path: str) -> bool:
+    """
+    Convierte el docstore pickle heredado (index.pkl) de un índice al formato compacto
+    y genera sus índices BM25 y de metadatos, sin tocar index.faiss. Solo debe usarse con índices
+    generados por nosotros.
+    """
+    pickle_path = os.path.join(index_path, "index.pkl")
+    if has_compact_docstore(index_path) or not os.path.exists(pickle_path):
+        return False
+
+    with open(pickle_path, "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    documents = [docstore.search(index_to_docstore_id[i]) for i in range(len(index_to_docstore_id))]
+    documents = [with_prices(doc) for doc in documents]
+    write_compact_docstore(index_path, documents)
+    BM25Index.build([doc.page_content for doc in documents]).save(index_path)
+    MetadataIndex.build([doc.metadata for doc in documents]).save(index_path)
+    write_index_version(index_path, len(documents))
+    os.remove(pickle_path)
+    return True
+
+
+def with_prices(doc: Document) -> Document:
+    """
+    Los vinos indexados antes de los filtros de metadatos no guardaban sus precios: se
+    recuperan del texto del documento para que min_price / max_price funcionen.
+    """
+    if "wine_name" not in doc.metadata:
+        return doc
+    prices = {field: value for field, value in prices_from_content(doc.page_content).items() if field not in doc.metadata}
+    if not prices:
+        return doc
+    return Document(page_content=doc.page_content, metadata={**doc.metadata, **prices})
+
+
+def add_missing_prices(index_path: str) -> bool:
+    """
+    Completa los precios de un índice ya convertido: reescribe el docstore compacto y el
+    índice de metadatos (las posiciones no cambian) y genera una versión nueva del índice.
+    """
+    if not has_compact_docstore(index_path):
+        return False
+    docstore = CompactDocstore(index_path)
+    original = [docstore.search(str(i)) for i in range(len(docstore))]
+    documents = [with_prices(doc) for doc in original]
+    if all(doc is orig for doc, orig in zip(documents, original)):
+        return False
+    write_compact_docstore(index_path, documents)
+    MetadataIndex.build([doc.metadata for doc in documents]).save(index_path)
+    write_index_version(index_path, len(documents))
+    return True
+
+
+if __name__ == "__main__":
+    for entry in sorted(os.listdir(INDEXES_DIR)):
+        path = os.path.join(INDEXES_DIR, entry)
+        if convert_index(path):
+            print(f"✅ Docstore de '{entry}' convertido al formato compacto.")
+        elif add_missing_prices(path):
+            print(f"✅ Precios de '{entry}' añadidos a los metadatos.")
+        else:
+            print(f"-> '{entry}' ya está en formato compacto o no tiene index.pkl.")
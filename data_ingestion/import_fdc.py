@@ -0,0 +1,85 @@
+"""
+Importa las descargas masivas de FoodData Central (Foundation y SR Legacy, formato JSON,
+sueltas o dentro del .zip que publica el USDA) en la réplica local que usa el cliente de
+la API (agents/fdc_mirror.py).
+
+Descargas: https://fdc.nal.usda.gov/download-datasets
+
+Uso:
+    python -m data_ingestion.import_fdc FoodData_Central_foundation_food_json_2024-10-31.zip \\
+        FoodData_Central_sr_legacy_food_json_2018-04.zip
+    python -m data_ingestion.import_fdc foundation.json --output ./indexes/fdc_mirror.sqlite
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zipfile
+from typing import Dict, Iterator, List, Tuple
+
+# Añadir el directorio raíz del proyecto al path para resolver importaciones
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.fdc_mirror import FDC_MIRROR_PATH, FoodDataMirror
+
+# Clave de la lista de alimentos en cada fichero de descarga y su dataType en la API
+DATASETS = {
+    "FoundationFoods": "Foundation",
+    "SRLegacyFoods": "SR Legacy",
+}
+
+
+def _load_json(path: str) -> Tuple[str, Dict]:
+    """Lee un fichero de descarga (.json o .zip con un único .json dentro)."""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = [name for name in archive.namelist() if name.endswith(".json")]
+            if len(members) != 1:
+                raise ValueError(f"'{path}' debe contener exactamente un fichero JSON (tiene {len(members)})")
+            with archive.open(members[0]) as f:
+                return members[0], json.load(f)
+    with open(path, "r", encoding="utf-8") as f:
+        return os.path.basename(path), json.load(f)
+
+
+def read_foods(paths: List[str]) -> Tuple[List[Dict], List[str]]:
+    """Alimentos de todos los ficheros, con su dataType, y el nombre de cada fuente."""
+    foods, sources = [], []
+    for path in paths:
+        name, data = _load_json(path)
+        datasets = [key for key in DATASETS if key in data]
+        if not datasets:
+            raise ValueError(f"'{path}' no es una descarga Foundation ni SR Legacy de FoodData Central")
+        for key in datasets:
+            for food in data[key]:
+                food.setdefault("dataType", DATASETS[key])
+                foods.append(food)
+            print(f"--> {len(data[key])} alimentos {DATASETS[key]} en {name}")
+        sources.append(name)
+    return foods, sources
+
+
+def _iter_foods(foods: List[Dict]) -> Iterator[Dict]:
+    for food in foods:
+        if food.get("fdcId") and food.get("description"):
+            yield food
+
+
+def import_fdc(paths: List[str], output: str = FDC_MIRROR_PATH) -> int:
+    """Construye la réplica en `output` a partir de los ficheros de descarga; devuelve los alimentos importados."""
+    foods, sources = read_foods(paths)
+    return FoodDataMirror.build(_iter_foods(foods), output, sources)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa FoodData Central en la réplica local")
+    parser.add_argument("files", nargs="+", help="Ficheros JSON o ZIP de Foundation / SR Legacy")
+    parser.add_argument("--output", default=FDC_MIRROR_PATH, help="Ruta de la réplica SQLite")
+    args = parser.parse_args()
+
+    print("🚀 Importando FoodData Central...")
+    start = time.perf_counter()
+    count = import_fdc(args.files, args.output)
+    size_mb = os.path.getsize(args.output) / (1024 * 1024)
+    print(f"✅ Réplica con {count} alimentos en {args.output} ({size_mb:.1f} MB, {time.perf_counter() - start:.1f}s)")
@@ -1,23 +1,61 @@
 import os
 import sys
 import shutil
+import faiss
+import numpy as np
 
 # Añadir el directorio raíz del proyecto al path para resolver importaciones
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from langchain_google_vertexai import VertexAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.document_loaders import DirectoryLoader
-from langchain_community.vectorstores import FAISS
 # Importación actualizada desde el mismo directorio de ingesta
 from data_ingestion.json_wine_loader import VinosJsonLoader
 from data_ingestion.json_culinary_loader import CulinaryJsonLoader
+from agents.retrieval_cache import write_index_version
+from agents.embedding_backends import create_embeddings, embedding_model_name
+from agents.docstore import write_compact_docstore
+from agents.bm25 import BM25Index
+from agents.metadata_index import MetadataIndex
+from agents.index_config import (
+    IndexSettings, build_faiss_index, load_domain_settings, save_rescore_vectors, settings_as_dict, uses_rescoring
+)
 # --- Constantes de Rutas ---
 # Rutas relativas desde la raíz del proyecto
 KNOWLEDGE_BASE_DIR = "./knowledge_base"
 INDEXES_DIR = "./indexes"
 
 
+def build_index(documents: list, embedding_model, index_path: str, settings: IndexSettings) -> int:
+    """
+    Embebe los documentos, construye el índice FAISS del tipo configurado para el dominio
+    (flat, IVF o HNSW; vectores en float32, float16 o PQ) y lo guarda junto con su docstore compacto (sin pickle), el índice
+    BM25 y el índice de metadatos, y escribe una versión nueva.
+    Devuelve el número de documentos guardados.
+    """
+    vectors = np.array(embedding_model.embed_documents([doc.page_content for doc in documents]), dtype=np.float32)
+    index = build_faiss_index(vectors, settings)
+
+    os.makedirs(index_path, exist_ok=True)
+    faiss.write_index(index, os.path.join(index_path, "index.faiss"))
+    if uses_rescoring(settings):
+        # Copia float16 para re-puntuar los candidatos que devuelve la PQ
+        save_rescore_vectors(index_path, vectors)
+
+    # Los documentos se escriben en el mismo orden que los vectores del índice
+    write_compact_docstore(index_path, documents)
+    # Índice léxico para la recuperación híbrida (nombres exactos de vinos, bodegas y platos)
+    BM25Index.build([doc.page_content for doc in documents]).save(index_path)
+    MetadataIndex.build([doc.metadata for doc in documents]).save(index_path)
+    write_index_version(
+        index_path, len(documents),
+        index_settings=settings_as_dict(settings),
+        embedding_model=embedding_model_name()
+    )
+    print(f"--> Índice FAISS {settings.describe()} con {index.ntotal} vectores.")
+    return len(documents)
+
+
 def ingest_text_files(domain_path: str, chunk_strategy: str) -> list:
     """Carga y divide documentos de texto de un directorio."""
     print(f"-> Procesando archivos de texto desde: {domain_path}")
@@ -92,7 +130,9 @@ if __name__ == "__main__":
     # Asegurarse de que el directorio de índices exista
     os.makedirs(INDEXES_DIR, exist_ok=True)
     
-    embedding_model = VertexAIEmbeddings(model_name="text-embedding-004")
+    # EMBEDDING_BACKEND=hashed u onnx permite construir los índices sin red ni credenciales
+    embedding_model = create_embeddings()
+    print(f"-> Modelo de embeddings: {embedding_model_name()}")
 
     # --- 1. Ingesta para Enología (Sumiller) ---
     print("\n--- 🍷 Procesando dominio: Enología ---")
@@ -109,8 +149,7 @@ if __name__ == "__main__":
     all_enology_docs = unstructured_docs + structured_docs
     
     if all_enology_docs:
-        enology_store = FAISS.from_documents(all_enology_docs, embedding_model)
-        enology_store.save_local(enology_index_path)
+        build_index(all_enology_docs, embedding_model, enology_index_path, load_domain_settings("enology"))
         print(f"✅ Índice de Enología unificado creado con {len(all_enology_docs)} documentos en: {enology_index_path}")
     else:
         print("⚠️ No se encontraron documentos para crear el índice de Enología.")
@@ -130,8 +169,7 @@ if __name__ == "__main__":
     all_culinary_docs = culinary_unstructured_docs + culinary_structured_docs
 
     if all_culinary_docs:
-        culinary_store = FAISS.from_documents(all_culinary_docs, embedding_model)
-        culinary_store.save_local(culinary_index_path)
+        build_index(all_culinary_docs, embedding_model, culinary_index_path, load_domain_settings("culinary"))
         print(f"✅ Índice Culinario unificado creado con {len(all_culinary_docs)} documentos en: {culinary_index_path}")
     else:
         print("⚠️ No se encontraron documentos para crear el índice Culinario.")
@@ -147,8 +185,7 @@ if __name__ == "__main__":
 
     
     if nutrition_docs:
-        nutrition_store = FAISS.from_documents(nutrition_docs, embedding_model)
-        nutrition_store.save_local(nutrition_index_path)
+        build_index(nutrition_docs, embedding_model, nutrition_index_path, load_domain_settings("nutrition"))
         print(f"✅ Índice de Nutrición creado con {len(nutrition_docs)} chunks en: {nutrition_index_path}")
     else:
         print("⚠️ No se encontraron documentos para crear el índice de Nutrición.")
@@ -1,7 +1,29 @@
 import json
+import re
 from langchain_core.documents import Document
 from langchain_community.document_loaders.base import BaseLoader
 from typing import List, Iterator
+from agents.metadata_index import parse_price
+
+# Líneas de precio que escriben los formateadores de abajo, para recuperar los precios de
+# documentos ya indexados cuyos metadatos no los guardaban (índices anteriores a los filtros)
+_PRICE_LINES = {
+    "price_bottle": re.compile(r"^Precio por botella: (.+)$", re.MULTILINE),
+    "price_glass": re.compile(r"^Precio por copa: (.+)$", re.MULTILINE),
+    "price": re.compile(r"^Precio: (.+)$", re.MULTILINE),
+}
+
+
+def prices_from_content(content: str) -> dict:
+    """Precios numéricos de un documento de vino a partir de su texto formateado."""
+    prices = {}
+    for field, pattern in _PRICE_LINES.items():
+        match = pattern.search(content)
+        value = parse_price(match.group(1)) if match else None
+        if value is not None:
+            prices[field] = value
+    return prices
+
 
 class VinosJsonLoader(BaseLoader):
     """Carga un archivo JSON de vinos, tratando cada vino como un documento.
@@ -75,6 +97,11 @@ class VinosJsonLoader(BaseLoader):
                     "category": vino.get('categoría', 'N/A'),
                     "bodega": vino.get('bodega', 'N/A')
                 }
+                # Precios numéricos para los filtros de metadatos
+                if parse_price(vino.get('precio_botella')) is not None:
+                    metadata["price_bottle"] = parse_price(vino.get('precio_botella'))
+                if parse_price(vino.get('precio_copa')) is not None:
+                    metadata["price_glass"] = parse_price(vino.get('precio_copa'))
             else:
                 # Formato legacy
                 content = self._format_wine_legacy(vino)
@@ -2,17 +2,79 @@
 import os
 from google.adk.cli.fast_api import get_fast_api_app
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import StreamingResponse
+from agents.index_registry import index_registry
+from agents.context_packer import context_packer
+from agents.usda_api_client import usda_client
+from agents.answer_cache import answer_cache
+from agents.intent_router import intent_router
+from agents.metrics import MetricsMiddleware, registry
+from agents.tracing import configure_tracing
+from agents.stub_models import STUB_LLM, install_stub_llm
+
+# Pruebas de carga sin red: Gemini sustituido por un modelo local determinista
+if STUB_LLM:
+    install_stub_llm()
 
 AGENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "agents")
+INDEXES_DIR = os.getenv("INDEXES_DIR", "./indexes")
+# Apps de ADK (un paquete con agent.py por agente): las únicas que se usan como etiqueta de métricas
+AGENT_APPS = sorted(
+    name for name in os.listdir(AGENTS_DIR) if os.path.isfile(os.path.join(AGENTS_DIR, name, "agent.py"))
+)
+
+# Calentamiento de índices en segundo plano: el servidor responde /health desde el
+# primer momento y cada agente espera solo a su propio índice si llega antes una consulta
+index_registry.discover(INDEXES_DIR)
+if os.getenv("INDEX_WARMUP", "true").lower() == "true":
+    index_registry.start_warm_up()
 
 app = get_fast_api_app(
     agents_dir=AGENTS_DIR,
     web=True
 )
 
+# Exportación de spans a fichero (ADK ya ha instalado el proveedor de trazas)
+configure_tracing()
+
+# Latencia por app y peticiones en curso (ASGI puro: no bufferiza el streaming de /run_sse)
+app.add_middleware(MetricsMiddleware, app_names=AGENT_APPS)
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    # Sesión aiohttp que usan las herramientas async de nutrición
+    await usda_client.aclose()
+
 @app.get("/health")
 def health_check():
-    return {"status": "ok"} 
\ No newline at end of file
+    return {"status": "ok", "readiness": index_registry.readiness()}
+
+@app.get("/indexes/memory")
+def index_memory():
+    """Memoria residente por índice FAISS cargado en este proceso."""
+    return index_registry.memory_report()
+
+@app.get("/context/stats")
+def context_stats():
+    """Tokens de contexto ahorrados por el empaquetador desde el arranque del proceso."""
+    return context_packer.stats()
+
+
+@app.get("/answers/cache")
+def answer_cache_stats():
+    """Aciertos de la caché semántica de respuestas del coordinador."""
+    return answer_cache.stats()
+
+
+@app.get("/router/stats")
+def router_stats():
+    """Consultas enrutadas localmente frente a las que decide el LLM del coordinador."""
+    return intent_router.stats()
+
+
+@app.get("/metrics")
+def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,58 @@
+"""
+Importación de las descargas de FoodData Central y búsqueda en la réplica local, con dos
+ficheros de muestra hechos a mano (tests/fixtures) en el formato de las descargas reales.
+"""
+import os
+import zipfile
+
+import pytest
+
+from agents.fdc_mirror import FoodDataMirror
+from data_ingestion.import_fdc import import_fdc
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture
+def mirror(tmp_path):
+    # SR Legacy dentro de un .zip, como lo publica el USDA
+    sr_legacy_zip = tmp_path / "sr_legacy.zip"
+    with zipfile.ZipFile(sr_legacy_zip, "w") as archive:
+        archive.write(os.path.join(FIXTURES, "fdc_sr_legacy_sample.json"), "FoodData_Central_sr_legacy_food.json")
+
+    path = str(tmp_path / "fdc_mirror.sqlite")
+    assert import_fdc([os.path.join(FIXTURES, "fdc_foundation_sample.json"), str(sr_legacy_zip)], path) == 7
+    return FoodDataMirror.open(path)
+
+
+def test_import_records_sources_and_data_types(mirror):
+    assert mirror.foods == 7
+    assert mirror.sources == ["fdc_foundation_sample.json", "FoodData_Central_sr_legacy_food.json"]
+    assert {food["dataType"] for food in mirror.search("salmon", page_size=10)["foods"]} == {"Foundation", "SR Legacy"}
+
+
+def test_search_returns_the_foods_search_shape(mirror):
+    result = mirror.search("chicken breast", ["Foundation", "SR Legacy"], page_size=3)
+    assert result["totalHits"] == len(result["foods"]) == 1
+    food = result["foods"][0]
+    assert food["fdcId"] == 2646170
+    assert food["foodCategory"] == "Poultry Products"
+    energy = next(n for n in food["foodNutrients"] if n["nutrientName"] == "Energy")
+    assert (energy["nutrientNumber"], energy["unitName"], energy["value"]) == ("208", "KCAL", 120)
+
+
+def test_search_stems_and_filters_by_data_type(mirror):
+    # 'tomato' encuentra 'Tomatoes' y 'avocado' encuentra 'Avocados' (stemming inglés)
+    assert mirror.search("tomato")["foods"][0]["fdcId"] == 2346384
+    assert mirror.search("avocado")["foods"][0]["fdcId"] == 171705
+    salmon = mirror.search("salmon", ["SR Legacy"])["foods"]
+    assert [food["fdcId"] for food in salmon] == [175168]
+
+
+def test_search_without_usable_words_is_empty(mirror):
+    assert mirror.search("  ¿? ")["foods"] == []
+    assert mirror.search("quinoa")["foods"] == []
+
+
+def test_missing_mirror_is_not_opened(tmp_path):
+    assert FoodDataMirror.open(str(tmp_path / "missing.sqlite")) is None